@@ -0,0 +1,121 @@
+"""
+Async Redis access for AIMY AI Core Service
+Shared, size-bounded asyncio connection pool with per-call timeouts,
+pipelining helpers and a circuit breaker, so a slow or unavailable Redis
+degrades metrics and caching instead of inference endpoints
+"""
+
+import time
+import asyncio
+import logging
+from typing import List, Tuple, Any, Optional
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets one probe through after reset_timeout"""
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+    
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+    
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("Redis circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+    
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Redis circuit opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+
+class AsyncRedis:
+    """asyncio Redis client shared by all requests of an API worker
+    
+    Every call is bounded by `timeout` and returns `default` instead of
+    raising when Redis is slow, unreachable or the circuit is open.
+    """
+    
+    def __init__(self, url: str, max_connections: int = 10, timeout: float = 0.25,
+                 pool_timeout: float = 0.1, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.timeout = timeout
+        self.pool = aioredis.BlockingConnectionPool.from_url(
+            url,
+            max_connections=max_connections,
+            timeout=pool_timeout,
+            socket_timeout=timeout,
+            socket_connect_timeout=timeout
+        )
+        self.client = aioredis.Redis(connection_pool=self.pool)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._background: set = set()
+    
+    async def call(self, command: str, *args, default: Any = None) -> Any:
+        """Run a single command, e.g. await redis.call("get", key)"""
+        if not self.breaker.allow():
+            return default
+        
+        try:
+            result = await asyncio.wait_for(getattr(self.client, command)(*args), timeout=self.timeout)
+        except Exception as e:
+            self.breaker.record_failure()
+            logger.warning(f"Redis {command} failed: {e}")
+            return default
+        
+        self.breaker.record_success()
+        return result
+    
+    async def pipeline(self, commands: List[Tuple], default: Any = None) -> Any:
+        """Run (command, *args) tuples in one round trip; return their results in order"""
+        if not self.breaker.allow():
+            return default
+        
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for command, *args in commands:
+                getattr(pipe, command)(*args)
+            results = await asyncio.wait_for(pipe.execute(), timeout=self.timeout)
+        except Exception as e:
+            self.breaker.record_failure()
+            logger.warning(f"Redis pipeline failed: {e}")
+            return default
+        
+        self.breaker.record_success()
+        return results
+    
+    def pipeline_background(self, commands: List[Tuple]):
+        """Schedule a pipeline without waiting for it (fire-and-forget writes)"""
+        task = asyncio.create_task(self.pipeline(commands))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+    
+    async def close(self):
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        await self.pool.disconnect()
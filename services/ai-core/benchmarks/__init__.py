@@ -0,0 +1,5 @@
+"""
+Benchmark suite for AIMY AI Core Service
+Runs hermetically: MinIO, Redis and the Celery broker are replaced by
+in-memory stand-ins (see benchmarks.hermetic)
+"""
@@ -0,0 +1,268 @@
+"""
+Benchmark cases for AIMY AI Core Service
+Feature extraction, model inference at several batch sizes, every HTTP
+endpoint through an in-process ASGI client, and the Celery batch tasks
+"""
+
+import io
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Callable, Optional, Any
+import numpy as np
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+GROUPS = ("features", "models", "endpoints", "celery")
+BATCH_SIZES = (1, 10, 100, 1000, 10000)
+MODEL_METHODS = {"pricing": "predict", "yield": "predict", "risk": "predict", "anomaly": "score_samples"}
+
+class BenchmarkCase:
+    """One timed operation; items is the work per call, used for throughput"""
+    
+    def __init__(self, name: str, group: str, func: Callable[[], Any], items: int = 1,
+                 max_runs: Optional[int] = None, warmup: int = 2):
+        self.name = name
+        self.group = group
+        self.func = func
+        self.items = items
+        self.max_runs = max_runs
+        self.warmup = warmup
+
+def _dicts(records) -> List[Dict[str, Any]]:
+    return [record.dict() for record in records]
+
+def _risk_metrics(rng: np.random.Generator) -> Dict[str, Dict[str, float]]:
+    return {
+        "financial_metrics": {
+            "debt_to_equity": float(rng.uniform(0.2, 2.0)),
+            "current_ratio": float(rng.uniform(0.8, 2.5)),
+            "profit_margin": float(rng.uniform(-0.1, 0.3)),
+            "return_on_equity": float(rng.uniform(0.0, 0.25)),
+            "cash_flow_coverage": float(rng.uniform(0.5, 3.0))
+        },
+        "market_exposure": {
+            "interest_rate_sensitivity": float(rng.uniform(0, 1)),
+            "currency_exposure": float(rng.uniform(0, 1)),
+            "commodity_exposure": float(rng.uniform(0, 1)),
+            "geographic_concentration": float(rng.uniform(0, 1)),
+            "sector_concentration": float(rng.uniform(0, 1))
+        },
+        "operational_metrics": {
+            "utilization_rate": float(rng.uniform(0.5, 1)),
+            "efficiency": float(rng.uniform(0.6, 1)),
+            "maintenance_ratio": float(rng.uniform(0, 0.2)),
+            "staff_turnover": float(rng.uniform(0, 0.3)),
+            "quality_score": float(rng.uniform(0.5, 1))
+        }
+    }
+
+def _time_series(rng: np.random.Generator, hours: int) -> List[Dict[str, Any]]:
+    start = datetime(2024, 1, 1)
+    values = 25 + np.cumsum(rng.normal(0, 0.5, hours))
+    return [
+        {"timestamp": (start + timedelta(hours=i)).isoformat(), "value": float(value)}
+        for i, value in enumerate(values)
+    ]
+
+def _iot_table(rng: np.random.Generator, asset_ids: List[str], rows: int) -> pa.Table:
+    start = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp() * 1e6)
+    sensors = np.array(["temperature", "pressure", "vibration", "efficiency"])
+    return pa.table({
+        "asset_id": pa.array(np.array(asset_ids)[rng.integers(len(asset_ids), size=rows)]),
+        "timestamp": pa.array(start + np.sort(rng.integers(0, 90 * 86400, size=rows)) * 1_000_000,
+                              type=pa.timestamp("us", tz="UTC")),
+        "sensor_type": pa.array(sensors[rng.integers(len(sensors), size=rows)]),
+        "value": pa.array(rng.normal(50, 10, rows)),
+        "unit": pa.array(np.full(rows, "u"))
+    })
+
+def _arrow_stream(table: pa.Table) -> bytes:
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+def _ndjson(table: pa.Table) -> bytes:
+    columns = table.to_pydict()
+    return "\n".join(
+        json.dumps({
+            "asset_id": asset_id, "timestamp": timestamp.isoformat(), "sensor_type": sensor_type,
+            "value": value, "unit": unit
+        })
+        for asset_id, timestamp, sensor_type, value, unit in zip(
+            columns["asset_id"], columns["timestamp"], columns["sensor_type"], columns["value"], columns["unit"]
+        )
+    ).encode()
+
+def feature_cases(service) -> List[BenchmarkCase]:
+    """The extract_* feature functions on a year of mock history"""
+    main = service.main
+    rng = np.random.default_rng(1)
+    asset_id = service.asset_ids[0]
+    cashflows = main.generate_mock_cashflows(asset_id, 365)
+    market_data = main.generate_mock_market_data(365)
+    utilization = main.generate_mock_utilization(asset_id, 365)
+    yields = rng.normal(0.08, 0.01, 60).tolist()
+    metrics = _risk_metrics(rng)
+    series = _time_series(rng, 24 * 30)
+    
+    return [
+        BenchmarkCase("extract_pricing_features", "features",
+                      lambda: main.extract_pricing_features(cashflows, market_data, utilization)),
+        BenchmarkCase("extract_yield_features", "features",
+                      lambda: main.extract_yield_features(yields, {"interest_rate": 0.05})),
+        BenchmarkCase("extract_risk_features", "features",
+                      lambda: main.extract_risk_features(
+                          metrics["financial_metrics"], metrics["market_exposure"], metrics["operational_metrics"]
+                      )),
+        BenchmarkCase("extract_anomaly_features", "features",
+                      lambda: main.extract_anomaly_features(series)),
+    ]
+
+def model_cases(service, batch_sizes=BATCH_SIZES) -> List[BenchmarkCase]:
+    """Each served model's predict (score_samples for anomaly) at several batch sizes"""
+    manager = service.main.model_manager
+    rng = np.random.default_rng(2)
+    cases = []
+    for model_name, method in MODEL_METHODS.items():
+        model = manager.pin(model_name)
+        scaler = model.scaler
+        for batch_size in batch_sizes:
+            # Rows drawn around the training distribution
+            features = scaler.mean_ + scaler.scale_ * rng.standard_normal((batch_size, len(scaler.mean_)))
+            cases.append(BenchmarkCase(
+                f"model.{model_name}.{method}[{batch_size}]", "models",
+                lambda model=model, method=method, features=features: getattr(model, method)(features),
+                items=batch_size
+            ))
+    return cases
+
+def _request(client, method: str, path: str, **kwargs) -> Callable[[], Any]:
+    def call():
+        response = client.request(method, path, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path} returned {response.status_code}: {response.text[:200]}")
+        return response
+    return call
+
+def endpoint_cases(service, client) -> List[BenchmarkCase]:
+    """Every HTTP endpoint backed by the in-memory stand-ins
+    
+    /assets/{asset_id}/history is left out: it reads Postgres, which has no
+    stand-in here.
+    """
+    main = service.main
+    rng = np.random.default_rng(3)
+    asset_id = service.asset_ids[0]
+    pricing = {
+        "asset_id": asset_id,
+        "cashflows": _dicts(main.generate_mock_cashflows(asset_id, 365)),
+        "market_data": _dicts(main.generate_mock_market_data(365)),
+        "utilization": _dicts(main.generate_mock_utilization(asset_id, 365)),
+        "valuation_date": "2024-12-31"
+    }
+    scenarios = {
+        **pricing,
+        "shocks": [
+            {"feature": "avg_interest_rate", "values": np.linspace(-0.02, 0.02, 10).tolist()},
+            {"feature": "avg_monthly_revenue", "values": np.linspace(-0.2, 0.2, 10).tolist(), "mode": "relative"},
+            {"feature": "avg_utilization", "values": np.linspace(-0.1, 0.1, 10).tolist()}
+        ],
+        "include_surface": False
+    }
+    monte_carlo = {
+        "asset_id": asset_id,
+        "cashflows": pricing["cashflows"],
+        "market_data": pricing["market_data"],
+        "valuation_date": "2024-12-31",
+        "n_paths": 10000,
+        "horizon_months": 120,
+        "seed": 7
+    }
+    yield_request = {
+        "asset_id": asset_id,
+        "historical_yields": rng.normal(0.08, 0.01, 60).tolist(),
+        "market_conditions": {"interest_rate": 0.05, "inflation_rate": 0.02}
+    }
+    risk = {"asset_id": asset_id, **_risk_metrics(rng)}
+    portfolio = {
+        "portfolio_id": "bench-portfolio",
+        "holdings": [
+            {"asset_id": holding_id, "weight": float(rng.uniform(1, 10)),
+             "sector": f"sector-{i % 7}", "geography": f"region-{i % 4}", **_risk_metrics(rng)}
+            for i, holding_id in enumerate(service.asset_ids)
+        ]
+    }
+    anomaly = {"asset_id": asset_id, "time_series_data": _time_series(rng, 24 * 7)}
+    
+    iot_rows = 10000
+    iot_batch = _iot_table(rng, service.asset_ids, iot_rows)
+    arrow_body = _arrow_stream(iot_batch)
+    ndjson_body = _ndjson(iot_batch)
+    
+    # Readings for the rollup query, flushed once so the rollups exist
+    main.iot_ingest.offer(_iot_table(rng, [asset_id], 50000))
+    client.portal.call(main.iot_ingest.flush)
+    
+    # Valuation snapshots for the key-value read path
+    service.celery_tasks.revalue_universe.apply().get()
+    
+    return [
+        BenchmarkCase("GET /", "endpoints", _request(client, "GET", "/")),
+        BenchmarkCase("GET /health", "endpoints", _request(client, "GET", "/health")),
+        BenchmarkCase("GET /metrics", "endpoints", _request(client, "GET", "/metrics")),
+        BenchmarkCase("POST /price", "endpoints", _request(client, "POST", "/price", json=pricing)),
+        BenchmarkCase("GET /price/{asset_id}", "endpoints", _request(client, "GET", f"/price/{asset_id}")),
+        BenchmarkCase("POST /price/scenarios", "endpoints",
+                      _request(client, "POST", "/price/scenarios", json=scenarios), items=1000),
+        BenchmarkCase("POST /price/monte_carlo", "endpoints",
+                      _request(client, "POST", "/price/monte_carlo", json=monte_carlo),
+                      items=monte_carlo["n_paths"], max_runs=20),
+        BenchmarkCase("POST /predict_yield", "endpoints", _request(client, "POST", "/predict_yield", json=yield_request)),
+        BenchmarkCase("POST /risk_score", "endpoints", _request(client, "POST", "/risk_score", json=risk)),
+        BenchmarkCase("POST /portfolio/risk", "endpoints",
+                      _request(client, "POST", "/portfolio/risk", json=portfolio), items=len(portfolio["holdings"])),
+        BenchmarkCase("POST /anomaly", "endpoints", _request(client, "POST", "/anomaly", json=anomaly)),
+        BenchmarkCase("GET /features/{feature_set}/{asset_id}", "endpoints",
+                      _request(client, "GET", f"/features/risk/{asset_id}")),
+        BenchmarkCase("POST /ingest/iot (arrow)", "endpoints",
+                      _request(client, "POST", "/ingest/iot", content=arrow_body,
+                               headers={"content-type": "application/vnd.apache.arrow.stream"}),
+                      items=iot_rows, max_runs=100),
+        BenchmarkCase("POST /ingest/iot (ndjson)", "endpoints",
+                      _request(client, "POST", "/ingest/iot", content=ndjson_body,
+                               headers={"content-type": "application/x-ndjson"}),
+                      items=iot_rows, max_runs=100),
+        BenchmarkCase("GET /assets/{asset_id}/rollups/{sensor_type}", "endpoints",
+                      _request(client, "GET", f"/assets/{asset_id}/rollups/temperature",
+                               params={"start": "2024-01-01T00:00:00", "end": "2024-04-01T00:00:00"})),
+        BenchmarkCase("POST /demo/generate_data", "endpoints",
+                      _request(client, "POST", "/demo/generate_data", params={"asset_id": asset_id}), max_runs=5),
+        BenchmarkCase("POST /retrain", "endpoints", _request(client, "POST", "/retrain")),
+    ]
+
+def celery_cases(service) -> List[BenchmarkCase]:
+    """batch_prediction and retrain_models executed eagerly in-process"""
+    tasks = service.celery_tasks
+    asset_ids = service.asset_ids
+    
+    def run(task, **kwargs):
+        return lambda: task.apply(kwargs=kwargs).get()
+    
+    return [
+        BenchmarkCase("celery.batch_prediction[risk]", "celery",
+                      run(tasks.batch_prediction, asset_ids=asset_ids, prediction_type="risk"), items=len(asset_ids)),
+        BenchmarkCase("celery.batch_prediction[anomaly]", "celery",
+                      run(tasks.batch_prediction, asset_ids=asset_ids, prediction_type="anomaly"), items=len(asset_ids)),
+        BenchmarkCase("celery.batch_prediction[pricing]", "celery",
+                      run(tasks.batch_prediction, asset_ids=asset_ids[:10], prediction_type="pricing"),
+                      items=10, max_runs=10),
+        BenchmarkCase("celery.revalue_universe", "celery",
+                      run(tasks.revalue_universe), items=len(asset_ids)),
+        # A full rebuild: an incremental run right after training has no new data
+        BenchmarkCase("celery.retrain_models[full]", "celery",
+                      run(tasks.retrain_models, asset_ids=asset_ids, mode="full"),
+                      items=len(asset_ids), max_runs=3, warmup=0),
+    ]
@@ -0,0 +1,183 @@
+"""
+Hermetic service environment for AIMY AI Core benchmarks
+Replaces MinIO with an in-memory object store, Redis with fakeredis and the
+Celery broker with eager in-process execution, then imports the service
+"""
+
+import io
+import os
+import sys
+import logging
+import tempfile
+import threading
+from datetime import datetime, timezone
+from typing import List, Dict, Tuple, Optional
+
+logger = logging.getLogger(__name__)
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class InMemoryObject:
+    """The subset of minio's Object the service reads"""
+    
+    def __init__(self, object_name: str, size: int = 0, last_modified: Optional[datetime] = None,
+                 is_dir: bool = False):
+        self.object_name = object_name
+        self.size = size
+        self.last_modified = last_modified
+        self.is_dir = is_dir
+        self.etag = None
+
+class InMemoryResponse(io.BytesIO):
+    """get_object result; close and release_conn are no-ops"""
+    
+    def release_conn(self):
+        pass
+
+class InMemoryMinio:
+    """Thread-safe in-memory stand-in for minio.Minio
+    
+    Supports the calls the service makes: bucket management, put/get of
+    streams and files, stat, listing with prefixes and removal.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        self.buckets: Dict[str, Dict[str, Tuple[bytes, datetime]]] = {}
+        self._lock = threading.Lock()
+    
+    def bucket_exists(self, bucket_name: str) -> bool:
+        return bucket_name in self.buckets
+    
+    def make_bucket(self, bucket_name: str, *args, **kwargs):
+        self.buckets.setdefault(bucket_name, {})
+    
+    def _objects(self, bucket_name: str) -> Dict[str, Tuple[bytes, datetime]]:
+        if bucket_name not in self.buckets:
+            raise KeyError(f"NoSuchBucket: {bucket_name}")
+        return self.buckets[bucket_name]
+    
+    def _get(self, bucket_name: str, object_name: str) -> Tuple[bytes, datetime]:
+        objects = self._objects(bucket_name)
+        if object_name not in objects:
+            raise KeyError(f"NoSuchKey: {object_name}")
+        return objects[object_name]
+    
+    def put_object(self, bucket_name: str, object_name: str, data, length: int = -1, *args, **kwargs):
+        payload = data.read() if hasattr(data, "read") else bytes(data)
+        with self._lock:
+            self._objects(bucket_name)[object_name] = (payload, datetime.now(timezone.utc))
+    
+    def fput_object(self, bucket_name: str, object_name: str, file_path: str, *args, **kwargs):
+        with open(file_path, "rb") as f:
+            self.put_object(bucket_name, object_name, f)
+    
+    def get_object(self, bucket_name: str, object_name: str, *args, **kwargs) -> InMemoryResponse:
+        return InMemoryResponse(self._get(bucket_name, object_name)[0])
+    
+    def fget_object(self, bucket_name: str, object_name: str, file_path: str, *args, **kwargs):
+        payload = self._get(bucket_name, object_name)[0]
+        with open(file_path, "wb") as f:
+            f.write(payload)
+    
+    def stat_object(self, bucket_name: str, object_name: str, *args, **kwargs) -> InMemoryObject:
+        payload, modified = self._get(bucket_name, object_name)
+        return InMemoryObject(object_name, len(payload), modified)
+    
+    def list_objects(self, bucket_name: str, prefix: str = "", recursive: bool = False,
+                     start_after: Optional[str] = None, **kwargs):
+        with self._lock:
+            items = sorted(self._objects(bucket_name).items())
+        directories = set()
+        for object_name, (payload, modified) in items:
+            if not object_name.startswith(prefix) or (start_after and object_name <= start_after):
+                continue
+            rest = object_name[len(prefix):]
+            if not recursive and "/" in rest:
+                directory = prefix + rest.split("/", 1)[0] + "/"
+                if directory not in directories:
+                    directories.add(directory)
+                    yield InMemoryObject(directory, is_dir=True)
+                continue
+            yield InMemoryObject(object_name, len(payload), modified)
+    
+    def remove_object(self, bucket_name: str, object_name: str, *args, **kwargs):
+        with self._lock:
+            self._objects(bucket_name).pop(object_name, None)
+    
+    def remove_objects(self, bucket_name: str, delete_object_list, *args, **kwargs):
+        for delete_object in delete_object_list:
+            # DeleteObject keeps the key as name (minio >= 7.2) or _name
+            self.remove_object(bucket_name, getattr(delete_object, "name", None) or delete_object._name)
+        return iter([])
+
+class HermeticService:
+    """The imported service modules and the stand-ins they were wired to"""
+    
+    def __init__(self, main, celery_tasks, redis_server, object_store: InMemoryMinio,
+                 workdir: str, asset_ids: List[str]):
+        self.main = main
+        self.celery_tasks = celery_tasks
+        self.redis_server = redis_server
+        self.object_store = object_store
+        self.workdir = workdir
+        self.asset_ids = asset_ids
+
+_service: Optional[HermeticService] = None
+
+def load_service(workdir: Optional[str] = None, n_assets: int = 50, train: bool = True,
+                 postgres_url: Optional[str] = None) -> HermeticService:
+    """Import the service against in-memory MinIO, Redis and Celery
+    
+    Must run before anything else imports main. With train=True the models
+    are fitted once through the eager retrain_models task, so every
+    benchmark sees fitted, exported and calibrated models, and features are
+    stored for n_assets assets. The prediction store connects to
+    postgres_url when one is given (tests) and stays disabled otherwise.
+    """
+    global _service
+    if _service is not None:
+        return _service
+    if "main" in sys.modules:
+        raise RuntimeError("main was imported before the hermetic environment was installed")
+    
+    import minio
+    import redis
+    import fakeredis
+    
+    workdir = workdir or tempfile.mkdtemp(prefix="aimy-bench-")
+    os.environ.update({
+        "FEATURE_STORE_DIR": os.path.join(workdir, "feature-store"),
+        "SHARED_MODEL_DIR": os.path.join(workdir, "shared-models"),
+        # Without Postgres an unreachable socket directory fails fast, and
+        # the prediction store stays disabled as it would in production
+        "POSTGRES_URL": postgres_url or f"postgresql://bench@/aimy_ai?host={os.path.join(workdir, 'no-postgres')}"
+    })
+    
+    server = fakeredis.FakeServer()
+    object_store = InMemoryMinio()
+    minio.Minio = lambda *args, **kwargs: object_store
+    redis.from_url = lambda *args, **kwargs: fakeredis.FakeRedis(server=server)
+    
+    if SERVICE_DIR not in sys.path:
+        sys.path.insert(0, SERVICE_DIR)
+    
+    from celery_app import celery_app
+    celery_app.conf.update(
+        task_always_eager=True,
+        task_eager_propagates=True,
+        broker_url="memory://",
+        result_backend="cache+memory://"
+    )
+    
+    import main
+    import celery_tasks
+    main.celery_app.conf.broker_url = "memory://"
+    main.async_redis.client = fakeredis.aioredis.FakeRedis(server=server)
+    
+    asset_ids = [f"bench-asset-{i:04d}" for i in range(n_assets)]
+    _service = HermeticService(main, celery_tasks, server, object_store, workdir, asset_ids)
+    if train:
+        logger.info(f"Training models on {n_assets} assets for the benchmark run")
+        celery_tasks.retrain_models.apply(kwargs={"asset_ids": asset_ids, "mode": "full"}).get()
+        main.model_manager.load_models()
+    return _service
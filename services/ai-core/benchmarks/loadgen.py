@@ -0,0 +1,406 @@
+"""
+Load generator for AIMY AI Core Service
+Drives the prediction endpoints of a running instance at stepped open-loop
+request rates and reports throughput, latency percentiles and errors per
+step, to find where a deployment saturates
+
+    # Against an instance that is already running
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --rates 10,20,50,100
+    
+    # Start uvicorn locally with 1, 2 and 4 workers and sweep each
+    python -m benchmarks.loadgen --spawn-workers 1,2,4 --output results/
+    
+    # Compare saved runs
+    python -m benchmarks.loadgen --compare results/workers-1.json results/workers-4.json
+
+Requests are sent on a fixed schedule regardless of how many are still
+outstanding, and latency is measured from each request's scheduled send
+time. A stalled server therefore shows up as latency, instead of slowing
+the generator down and hiding the queueing delay (coordinated omission).
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import subprocess
+from datetime import datetime, timezone
+from typing import List, Dict, Tuple, Optional, Any
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = ("price", "predict_yield", "risk_score", "anomaly")
+ENDPOINT_PATHS = {
+    "price": "/price",
+    "predict_yield": "/predict_yield",
+    "risk_score": "/risk_score",
+    "anomaly": "/anomaly"
+}
+
+def build_payloads(endpoints: List[str], pool_size: int, seed: int = 0) -> Dict[str, List[bytes]]:
+    """Serialized request bodies built from the service's generate_mock_* data
+    
+    The service module is imported against in-memory stand-ins, so building
+    payloads never touches the Redis, MinIO or Postgres of the instance
+    under test. That import rewrites os.environ (POSTGRES_URL and the
+    storage directories), so take any environment meant for a spawned
+    server before calling this. Bodies are serialized once, up front, to
+    keep the generator cheap while it runs.
+    """
+    from benchmarks.hermetic import load_service
+    main = load_service(n_assets=pool_size, train=False).main
+    logging.getLogger().setLevel(logging.WARNING)
+    
+    rng = np.random.default_rng(seed)
+    np.random.seed(seed)
+    payloads: Dict[str, List[bytes]] = {endpoint: [] for endpoint in endpoints}
+    
+    for i in range(pool_size):
+        asset_id = f"load-asset-{i:05d}"
+        if "price" in payloads:
+            payloads["price"].append({
+                "asset_id": asset_id,
+                "cashflows": [cf.dict() for cf in main.generate_mock_cashflows(asset_id, 365)],
+                "market_data": [md.dict() for md in main.generate_mock_market_data(365)],
+                "utilization": [u.dict() for u in main.generate_mock_utilization(asset_id, 365)],
+                "valuation_date": datetime.now().date().isoformat()
+            })
+        if "predict_yield" in payloads:
+            payloads["predict_yield"].append({
+                "asset_id": asset_id,
+                "historical_yields": rng.normal(0.08, 0.01, 60).tolist(),
+                "market_conditions": {
+                    "interest_rate": float(rng.uniform(0.02, 0.07)),
+                    "inflation_rate": float(rng.uniform(0.01, 0.04)),
+                    "market_volatility": float(rng.uniform(0.1, 0.3))
+                },
+                "forecast_horizon": 12
+            })
+        if "risk_score" in payloads:
+            payloads["risk_score"].append({
+                "asset_id": asset_id,
+                "financial_metrics": {
+                    "debt_to_equity": float(rng.uniform(0.2, 2.0)),
+                    "current_ratio": float(rng.uniform(0.8, 2.5)),
+                    "profit_margin": float(rng.uniform(-0.1, 0.3)),
+                    "return_on_equity": float(rng.uniform(0.0, 0.25)),
+                    "cash_flow_coverage": float(rng.uniform(0.5, 3.0))
+                },
+                "market_exposure": {
+                    "interest_rate_sensitivity": float(rng.uniform(0, 1)),
+                    "currency_exposure": float(rng.uniform(0, 1)),
+                    "commodity_exposure": float(rng.uniform(0, 1))
+                },
+                "operational_metrics": {
+                    "utilization_rate": float(rng.uniform(0.5, 1)),
+                    "efficiency": float(rng.uniform(0.6, 1)),
+                    "quality_score": float(rng.uniform(0.5, 1))
+                }
+            })
+        if "anomaly" in payloads:
+            # A week of one sensor from the mock IoT feed
+            readings = [
+                reading for reading in main.generate_mock_iot_data(asset_id, 24 * 7)
+                if reading.sensor_type == "temperature"
+            ]
+            payloads["anomaly"].append({
+                "asset_id": asset_id,
+                "time_series_data": [{"timestamp": r.timestamp, "value": r.value} for r in readings]
+            })
+    
+    return {
+        endpoint: [json.dumps(body).encode() for body in bodies]
+        for endpoint, bodies in payloads.items()
+    }
+
+def send_schedule(rate: float, duration: float, arrival: str, rng: np.random.Generator) -> np.ndarray:
+    """Send offsets in seconds for one step: evenly spaced or Poisson arrivals"""
+    n = int(rate * duration)
+    if arrival == "poisson":
+        offsets = np.cumsum(rng.exponential(1.0 / rate, size=int(n * 1.2) + 10))
+        return offsets[offsets < duration]
+    return np.arange(n) / rate
+
+async def run_step(client, rate: float, duration: float, warmup: float, endpoints: List[str],
+                   weights: np.ndarray, payloads: Dict[str, List[bytes]], arrival: str,
+                   timeout: float, rng: np.random.Generator) -> Dict[str, Any]:
+    """Send requests at a fixed rate for warmup + duration seconds
+    
+    Only requests scheduled after the warmup are counted. Each latency runs
+    from the request's scheduled time to its completion; throughput counts
+    the completions inside the measured window, so a server working off a
+    backlog is not credited with it.
+    """
+    import httpx
+    
+    offsets = send_schedule(rate, warmup + duration, arrival, rng)
+    choices = rng.choice(len(endpoints), size=len(offsets), p=weights)
+    records: List[Tuple[int, float, bool, float]] = []
+    send_lag = []
+    loop = asyncio.get_running_loop()
+    
+    async def fire(endpoint_index: int, scheduled: float, counted: bool):
+        endpoint = endpoints[endpoint_index]
+        bodies = payloads[endpoint]
+        body = bodies[int(rng.integers(len(bodies)))]
+        ok = False
+        try:
+            response = await client.post(
+                ENDPOINT_PATHS[endpoint], content=body,
+                headers={"content-type": "application/json"}, timeout=timeout
+            )
+            ok = response.status_code < 400
+        except (httpx.HTTPError, asyncio.TimeoutError):
+            ok = False
+        if counted:
+            finished = loop.time()
+            records.append((endpoint_index, finished - scheduled, ok, finished))
+    
+    start = loop.time() + 0.05
+    tasks = []
+    for offset, endpoint_index in zip(offsets, choices):
+        scheduled = start + offset
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        counted = offset >= warmup
+        if counted:
+            send_lag.append(loop.time() - scheduled)
+        tasks.append(asyncio.create_task(fire(int(endpoint_index), scheduled, counted)))
+    measured_end = loop.time()
+    await asyncio.gather(*tasks)
+    
+    def summarize(selected: List[Tuple[int, float, bool, float]], target: float) -> Dict[str, Any]:
+        latencies = np.array([latency for _, latency, ok, _ in selected if ok])
+        errors = sum(1 for _, _, ok, _ in selected if not ok)
+        window = max(measured_end - (start + warmup), 1e-9)
+        in_window = sum(1 for _, _, ok, finished in selected if ok and finished <= measured_end)
+        p50, p90, p99, p999 = np.percentile(latencies, [50, 90, 99, 99.9]) * 1000 if len(latencies) else [None] * 4
+        return {
+            "target_rate": target,
+            "offered_rate": len(selected) / window,
+            "sent": len(selected),
+            "completed": len(latencies),
+            "errors": errors,
+            "error_rate": errors / len(selected) if selected else 0.0,
+            "throughput": in_window / window,
+            "p50_ms": p50,
+            "p90_ms": p90,
+            "p99_ms": p99,
+            "p999_ms": p999,
+            "max_ms": float(latencies.max() * 1000) if len(latencies) else None
+        }
+    
+    result = summarize(records, rate)
+    result["generator_lag_p99_ms"] = float(np.percentile(send_lag, 99) * 1000) if send_lag else 0.0
+    result["endpoints"] = {
+        endpoint: summarize([record for record in records if record[0] == i], rate * weights[i])
+        for i, endpoint in enumerate(endpoints)
+    }
+    return result
+
+def saturated(step: Dict[str, Any], throughput_tolerance: float, max_error_rate: float,
+              p99_slo_ms: Optional[float]) -> Optional[str]:
+    """Why a step counts as saturated, or None if the server kept up"""
+    if step["error_rate"] > max_error_rate:
+        return f"error rate {step['error_rate']:.1%}"
+    # Against the rate actually offered: Poisson arrivals scatter around the target
+    if step["throughput"] < step["offered_rate"] * (1 - throughput_tolerance):
+        return f"throughput {step['throughput']:.1f}/s below offered {step['offered_rate']:.1f}/s"
+    if p99_slo_ms is not None and (step["p99_ms"] is None or step["p99_ms"] > p99_slo_ms):
+        return f"p99 above {p99_slo_ms:g} ms"
+    return None
+
+async def sweep(url: str, rates: List[float], duration: float, warmup: float, endpoints: List[str],
+                weights: np.ndarray, payloads: Dict[str, List[bytes]], args: argparse.Namespace) -> Dict[str, Any]:
+    """Run each rate step in turn, stopping after the configured number of saturated steps"""
+    import httpx
+    
+    rng = np.random.default_rng(args.seed)
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    steps = []
+    max_sustained = None
+    saturation = None
+    async with httpx.AsyncClient(base_url=url, limits=limits) as client:
+        for rate in rates:
+            step = await run_step(client, rate, duration, warmup, endpoints, weights, payloads,
+                                  args.arrival, args.timeout, rng)
+            step["saturated"] = saturated(step, args.throughput_tolerance, args.max_error_rate, args.p99_slo_ms)
+            steps.append(step)
+            print_step(step)
+            if step["saturated"] is None:
+                max_sustained = rate
+            elif saturation is None:
+                saturation = {"rate": rate, "reason": step["saturated"]}
+            if len([s for s in steps if s["saturated"]]) >= args.stop_after:
+                break
+            await asyncio.sleep(args.cooldown)
+    
+    return {"steps": steps, "max_sustained_rate": max_sustained, "saturation": saturation}
+
+def print_step(step: Dict[str, Any]):
+    def ms(value):
+        return f"{value:10.1f}" if value is not None else f"{'-':>10}"
+    print(
+        f"{step['target_rate']:>10.1f} {step['throughput']:>10.1f} {ms(step['p50_ms'])} {ms(step['p99_ms'])} "
+        f"{step['error_rate']:>8.1%} {step['generator_lag_p99_ms']:>10.1f}  {step['saturated'] or ''}"
+    )
+
+def print_header(label: str):
+    print(f"\n== {label}")
+    print(f"{'rate/s':>10} {'done/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8} {'gen lag':>10}")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def spawn_server(workers: int, port: int, env: Dict[str, str]) -> subprocess.Popen:
+    """Start uvicorn on this checkout with the given worker count and environment"""
+    from benchmarks.hermetic import SERVICE_DIR
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=SERVICE_DIR, env=env
+    )
+
+def wait_healthy(url: str, timeout: float, process: Optional[subprocess.Popen] = None):
+    import httpx
+    
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{url}/health", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not become healthy within {timeout:.0f}s")
+
+def compare_reports(paths: List[str]):
+    """Side-by-side max sustained rate and p99 at each rate of saved runs"""
+    reports = []
+    for path in paths:
+        with open(path) as f:
+            reports.append(json.load(f))
+    
+    print(f"{'run':<30} {'max sustained/s':>16} {'saturates at':>14}  reason")
+    for report in reports:
+        saturation = report["result"]["saturation"] or {}
+        print(
+            f"{report['label']:<30} {report['result']['max_sustained_rate'] or 0:>16.1f} "
+            f"{saturation.get('rate', float('nan')):>14.1f}  {saturation.get('reason', '')}"
+        )
+    
+    rates = sorted({step["target_rate"] for report in reports for step in report["result"]["steps"]})
+    print(f"\np99 ms by target rate\n{'rate/s':>10} " + " ".join(f"{report['label'][:16]:>16}" for report in reports))
+    for rate in rates:
+        cells = []
+        for report in reports:
+            step = next((s for s in report["result"]["steps"] if s["target_rate"] == rate), None)
+            cells.append(f"{step['p99_ms']:>16.1f}" if step and step["p99_ms"] is not None else f"{'-':>16}")
+        print(f"{rate:>10.1f} " + " ".join(cells))
+
+def parse_mix(mix: str) -> Tuple[List[str], np.ndarray]:
+    """'price=2,anomaly=1' -> endpoints and normalized weights"""
+    endpoints, weights = [], []
+    for part in mix.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in ENDPOINT_PATHS:
+            raise ValueError(f"Unknown endpoint {name}; choose from {', '.join(ENDPOINTS)}")
+        endpoints.append(name)
+        weights.append(float(weight) if weight else 1.0)
+    weights = np.asarray(weights)
+    return endpoints, weights / weights.sum()
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Open-loop load generator for the AIMY AI Core API")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default="http://127.0.0.1:8000", help="Instance under test")
+    target.add_argument("--spawn-workers", default=None, help="Start local uvicorn with each worker count, e.g. 1,2,4")
+    parser.add_argument("--compare", nargs="+", default=None, help="Compare saved JSON reports and exit")
+    parser.add_argument("--rates", default="5,10,20,50,100,200", help="Target request rates per second, in order")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds per step")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds at the start of each step")
+    parser.add_argument("--cooldown", type=float, default=2.0, help="Idle seconds between steps")
+    parser.add_argument("--mix", default=",".join(ENDPOINTS), help="Endpoint weights, e.g. price=2,anomaly=1")
+    parser.add_argument("--arrival", choices=("uniform", "poisson"), default="poisson")
+    parser.add_argument("--payloads", type=int, default=50, help="Distinct payloads per endpoint")
+    parser.add_argument("--connections", type=int, default=512, help="Client connection pool size")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--throughput-tolerance", type=float, default=0.05,
+                        help="A step saturates when completions fall this far below the target rate")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--p99-slo-ms", type=float, default=None, help="A step also saturates above this p99")
+    parser.add_argument("--stop-after", type=int, default=2, help="Stop a sweep after this many saturated steps")
+    parser.add_argument("--label", default=None, help="Name of this configuration in reports")
+    parser.add_argument("--output", default=None, help="JSON report file, or a directory for --spawn-workers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    return parser.parse_args(argv)
+
+def write_report(path: str, label: str, config: Dict[str, Any], result: Dict[str, Any]):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({
+            "label": label,
+            "created": datetime.now(timezone.utc).isoformat(),
+            "config": config,
+            "result": result
+        }, f, indent=2)
+    print(f"Wrote {path}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.compare:
+        compare_reports(args.compare)
+        return 0
+    
+    endpoints, weights = parse_mix(args.mix)
+    rates = [float(rate) for rate in args.rates.split(",")]
+    # Spawned servers run with the caller's configuration, not the
+    # hermetic one building the payloads installs
+    server_env = dict(os.environ)
+    payloads = build_payloads(endpoints, args.payloads, args.seed)
+    config = {
+        "rates": rates, "duration": args.duration, "warmup": args.warmup, "arrival": args.arrival,
+        "mix": dict(zip(endpoints, weights.tolist())), "connections": args.connections
+    }
+    
+    if not args.spawn_workers:
+        wait_healthy(args.url, args.startup_timeout)
+        label = args.label or args.url
+        print_header(label)
+        result = asyncio.run(sweep(args.url, rates, args.duration, args.warmup, endpoints, weights, payloads, args))
+        if args.output:
+            write_report(args.output, label, {**config, "url": args.url}, result)
+        return 0
+    
+    for workers in [int(count) for count in args.spawn_workers.split(",")]:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        label = f"{args.label or 'workers'}-{workers}"
+        process = spawn_server(workers, port, server_env)
+        try:
+            wait_healthy(url, args.startup_timeout, process)
+            print_header(label)
+            result = asyncio.run(sweep(url, rates, args.duration, args.warmup, endpoints, weights, payloads, args))
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if args.output:
+            write_report(os.path.join(args.output, f"{label}.json"), label, {**config, "workers": workers}, result)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
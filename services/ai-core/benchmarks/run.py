@@ -0,0 +1,191 @@
+"""
+Benchmark runner for AIMY AI Core Service
+Times every case, writes the results as a JSON baseline and fails when a
+case regresses p50/p99 latency or throughput beyond the tolerance
+
+    python -m benchmarks.run                      # run, compare with the baseline
+    python -m benchmarks.run --save               # record a new baseline
+    python -m benchmarks.run --groups models --filter anomaly
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Any
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "baseline.json")
+BASELINE_FORMAT_VERSION = 1
+
+def measure(case, min_time: float, min_runs: int, max_runs: int) -> Dict[str, Any]:
+    """Run a case until min_time has passed and min_runs calls are done"""
+    for _ in range(case.warmup):
+        case.func()
+    
+    max_runs = min(max_runs, case.max_runs or max_runs)
+    durations = []
+    started = time.perf_counter()
+    while len(durations) < max_runs and (len(durations) < min_runs or time.perf_counter() - started < min_time):
+        call_started = time.perf_counter_ns()
+        case.func()
+        durations.append(time.perf_counter_ns() - call_started)
+    
+    seconds = np.asarray(durations, dtype=np.float64) / 1e9
+    p50, p99 = np.percentile(seconds, [50, 99])
+    return {
+        "group": case.group,
+        "runs": len(durations),
+        "items": case.items,
+        "mean_ms": float(seconds.mean() * 1000),
+        "p50_ms": float(p50 * 1000),
+        "p99_ms": float(p99 * 1000),
+        "min_ms": float(seconds.min() * 1000),
+        "throughput": float(case.items * len(seconds) / seconds.sum())
+    }
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            tolerance: float, p99_tolerance: float) -> List[str]:
+    """Regressions of results against a baseline, as readable lines"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        checks = [
+            ("p50", result["p50_ms"], base["p50_ms"] * (1 + tolerance), result["p50_ms"] > base["p50_ms"] * (1 + tolerance)),
+            ("p99", result["p99_ms"], base["p99_ms"] * (1 + p99_tolerance), result["p99_ms"] > base["p99_ms"] * (1 + p99_tolerance)),
+            ("throughput", result["throughput"], base["throughput"] * (1 - tolerance),
+             result["throughput"] < base["throughput"] * (1 - tolerance)),
+        ]
+        for metric, value, limit, regressed in checks:
+            if regressed:
+                regressions.append(f"{name}: {metric} {value:.4g} beyond limit {limit:.4g}")
+    return regressions
+
+def load_baseline(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline.get("format_version") != BASELINE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported baseline format in {path}")
+    return baseline
+
+def save_baseline(path: str, results: Dict[str, Dict[str, Any]], settings: Dict[str, Any]):
+    """Write results, merged into an existing baseline so partial runs keep other cases"""
+    existing = load_baseline(path) or {"cases": {}}
+    baseline = {
+        "format_version": BASELINE_FORMAT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "settings": settings,
+        "cases": {**existing["cases"], **results}
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+def print_results(results: Dict[str, Dict[str, Any]], baseline_cases: Dict[str, Dict[str, Any]]):
+    print(f"{'case':<52} {'runs':>6} {'p50 ms':>10} {'p99 ms':>10} {'items/s':>12} {'p50 vs base':>12}")
+    for name, result in results.items():
+        base = baseline_cases.get(name)
+        change = f"{(result['p50_ms'] / base['p50_ms'] - 1) * 100:+.1f}%" if base else "new"
+        print(
+            f"{name:<52} {result['runs']:>6} {result['p50_ms']:>10.3f} {result['p99_ms']:>10.3f} "
+            f"{result['throughput']:>12.1f} {change:>12}"
+        )
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    from benchmarks.cases import GROUPS, BATCH_SIZES
+    
+    parser = argparse.ArgumentParser(description="AIMY AI Core benchmark suite")
+    parser.add_argument("--groups", default=",".join(GROUPS), help="Comma-separated case groups to run")
+    parser.add_argument("--filter", default=None, help="Regular expression selecting case names")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare with and save to")
+    parser.add_argument("--save", action="store_true", help="Record the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=float(os.getenv("BENCH_TOLERANCE", "0.2")),
+                        help="Allowed fractional p50 and throughput regression")
+    parser.add_argument("--p99-tolerance", type=float, default=float(os.getenv("BENCH_P99_TOLERANCE", "0.5")),
+                        help="Allowed fractional p99 regression")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Minimum seconds spent timing each case")
+    parser.add_argument("--min-runs", type=int, default=5)
+    parser.add_argument("--max-runs", type=int, default=2000)
+    parser.add_argument("--batch-sizes", default=",".join(str(size) for size in BATCH_SIZES))
+    parser.add_argument("--assets", type=int, default=50, help="Assets trained on and scored in batch cases")
+    parser.add_argument("--output", default=None, help="Also write this run's results to a JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Keep the service's INFO logging")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    groups = [group.strip() for group in args.groups.split(",") if group.strip()]
+    pattern = re.compile(args.filter) if args.filter else None
+    
+    # Install the stand-ins before anything imports the service
+    from benchmarks.hermetic import load_service
+    from benchmarks import cases as benchmark_cases
+    service = load_service(n_assets=args.assets)
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    
+    from fastapi.testclient import TestClient
+    
+    results: Dict[str, Dict[str, Any]] = {}
+    failures: List[str] = []
+    
+    def run_cases(selected):
+        for case in selected:
+            if case.group not in groups or (pattern and not pattern.search(case.name)):
+                continue
+            try:
+                results[case.name] = measure(case, args.min_time, args.min_runs, args.max_runs)
+            except Exception as e:
+                failures.append(f"{case.name}: {e}")
+                logger.error(f"Benchmark {case.name} failed: {e}")
+    
+    if "features" in groups:
+        run_cases(benchmark_cases.feature_cases(service))
+    if "models" in groups:
+        batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+        run_cases(benchmark_cases.model_cases(service, batch_sizes))
+    if "endpoints" in groups:
+        with TestClient(service.main.app) as client:
+            run_cases(benchmark_cases.endpoint_cases(service, client))
+    # Last: retraining reloads the models the other groups measure
+    if "celery" in groups:
+        run_cases(benchmark_cases.celery_cases(service))
+    
+    baseline = load_baseline(args.baseline)
+    baseline_cases = baseline["cases"] if baseline else {}
+    print_results(results, baseline_cases)
+    
+    settings = {"min_time": args.min_time, "min_runs": args.min_runs, "assets": args.assets}
+    if args.output:
+        save_baseline(args.output, results, settings)
+    
+    regressions = [] if args.save else compare(results, baseline_cases, args.tolerance, args.p99_tolerance)
+    if args.save:
+        save_baseline(args.baseline, results, settings)
+        print(f"Saved baseline with {len(results)} cases to {args.baseline}")
+    elif baseline is None:
+        print(f"No baseline at {args.baseline}; run with --save to record one")
+    
+    for line in failures:
+        print(f"FAILED {line}")
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if failures or regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Score calibration for AIMY AI Core Service
+Empirical quantile tables of model scores over the training data, stored
+with the model so a served score maps to its training percentile with a
+binary search
+"""
+
+import json
+import logging
+from typing import Dict, Optional, Any
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUANTILE_LEVELS = 1001
+
+# Severity bands by training percentile; a score is anomalous below the
+# percentile matching the IsolationForest contamination (0.1)
+ANOMALY_PERCENTILE = 10.0
+HIGH_SEVERITY_PERCENTILE = 1.0
+
+class ScoreCalibration:
+    """Quantile table of training scores for one model version
+    
+    quantiles[i] is the score at levels[i] (0..1). Lower scores are more
+    anomalous for IsolationForest.score_samples, so a low percentile means
+    the score is rarer than almost all of the training data.
+    """
+    
+    def __init__(self, levels: np.ndarray, quantiles: np.ndarray, version: str, n_samples: int):
+        self.levels = np.asarray(levels, dtype=np.float64)
+        self.quantiles = np.asarray(quantiles, dtype=np.float64)
+        self.version = version
+        self.n_samples = n_samples
+    
+    @classmethod
+    def fit(cls, scores: np.ndarray, version: str = "unknown",
+            n_levels: int = DEFAULT_QUANTILE_LEVELS) -> "ScoreCalibration":
+        """Summarize training scores into n_levels evenly spaced quantiles"""
+        scores = np.asarray(scores, dtype=np.float64)
+        scores = scores[np.isfinite(scores)]
+        if len(scores) == 0:
+            raise ValueError("Cannot calibrate on an empty score sample")
+        
+        levels = np.linspace(0.0, 1.0, min(n_levels, max(2, len(scores))))
+        return cls(levels, np.quantile(scores, levels), version, len(scores))
+    
+    def percentile(self, score: float) -> float:
+        """Training percentile (0-100) of a score, interpolated between quantiles"""
+        quantiles = self.quantiles
+        if score <= quantiles[0]:
+            return 0.0
+        if score >= quantiles[-1]:
+            return 100.0
+        
+        # Ties in the table (plateaus of identical scores) resolve to the
+        # middle of the plateau
+        left = int(np.searchsorted(quantiles, score, side="left"))
+        right = int(np.searchsorted(quantiles, score, side="right"))
+        if left != right:
+            return float((self.levels[left] + self.levels[right - 1]) * 50.0)
+        
+        low, high = quantiles[left - 1], quantiles[left]
+        fraction = (score - low) / (high - low)
+        return float((self.levels[left - 1] + fraction * (self.levels[left] - self.levels[left - 1])) * 100.0)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "n_samples": self.n_samples,
+            "levels": self.levels.tolist(),
+            "quantiles": self.quantiles.tolist()
+        }
+    
+    def to_json(self) -> bytes:
+        return json.dumps(self.to_dict()).encode()
+    
+    @classmethod
+    def from_json(cls, data: bytes) -> "ScoreCalibration":
+        payload = json.loads(data)
+        return cls(payload["levels"], payload["quantiles"], payload["version"], payload["n_samples"])
+
+def anomaly_severity(percentile: Optional[float]) -> Optional[str]:
+    """Severity of an anomaly score from its training percentile, None if normal"""
+    if percentile is None or percentile >= ANOMALY_PERCENTILE:
+        return None
+    return "HIGH" if percentile < HIGH_SEVERITY_PERCENTILE else "MEDIUM"
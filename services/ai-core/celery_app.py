@@ -30,7 +30,10 @@ celery_app.conf.update(
     # Task routing
     task_routes={
         "celery_tasks.retrain_models": {"queue": "model_training"},
+        "celery_tasks.build_feature_shard": {"queue": "feature_build"},
+        "celery_tasks.train_from_feature_shards": {"queue": "model_training"},
         "celery_tasks.batch_prediction": {"queue": "batch_processing"},
+        "celery_tasks.revalue_universe": {"queue": "batch_processing"},
         "celery_tasks.data_processing": {"queue": "data_processing"},
     },
     
@@ -42,6 +45,8 @@ celery_app.conf.update(
     # Worker configuration
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
+    # Also recycle a child once its RSS passes this many KiB (0 disables)
+    worker_max_memory_per_child=int(os.getenv("CELERY_MAX_MEMORY_PER_CHILD_KB", "0")) or None,
     
     # Result backend configuration
     result_expires=3600,  # 1 hour
@@ -50,7 +55,19 @@ celery_app.conf.update(
     beat_schedule={
         "daily-model-retraining": {
             "task": "celery_tasks.retrain_models",
-            "schedule": crontab(hour=2, minute=0),  # 2 AM daily
+            "schedule": crontab(day_of_week="1-6", hour=2, minute=0),  # 2 AM Mon-Sat
+            "args": (),
+            "kwargs": {"mode": "incremental"},
+        },
+        "weekly-full-model-rebuild": {
+            "task": "celery_tasks.retrain_models",
+            "schedule": crontab(day_of_week=0, hour=2, minute=0),  # Sunday 2 AM
+            "args": (),
+            "kwargs": {"mode": "full"},
+        },
+        "valuation-snapshots": {
+            "task": "celery_tasks.revalue_universe",
+            "schedule": crontab(minute="*/15"),  # Every 15 minutes
             "args": (),
         },
         "hourly-metrics-collection": {
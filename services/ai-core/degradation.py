@@ -0,0 +1,171 @@
+"""
+Graceful degradation for AIMY AI Core Service
+Detects overload from event-loop lag and inference queueing delay, and provides the
+fallback answers (last cached prediction, truncated-ensemble approximation)
+served while the service is degraded or a model is unavailable
+"""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple, Any
+import numpy as np
+from shared_models import SharedModel
+
+logger = logging.getLogger(__name__)
+
+# Per-request holder: the middleware stamps the arrival time ("arrived"),
+# inference records how long it waited ("queued") and endpoints mark
+# fallback answers ("reason"); the middleware feeds the wait to the
+# LoadMonitor and turns the reason into a response header
+degradation_context: ContextVar[Optional[Dict[str, str]]] = ContextVar("degradation_context", default=None)
+
+DEGRADED_HEADER = "X-AIMY-Degraded"
+
+def mark_degraded(reason: str):
+    """Flag the current request as answered by a fallback"""
+    context = degradation_context.get()
+    if context is not None:
+        context["reason"] = reason
+
+def mark_inference_start():
+    """Record how long the current request waited before its inference began
+    
+    Only the first inference of a request counts; requests that run no
+    inference (ingestion, debug, demo routes) never record a wait.
+    """
+    context = degradation_context.get()
+    if context is not None and "arrived" in context and "queued" not in context:
+        context["queued"] = time.monotonic() - context["arrived"]
+
+class LoadMonitor:
+    """Overload detector with hysteresis
+    
+    Tracks an EWMA of the queueing delay of inference requests (arrival to
+    start of inference, see mark_inference_start) and of event-loop lag
+    (how late a periodic probe wakes up, i.e. how long ready work waits to
+    run). Routes that are slow by design do not feed it, since they have
+    no fallback to shed load onto. The
+    service turns degraded when either exceeds its budget and recovers once
+    both fall below recovery_ratio of their budgets, after staying degraded
+    for at least min_degraded_seconds.
+    """
+    
+    def __init__(self, latency_budget: float, lag_budget: float, recovery_ratio: float = 0.5,
+                 min_degraded_seconds: float = 10.0, alpha: float = 0.2, probe_interval: float = 0.1):
+        self.latency_budget = latency_budget
+        self.lag_budget = lag_budget
+        self.recovery_ratio = recovery_ratio
+        self.min_degraded_seconds = min_degraded_seconds
+        self.alpha = alpha
+        self.probe_interval = probe_interval
+        self.latency_ewma = 0.0
+        self.lag_ewma = 0.0
+        self.degraded = False
+        self.degraded_since: Optional[float] = None
+        self.transitions = 0
+        self._probe_task: Optional[asyncio.Task] = None
+    
+    def observe_latency(self, seconds: float):
+        """Fold in the queueing delay of one inference request"""
+        self.latency_ewma += self.alpha * (seconds - self.latency_ewma)
+        self._update()
+    
+    def observe_lag(self, seconds: float):
+        self.lag_ewma += self.alpha * (max(seconds, 0.0) - self.lag_ewma)
+        self._update()
+    
+    def pressure(self) -> float:
+        """Load relative to budget; above 1 means over budget"""
+        return max(self.latency_ewma / self.latency_budget, self.lag_ewma / self.lag_budget)
+    
+    def _update(self):
+        pressure = self.pressure()
+        now = time.monotonic()
+        if not self.degraded and pressure > 1.0:
+            self.degraded = True
+            self.degraded_since = now
+            self.transitions += 1
+            logger.warning(
+                f"Entering degraded mode (queueing delay {self.latency_ewma * 1000:.0f} ms, "
+                f"loop lag {self.lag_ewma * 1000:.0f} ms)"
+            )
+        elif self.degraded and pressure < self.recovery_ratio and now - self.degraded_since >= self.min_degraded_seconds:
+            self.degraded = False
+            self.degraded_since = None
+            self.transitions += 1
+            logger.info("Leaving degraded mode")
+    
+    async def _probe(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.probe_interval)
+            self.observe_lag(loop.time() - started - self.probe_interval)
+    
+    def start(self):
+        if self._probe_task is None:
+            self._probe_task = asyncio.create_task(self._probe())
+    
+    async def stop(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+    
+    def status(self) -> Dict[str, Any]:
+        return {
+            "degraded": self.degraded,
+            "degraded_for_seconds": time.monotonic() - self.degraded_since if self.degraded else 0.0,
+            "latency_ewma_ms": self.latency_ewma * 1000,
+            "loop_lag_ewma_ms": self.lag_ewma * 1000,
+            "pressure": self.pressure(),
+            "transitions": self.transitions
+        }
+
+class PredictionCache:
+    """Bounded LRU of the last prediction per (model, asset)"""
+    
+    def __init__(self, max_entries: int = 100000, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, float]]" = OrderedDict()
+    
+    def put(self, model_name: str, asset_id: str, value: float):
+        key = (model_name, asset_id)
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def get(self, model_name: str, asset_id: str) -> Optional[float]:
+        entry = self._entries.get((model_name, asset_id))
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+def approximate_predict(model, X: np.ndarray, method: str = "predict", tree_fraction: float = 0.1) -> np.ndarray:
+    """Cheap approximation of a tree ensemble using only its first trees
+    
+    Forest averages and isolation path lengths over a subset of trees, and
+    the first boosting rounds, cost a fraction of the full model.
+    """
+    if isinstance(model, SharedModel):
+        max_trees = max(1, int(round(model.meta["n_trees"] * tree_fraction)))
+        return getattr(model, method)(X, max_trees=max_trees)
+    
+    if hasattr(model, "booster_"):
+        num_iteration = max(1, int(round(model.booster_.current_iteration() * tree_fraction)))
+        return model.predict(X, num_iteration=num_iteration)
+    
+    if method == "predict" and hasattr(model, "estimators_") and hasattr(model, "n_outputs_"):
+        estimators = model.estimators_[:max(1, int(round(len(model.estimators_) * tree_fraction)))]
+        return np.mean([estimator.predict(X) for estimator in estimators], axis=0)
+    
+    # No cheaper form (e.g. a private isolation forest); use the full model
+    return getattr(model, method)(X)
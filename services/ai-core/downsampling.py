@@ -0,0 +1,48 @@
+"""
+Time series downsampling for AIMY AI Core Service
+Reduces chart series to a bounded number of points before they are sent
+"""
+
+import numpy as np
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets downsampling
+    
+    Returns the indices of the points to keep, in order. The first and last
+    points are always kept; every bucket in between contributes the point
+    forming the largest triangle with the previously kept point and the
+    average of the next bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    
+    # Bucket edges over the interior points 1..n-2
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    
+    previous = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        
+        # Average of the next bucket (the last point for the final bucket)
+        if i + 2 < len(edges):
+            next_lo, next_hi = edges[i + 1], edges[i + 2]
+            avg_x = x[next_lo:next_hi].mean()
+            avg_y = y[next_lo:next_hi].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (avg_y - y[previous])
+        )
+        previous = lo + int(np.argmax(areas))
+        selected[i + 1] = previous
+    
+    return selected
@@ -0,0 +1,425 @@
+"""
+Feature store for AIMY AI Core Service
+Materializes per-asset feature vectors into memory-mappable columnar files
+shared by model training (bulk matrix loads) and online serving (lookups)
+"""
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple, Iterable
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Layout: {root}/{feature_set}/v{version}/part-{written_ns}-{uid}/
+#   manifest.json     columns, row count and write time (written last)
+#   asset_id.npy      fixed-width unicode asset identifiers
+#   as_of.npy         datetime64[s] as-of timestamps
+#   <column>.npy      one float64 array per feature column
+MANIFEST_FILE = "manifest.json"
+ASSET_ID_FILE = "asset_id.npy"
+AS_OF_FILE = "as_of.npy"
+# Held (flock) by the process compacting a feature set version
+COMPACT_LOCK_FILE = ".compact.lock"
+
+class FeatureMatrix:
+    """Feature rows loaded from the store, one row per asset"""
+    
+    def __init__(self, asset_ids: np.ndarray, as_of: np.ndarray, values: np.ndarray, columns: List[str]):
+        self.asset_ids = asset_ids
+        self.as_of = as_of
+        self.values = values
+        self.columns = columns
+    
+    def __len__(self) -> int:
+        return len(self.asset_ids)
+    
+    def column(self, name: str) -> np.ndarray:
+        """Return a single feature column"""
+        return self.values[:, self.columns.index(name)]
+
+class _Part:
+    """A single immutable, memory-mapped part of a feature set"""
+    
+    def __init__(self, path: str, columns: List[str]):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.asset_ids = np.load(os.path.join(path, ASSET_ID_FILE), mmap_mode="r")
+        self.as_of = np.load(os.path.join(path, AS_OF_FILE), mmap_mode="r")
+        self.columns = {
+            column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r")
+            for column in columns
+        }
+    
+    def row(self, index: int, columns: List[str]) -> np.ndarray:
+        return np.array([self.columns[column][index] for column in columns], dtype=np.float64)
+    
+    def matrix(self, rows: np.ndarray, columns: List[str]) -> np.ndarray:
+        return np.column_stack([self.columns[column][rows] for column in columns])
+
+class _FeatureSetIndex:
+    """Sorted (asset_id, as_of) index over all parts of a feature set"""
+    
+    def __init__(self, parts: List[_Part]):
+        self.parts = parts
+        if parts:
+            asset_ids = np.concatenate([part.asset_ids for part in parts])
+            as_of = np.concatenate([part.as_of for part in parts])
+            part_index = np.concatenate([np.full(len(part.asset_ids), i, dtype=np.int32) for i, part in enumerate(parts)])
+            row_index = np.concatenate([np.arange(len(part.asset_ids), dtype=np.int64) for part in parts])
+        else:
+            asset_ids = np.array([], dtype="U1")
+            as_of = np.array([], dtype="datetime64[s]")
+            part_index = np.array([], dtype=np.int32)
+            row_index = np.array([], dtype=np.int64)
+        
+        # Sort by asset, then as-of, then write order so the last row of an
+        # (asset, as_of) run is the most recently written one
+        order = np.lexsort((row_index, part_index, as_of, asset_ids))
+        self.asset_ids = asset_ids[order]
+        self.as_of = as_of[order]
+        self.part_index = part_index[order]
+        self.row_index = row_index[order]
+        self.loaded_at = time.monotonic()
+    
+    def locate(self, asset_id: str, as_of: Optional[np.datetime64]) -> Optional[Tuple[int, int, np.datetime64]]:
+        """Find the latest row for an asset at or before `as_of` (O(log n))"""
+        lo = np.searchsorted(self.asset_ids, asset_id, side="left")
+        hi = np.searchsorted(self.asset_ids, asset_id, side="right")
+        if lo == hi:
+            return None
+        
+        if as_of is None:
+            position = hi - 1
+        else:
+            position = lo + np.searchsorted(self.as_of[lo:hi], as_of, side="right") - 1
+            if position < lo:
+                return None
+        
+        return int(self.part_index[position]), int(self.row_index[position]), self.as_of[position]
+    
+    def latest_rows(self, as_of: Optional[np.datetime64], since: Optional[np.datetime64], asset_ids: Optional[Iterable[str]]) -> np.ndarray:
+        """Positions of the latest row per asset inside the (since, as_of] window"""
+        mask = np.ones(len(self.asset_ids), dtype=bool)
+        if as_of is not None:
+            mask &= self.as_of <= as_of
+        if since is not None:
+            mask &= self.as_of > since
+        if asset_ids is not None:
+            mask &= np.isin(self.asset_ids, np.array(list(asset_ids), dtype=str))
+        
+        positions = np.flatnonzero(mask)
+        if len(positions) == 0:
+            return positions
+        
+        # Last position of each asset run
+        selected = self.asset_ids[positions]
+        is_last = np.ones(len(positions), dtype=bool)
+        is_last[:-1] = selected[1:] != selected[:-1]
+        return positions[is_last]
+
+class FeatureStore:
+    """Versioned, append-only store of per-asset feature vectors
+    
+    Writers add immutable parts; readers memory-map them, so any number of
+    API and Celery worker processes on a host share the same pages. Every
+    process that writes and reads the same features must see the same
+    root_dir, so API and worker hosts need a shared volume.
+    
+    Online rows are buffered per process and written every flush_rows rows
+    or when flush() is called (periodically by the API). Once compact_parts
+    parts smaller than compact_max_rows have accumulated at the end of a
+    feature set, the writer merges them, so the number of parts (and of
+    memory maps per reader) stays bounded.
+    """
+    
+    def __init__(self, root_dir: str, refresh_interval: float = 5.0, flush_rows: int = 1000,
+                 compact_parts: int = 16, compact_max_rows: int = 250000):
+        self.root_dir = root_dir
+        self.refresh_interval = refresh_interval
+        self.flush_rows = flush_rows
+        self.compact_parts = compact_parts
+        self.compact_max_rows = compact_max_rows
+        self.feature_sets: Dict[str, Dict] = {}
+        self._indexes: Dict[str, _FeatureSetIndex] = {}
+        self._part_names: Dict[str, List[str]] = {}
+        self._buffers: Dict[str, List[Tuple[str, np.datetime64, np.ndarray]]] = {}
+        # Feature sets appended to since the last compaction check
+        self._appended: set = set()
+        self._lock = threading.Lock()
+    
+    def register(self, name: str, version: int, columns: List[str]):
+        """Register a feature set definition; bump `version` when columns or their meaning change"""
+        self.feature_sets[name] = {"version": version, "columns": list(columns)}
+        self._buffers.setdefault(name, [])
+    
+    def columns(self, name: str) -> List[str]:
+        return self.feature_sets[name]["columns"]
+    
+    def version(self, name: str) -> int:
+        return self.feature_sets[name]["version"]
+    
+    def _set_dir(self, name: str) -> str:
+        return os.path.join(self.root_dir, name, f"v{self.version(name)}")
+    
+    # Writing
+    def write(self, name: str, rows: List[Tuple[str, object, Iterable[float]]], compact: bool = True) -> Optional[str]:
+        """Write (asset_id, as_of, feature_vector) rows as a new immutable part"""
+        if not rows:
+            return None
+        
+        asset_ids = np.array([row[0] for row in rows], dtype=str)
+        as_of = np.array([_to_datetime64(row[1]) for row in rows], dtype="datetime64[s]")
+        values = np.asarray([np.asarray(row[2], dtype=np.float64).ravel() for row in rows], dtype=np.float64)
+        return self.write_matrix(name, asset_ids, as_of, values, compact=compact)
+    
+    def write_matrix(self, name: str, asset_ids: np.ndarray, as_of, values: np.ndarray,
+                     compact: bool = True) -> Optional[str]:
+        """Write an (assets x columns) matrix as a new immutable part; as_of may be a scalar
+        
+        With compact, small trailing parts are merged afterwards if enough
+        have accumulated.
+        """
+        if len(asset_ids) == 0:
+            return None
+        
+        columns = self.columns(name)
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim != 2 or values.shape != (len(asset_ids), len(columns)):
+            raise ValueError(f"Feature set {name} expects {len(asset_ids)}x{len(columns)} values, got {values.shape}")
+        
+        if np.ndim(as_of) == 0:
+            as_of = np.full(len(asset_ids), _to_datetime64(as_of), dtype="datetime64[s]")
+        else:
+            as_of = np.asarray(as_of, dtype="datetime64[s]")
+        
+        part_dir = self._write_part(name, np.asarray(asset_ids, dtype=str), as_of, values, time.time_ns())
+        if compact:
+            self._maybe_compact(name)
+        return part_dir
+    
+    def _write_part(self, name: str, asset_ids: np.ndarray, as_of: np.ndarray, values: np.ndarray, written_ns: int, suffix: str = "") -> str:
+        columns = self.columns(name)
+        set_dir = self._set_dir(name)
+        os.makedirs(set_dir, exist_ok=True)
+        
+        part_name = f"part-{written_ns:020d}-{uuid.uuid4().hex[:8]}{suffix}"
+        tmp_dir = os.path.join(set_dir, f".tmp-{part_name}")
+        os.makedirs(tmp_dir)
+        
+        np.save(os.path.join(tmp_dir, ASSET_ID_FILE), asset_ids)
+        np.save(os.path.join(tmp_dir, AS_OF_FILE), as_of)
+        for i, column in enumerate(columns):
+            np.save(os.path.join(tmp_dir, f"{column}.npy"), np.ascontiguousarray(values[:, i]))
+        
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+            json.dump({
+                "feature_set": name,
+                "version": self.version(name),
+                "columns": columns,
+                "rows": int(len(asset_ids)),
+                "written_at": datetime.now().isoformat()
+            }, f)
+        
+        # Publishing the part is a single atomic rename
+        part_dir = os.path.join(set_dir, part_name)
+        os.rename(tmp_dir, part_dir)
+        self._indexes.pop(name, None)
+        logger.info(f"Wrote {len(asset_ids)} rows to feature set {name} ({part_name})")
+        return part_dir
+    
+    def append(self, name: str, asset_id: str, as_of, features: Iterable[float]):
+        """Buffer a single row from the online path
+        
+        Written as a part every `flush_rows` rows; compaction is left to the
+        next flush() so it stays off the request path.
+        """
+        row = (asset_id, _to_datetime64(as_of), np.asarray(features, dtype=np.float64).ravel())
+        with self._lock:
+            buffer = self._buffers.setdefault(name, [])
+            buffer.append(row)
+            if len(buffer) < self.flush_rows:
+                return
+            self._buffers[name] = []
+            self._appended.add(name)
+        
+        self.write(name, buffer, compact=False)
+    
+    def flush(self):
+        """Write every buffered online row, then compact the feature sets written to"""
+        with self._lock:
+            buffers = {name: rows for name, rows in self._buffers.items() if rows}
+            for name in buffers:
+                self._buffers[name] = []
+            written = self._appended | set(buffers)
+            self._appended = set()
+        
+        for name, rows in buffers.items():
+            try:
+                self.write(name, rows, compact=False)
+            except Exception as e:
+                logger.warning(f"Could not flush feature set {name}: {e}")
+        
+        for name in written:
+            self._maybe_compact(name)
+    
+    # Reading
+    def _index(self, name: str, force: bool = False) -> _FeatureSetIndex:
+        index = self._indexes.get(name)
+        if index is not None and not force and time.monotonic() - index.loaded_at < self.refresh_interval:
+            return index
+        
+        set_dir = self._set_dir(name)
+        part_names = sorted(
+            entry for entry in (os.listdir(set_dir) if os.path.isdir(set_dir) else [])
+            if entry.startswith("part-") and os.path.exists(os.path.join(set_dir, entry, MANIFEST_FILE))
+        )
+        
+        if index is None or part_names != self._part_names.get(name):
+            parts = []
+            for part_name in part_names:
+                try:
+                    parts.append(_Part(os.path.join(set_dir, part_name), self.columns(name)))
+                except FileNotFoundError:
+                    # Removed by a concurrent compaction
+                    continue
+            index = _FeatureSetIndex(parts)
+            self._part_names[name] = part_names
+        else:
+            index.loaded_at = time.monotonic()
+        
+        self._indexes[name] = index
+        return index
+    
+    def lookup(self, name: str, asset_id: str, as_of=None) -> Optional[Tuple[np.ndarray, np.datetime64]]:
+        """Return the latest feature vector of an asset at or before `as_of`"""
+        index = self._index(name)
+        location = index.locate(asset_id, _to_datetime64(as_of) if as_of is not None else None)
+        if location is None:
+            return None
+        
+        part_index, row_index, row_as_of = location
+        return index.parts[part_index].row(row_index, self.columns(name)), row_as_of
+    
+    def load_matrix(self, name: str, as_of=None, since=None, asset_ids: Optional[Iterable[str]] = None) -> FeatureMatrix:
+        """Bulk load the latest row per asset inside the (since, as_of] window"""
+        index = self._index(name, force=True)
+        columns = self.columns(name)
+        positions = index.latest_rows(
+            _to_datetime64(as_of) if as_of is not None else None,
+            _to_datetime64(since) if since is not None else None,
+            asset_ids
+        )
+        
+        values = np.empty((len(positions), len(columns)), dtype=np.float64)
+        part_index = index.part_index[positions]
+        row_index = index.row_index[positions]
+        for i, part in enumerate(index.parts):
+            selected = np.flatnonzero(part_index == i)
+            if len(selected):
+                values[selected] = part.matrix(row_index[selected], columns)
+        
+        return FeatureMatrix(index.asset_ids[positions], index.as_of[positions], values, columns)
+    
+    @contextmanager
+    def _compaction_lock(self, name: str, wait: bool):
+        """Exclusive compaction of a feature set across processes; yields False if busy"""
+        set_dir = self._set_dir(name)
+        os.makedirs(set_dir, exist_ok=True)
+        with open(os.path.join(set_dir, COMPACT_LOCK_FILE), "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    @staticmethod
+    def _small_tail(index: _FeatureSetIndex, max_rows: int) -> int:
+        """Index of the first part of the trailing run of parts under max_rows rows"""
+        start = len(index.parts)
+        while start > 0 and len(index.parts[start - 1].asset_ids) < max_rows:
+            start -= 1
+        return start
+    
+    def _maybe_compact(self, name: str):
+        """Merge the trailing small parts once compact_parts of them have accumulated"""
+        if not self.compact_parts:
+            return
+        try:
+            index = self._index(name, force=True)
+            if len(index.parts) - self._small_tail(index, self.compact_max_rows) >= self.compact_parts:
+                self.compact(name, max_part_rows=self.compact_max_rows, wait=False)
+        except Exception as e:
+            logger.warning(f"Could not compact feature set {name}: {e}")
+    
+    def compact(self, name: str, max_part_rows: Optional[int] = None, wait: bool = True) -> Optional[str]:
+        """Merge parts of a feature set into one, keeping every (asset, as_of) row once
+        
+        With max_part_rows only the trailing run of parts smaller than that is
+        merged, so recent online parts are folded together without rewriting
+        large ones. Without wait, returns None if another process is already
+        compacting.
+        """
+        with self._compaction_lock(name, wait) as locked:
+            if not locked:
+                return None
+            
+            index = self._index(name, force=True)
+            first = self._small_tail(index, max_part_rows) if max_part_rows is not None else 0
+            parts = index.parts[first:]
+            if len(parts) < 2:
+                return None
+            
+            # Keep the most recently written row of each (asset, as_of) key;
+            # the merged parts are the newest ones, so their rows keep
+            # sorting after those of the parts left alone
+            candidates = np.flatnonzero(index.part_index >= first)
+            asset_ids = index.asset_ids[candidates]
+            as_of = index.as_of[candidates]
+            is_last = np.ones(len(candidates), dtype=bool)
+            is_last[:-1] = (asset_ids[1:] != asset_ids[:-1]) | (as_of[1:] != as_of[:-1])
+            positions = candidates[is_last]
+            
+            columns = self.columns(name)
+            values = np.empty((len(positions), len(columns)), dtype=np.float64)
+            part_index = index.part_index[positions]
+            row_index = index.row_index[positions]
+            for i, part in enumerate(parts, start=first):
+                selected = np.flatnonzero(part_index == i)
+                if len(selected):
+                    values[selected] = part.matrix(row_index[selected], columns)
+            
+            # Name the merged part after its newest input so parts written while
+            # compacting still sort after it
+            newest_ns = int(parts[-1].name.split("-")[1])
+            merged = self._write_part(
+                name, index.asset_ids[positions], index.as_of[positions], values, newest_ns, suffix="-compact"
+            )
+            
+            # Open memory maps keep removed files readable for current readers
+            for part in parts:
+                shutil.rmtree(part.path, ignore_errors=True)
+            
+            self._index(name, force=True)
+            logger.info(f"Compacted {len(parts)} parts of feature set {name}")
+            return merged
+
+def _to_datetime64(value) -> np.datetime64:
+    """Convert a date string, datetime or datetime64 to datetime64[s]"""
+    if isinstance(value, np.datetime64):
+        return value.astype("datetime64[s]")
+    if isinstance(value, datetime):
+        return np.datetime64(value.replace(tzinfo=None), "s")
+    return np.datetime64(str(value).replace("Z", ""), "s")
@@ -0,0 +1,347 @@
+"""
+IoT telemetry ingestion for AIMY AI Core Service
+Parses bulk sensor readings (Arrow IPC or NDJSON), validates them column-wise,
+buffers them in memory and flushes zstd-compressed Parquet chunks to object
+storage, partitioned by day and asset bucket
+"""
+
+import io
+import time
+import uuid
+import zlib
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Tuple, Any
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json as pa_json
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+IOT_SCHEMA = pa.schema([
+    ("asset_id", pa.string()),
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+    ("sensor_type", pa.string()),
+    ("value", pa.float64()),
+    ("unit", pa.string())
+])
+
+ARROW_MEDIA_TYPES = ("application/vnd.apache.arrow.stream", "application/vnd.apache.arrow.file")
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json-lines")
+
+# Readings stamped further ahead than this are rejected as clock errors
+MAX_FUTURE_SKEW_SECONDS = 24 * 3600
+
+def _read_arrow(body: bytes) -> pa.Table:
+    buffer = pa.BufferReader(body)
+    if body[:6] == b"ARROW1":
+        return pa.ipc.open_file(buffer).read_all()
+    return pa.ipc.open_stream(buffer).read_all()
+
+def _read_ndjson(body: bytes) -> pa.Table:
+    # Timestamps are read as text and parsed below, since readings may mix
+    # offset-qualified and naive (UTC) ISO strings
+    explicit = pa.schema([
+        ("asset_id", pa.string()), ("timestamp", pa.string()), ("sensor_type", pa.string()),
+        ("value", pa.float64()), ("unit", pa.string())
+    ])
+    return pa_json.read_json(
+        pa.BufferReader(body),
+        parse_options=pa_json.ParseOptions(explicit_schema=explicit, unexpected_field_behavior="ignore")
+    )
+
+def _parse_timestamps(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    """Timestamps as timestamp[us, UTC]; naive values are taken as UTC and
+    unparseable ones become null"""
+    target = IOT_SCHEMA.field("timestamp").type
+    if pa.types.is_timestamp(column.type):
+        if column.type.tz is None:
+            return pc.assume_timezone(column.cast(pa.timestamp("us")), "UTC")
+        return column.cast(target)
+    if pa.types.is_integer(column.type):
+        # Integer timestamps are epoch milliseconds
+        return pc.multiply(column.cast(pa.int64()), 1000).cast(target)
+    
+    column = column.cast(pa.string())
+    for cast in (lambda: column.cast(target), lambda: pc.assume_timezone(column.cast(pa.timestamp("us")), "UTC")):
+        try:
+            return cast()
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            pass
+    
+    # Mixed or malformed strings: parse element-wise, invalid ones become null
+    parsed = pd.to_datetime(column.to_pandas(), utc=True, errors="coerce", format="ISO8601")
+    return pa.chunked_array([pa.Array.from_pandas(parsed).cast(target)])
+
+def parse_iot_batch(body: bytes, content_type: str) -> Tuple[pa.Table, Dict[str, int]]:
+    """Decode and validate a batch of readings
+    
+    Returns the valid rows in IOT_SCHEMA order and the number of rows
+    rejected per reason. Raises ValueError for undecodable batches or
+    missing columns.
+    """
+    media_type = content_type.split(";")[0].strip().lower()
+    try:
+        if media_type in ARROW_MEDIA_TYPES:
+            table = _read_arrow(body)
+        elif media_type in NDJSON_MEDIA_TYPES:
+            table = _read_ndjson(body)
+        else:
+            raise ValueError(
+                f"Unsupported content type {media_type!r}; send Arrow IPC ({ARROW_MEDIA_TYPES[0]}) "
+                f"or NDJSON ({NDJSON_MEDIA_TYPES[0]})"
+            )
+    except pa.ArrowException as e:
+        raise ValueError(f"Could not decode batch: {e}")
+    
+    missing = [name for name in ("asset_id", "timestamp", "sensor_type", "value") if name not in table.column_names]
+    if missing:
+        raise ValueError(f"Batch is missing columns: {', '.join(missing)}")
+    
+    try:
+        columns = {
+            "asset_id": table.column("asset_id").cast(pa.string()),
+            "timestamp": _parse_timestamps(table.column("timestamp")),
+            "sensor_type": table.column("sensor_type").cast(pa.string()),
+            "value": table.column("value").cast(pa.float64()),
+            "unit": table.column("unit").cast(pa.string()) if "unit" in table.column_names
+            else pa.chunked_array([pa.nulls(table.num_rows, pa.string())])
+        }
+    except pa.ArrowException as e:
+        raise ValueError(f"Invalid column types: {e}")
+    
+    # Row masks, one per rejection reason (nulls count as failures)
+    horizon = pa.scalar(
+        int((time.time() + MAX_FUTURE_SKEW_SECONDS) * 1_000_000), IOT_SCHEMA.field("timestamp").type
+    )
+    checks = {
+        "missing_asset_id": pc.invert(pc.is_valid(columns["asset_id"])),
+        "missing_sensor_type": pc.invert(pc.is_valid(columns["sensor_type"])),
+        "invalid_timestamp": pc.invert(pc.fill_null(pc.less_equal(columns["timestamp"], horizon), False)),
+        "invalid_value": pc.invert(pc.fill_null(pc.is_finite(columns["value"]), False))
+    }
+    rejected_mask = None
+    rejected = {}
+    for reason, mask in checks.items():
+        count = pc.sum(mask).as_py() or 0
+        if count:
+            rejected[reason] = count
+            rejected_mask = mask if rejected_mask is None else pc.or_(rejected_mask, mask)
+    
+    valid = pa.Table.from_pydict(columns, schema=IOT_SCHEMA)
+    if rejected_mask is not None:
+        valid = valid.filter(pc.invert(rejected_mask))
+    
+    return valid, rejected
+
+def _asset_buckets(asset_ids: pa.ChunkedArray, buckets: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Stable bucket number (crc32 of the id) and dictionary code of every row"""
+    encoded = asset_ids.combine_chunks().dictionary_encode()
+    codes = encoded.indices.to_numpy(zero_copy_only=False)
+    bucket_of = np.array(
+        [zlib.crc32(asset_id.encode()) % buckets for asset_id in encoded.dictionary.to_pylist()],
+        dtype=np.int64
+    )
+    return bucket_of[codes], codes
+
+class IoTIngestBuffer:
+    """In-memory buffer of validated readings, flushed to MinIO as Parquet
+    
+    Batches are accepted while fewer than max_buffered_rows are waiting
+    (including rows of a flush in progress); beyond that offer() refuses
+    them so the endpoint can push back on clients. Each flush writes one
+    object per (day, asset bucket) under
+    {prefix}/date=YYYY-MM-DD/bucket=NN/{flush_id}.parquet, rows sorted by
+    asset and time so Parquet statistics prune per asset. Written batches
+    are then folded into the rollups, if a RollupStore is given.
+    
+    A flush that fails part-way is retried as the same unit: same rows, same
+    flush_id, uploading only the objects that were not written, so a retry
+    never duplicates readings. Batches offered meanwhile wait for the next
+    flush.
+    """
+    
+    def __init__(self, client, bucket: str, prefix: str = "iot/raw", flush_rows: int = 500000,
+                 flush_interval: float = 5.0, max_buffered_rows: int = 5000000, asset_buckets: int = 16,
+                 upload_workers: int = 8, rollups=None):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_buffered_rows = max_buffered_rows
+        self.asset_buckets = asset_buckets
+        self.upload_workers = upload_workers
+        self.rollups = rollups
+        self.buffered_rows = 0
+        self._tables: List[pa.Table] = []
+        # Failed flush awaiting retry: its rows, flush_id and written partitions
+        self._retry: Optional[Tuple[pa.Table, str, set]] = None
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.stats = {
+            "rows_accepted": 0, "rows_refused": 0, "rows_written": 0,
+            "objects_written": 0, "flush_failures": 0, "last_flush_seconds": 0.0
+        }
+    
+    def start(self):
+        if self._flush_task is None:
+            self._flush_requested = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def close(self):
+        """Stop the flush loop and write whatever is buffered"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+    
+    def saturated(self) -> bool:
+        return self.buffered_rows >= self.max_buffered_rows
+    
+    def offer(self, table: pa.Table) -> bool:
+        """Buffer a validated batch; False if the buffer is full"""
+        if self.buffered_rows + table.num_rows > self.max_buffered_rows:
+            self.stats["rows_refused"] += table.num_rows
+            return False
+        
+        self._tables.append(table)
+        self.buffered_rows += table.num_rows
+        self.stats["rows_accepted"] += table.num_rows
+        if self._flush_requested is not None and self.buffered_rows >= self.flush_rows:
+            self._flush_requested.set()
+        return True
+    
+    async def flush(self) -> int:
+        """Write all buffered batches; return the number of rows written"""
+        if not self._tables and self._retry is None:
+            return 0
+        
+        lock = self._flush_lock or asyncio.Lock()
+        async with lock:
+            rows = 0
+            if self._retry is not None:
+                # Finish the failed flush before writing anything newer
+                table, flush_id, written = self._retry
+                if not await self._flush_table(table, flush_id, written):
+                    return 0
+                self._retry = None
+                rows += table.num_rows
+            
+            if self._tables:
+                tables, self._tables = self._tables, []
+                table = pa.concat_tables(tables)
+                flush_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+                written: set = set()
+                if await self._flush_table(table, flush_id, written):
+                    rows += table.num_rows
+                else:
+                    self._retry = (table, flush_id, written)
+            return rows
+    
+    async def _flush_table(self, table: pa.Table, flush_id: str, written: set) -> bool:
+        """Upload one flush unit; on failure the written partitions stay in
+        written for the retry"""
+        before = len(written)
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write, table, flush_id, written)
+        except Exception as e:
+            logger.error(
+                f"Error writing {table.num_rows} IoT readings (flush {flush_id}, "
+                f"{len(written)} objects written): {e}"
+            )
+            self.stats["flush_failures"] += 1
+            return False
+        finally:
+            self.stats["objects_written"] += len(written) - before
+        
+        self.buffered_rows -= table.num_rows
+        self.stats["rows_written"] += table.num_rows
+        self.stats["last_flush_seconds"] = time.perf_counter() - started
+        return True
+    
+    def _write(self, table: pa.Table, flush_id: str, written: set) -> int:
+        """Partition, sort and upload one flush; return the number of objects
+        
+        Partitions already in written are skipped and each uploaded one is
+        added, so a retry with the same flush_id writes only what is missing.
+        Every partition is attempted before the first error is raised.
+        """
+        micros = table.column("timestamp").cast(pa.int64()).to_numpy()
+        buckets, asset_codes = _asset_buckets(table.column("asset_id"), self.asset_buckets)
+        partition = (micros // 86_400_000_000) * self.asset_buckets + buckets
+        
+        order = np.lexsort((micros, asset_codes, partition))
+        partition = partition[order]
+        table = table.take(pa.array(order))
+        boundaries = np.concatenate(([0], np.flatnonzero(np.diff(partition)) + 1, [len(partition)]))
+        
+        def upload(bounds: Tuple[int, int]) -> None:
+            start, end = bounds
+            key = int(partition[start])
+            day = np.datetime64(key // self.asset_buckets, "D")
+            buffer = io.BytesIO()
+            pq.write_table(table.slice(start, end - start), buffer, compression="zstd")
+            size = buffer.tell()
+            buffer.seek(0)
+            self.client.put_object(
+                self.bucket,
+                f"{self.prefix}/date={day}/bucket={key % self.asset_buckets:02d}/{flush_id}.parquet",
+                buffer,
+                size,
+                content_type="application/vnd.apache.parquet"
+            )
+            written.add(key)
+        
+        slices = [
+            (start, end) for start, end in zip(boundaries[:-1], boundaries[1:])
+            if int(partition[start]) not in written
+        ]
+        with ThreadPoolExecutor(max_workers=self.upload_workers) as executor:
+            futures = [executor.submit(upload, bounds) for bounds in slices]
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            raise errors[0]
+        
+        # Rollups follow the durable copy; a failure here is logged rather
+        # than retried, which would upload the chunk twice
+        if self.rollups is not None:
+            try:
+                self.rollups.update(table)
+            except Exception as e:
+                logger.error(f"Error updating rollups for {table.num_rows} IoT readings: {e}")
+        
+        return len(slices)
+    
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error in IoT flush loop: {e}")
+    
+    def status(self) -> Dict[str, Any]:
+        return {
+            "buffered_rows": self.buffered_rows,
+            "max_buffered_rows": self.max_buffered_rows,
+            "saturated": self.saturated(),
+            **self.stats
+        }
@@ -3,16 +3,16 @@ AIMY AI Core Service
 FastAPI application for AI-powered asset valuation, risk assessment, and yield prediction
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import uvicorn
 import os
 import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestRegressor, IsolationForest
@@ -25,7 +25,32 @@ import psycopg2
 from psycopg2.extras import RealDictCursor
 import minio
 from minio.error import S3Error
+import io
+import time
 import uuid
+import asyncio
+import tempfile
+import threading
+from feature_store import FeatureStore
+from shared_models import SharedModel, export_model, fold_scaler, verify_folded, save_arrays, publish, publish_lock, is_published, version_dir
+from model_cache import MODEL_VERSION_KEY, PinnedModel, ModelCache
+from persistence import PredictionStore
+from downsampling import lttb
+from async_redis import AsyncRedis
+import monte_carlo
+from wire import WireRoute, WireRequest, WireResponse
+from iot_ingest import IoTIngestBuffer, parse_iot_batch
+from rollups import RollupStore
+from calibration import ScoreCalibration, anomaly_severity
+from profiling import RequestProfiler, PROFILE_ID_HEADER, PROFILE_INDEX_KEY, pinned_versions, record_pinned_version
+from memory_tracking import MemoryTracker, TASK_MEMORY_KEY, summarize_records
+from valuation_snapshots import snapshot_key, encode_snapshot, decode_snapshot, confidence_interval
+from pricing_state import PricingStateStore, features_from_state
+from starlette.concurrency import run_in_threadpool
+from degradation import (
+    LoadMonitor, PredictionCache, approximate_predict, mark_degraded, mark_inference_start, degradation_context,
+    DEGRADED_HEADER
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -37,8 +62,11 @@ app = FastAPI(
     description="AI-powered valuation, yield prediction, risk scoring, and anomaly detection for real-world assets",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=WireResponse
 )
+# orjson/msgpack bodies and gzip/zstd compression, negotiated per request
+app.router.route_class = WireRoute
 
 # CORS middleware
 app.add_middleware(
@@ -56,11 +84,98 @@ MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
 MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
 MINIO_BUCKET = os.getenv("MINIO_BUCKET", "ai-models")
+FEATURE_STORE_DIR = os.getenv("FEATURE_STORE_DIR", "/tmp/aimy-feature-store")
+FEATURE_FLUSH_ROWS = int(os.getenv("FEATURE_FLUSH_ROWS", "1000"))
+FEATURE_FLUSH_INTERVAL = float(os.getenv("FEATURE_FLUSH_INTERVAL", "30"))
+FEATURE_COMPACT_PARTS = int(os.getenv("FEATURE_COMPACT_PARTS", "16"))
+FEATURE_COMPACT_MAX_ROWS = int(os.getenv("FEATURE_COMPACT_MAX_ROWS", "250000"))
+SHARED_MODELS_ENABLED = os.getenv("SHARED_MODELS_ENABLED", "true").lower() == "true"
+SHARED_MODEL_DIR = os.getenv("SHARED_MODEL_DIR", "/dev/shm/aimy-models")
+SHARED_MODEL_KEEP_VERSIONS = int(os.getenv("SHARED_MODEL_KEEP_VERSIONS", "3"))
+MODEL_REFRESH_INTERVAL = float(os.getenv("MODEL_REFRESH_INTERVAL", "30"))
+POSTGRES_POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1"))
+POSTGRES_POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10"))
+PREDICTION_FLUSH_ROWS = int(os.getenv("PREDICTION_FLUSH_ROWS", "500"))
+PREDICTION_FLUSH_INTERVAL = float(os.getenv("PREDICTION_FLUSH_INTERVAL", "1.0"))
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", "10"))
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "0.25"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "0.1"))
+REDIS_BREAKER_FAILURES = int(os.getenv("REDIS_BREAKER_FAILURES", "5"))
+REDIS_BREAKER_RESET = float(os.getenv("REDIS_BREAKER_RESET", "10"))
+DEGRADE_LATENCY_BUDGET_MS = float(os.getenv("DEGRADE_LATENCY_BUDGET_MS", "500"))
+DEGRADE_LOOP_LAG_BUDGET_MS = float(os.getenv("DEGRADE_LOOP_LAG_BUDGET_MS", "100"))
+DEGRADE_RECOVERY_RATIO = float(os.getenv("DEGRADE_RECOVERY_RATIO", "0.5"))
+DEGRADE_MIN_SECONDS = float(os.getenv("DEGRADE_MIN_SECONDS", "10"))
+DEGRADE_CACHE_TTL = int(os.getenv("DEGRADE_CACHE_TTL", "3600"))
+DEGRADE_CACHE_SIZE = int(os.getenv("DEGRADE_CACHE_SIZE", "100000"))
+DEGRADE_TREE_FRACTION = float(os.getenv("DEGRADE_TREE_FRACTION", "0.1"))
+HISTORY_CACHE_TTL = int(os.getenv("HISTORY_CACHE_TTL", "60"))
+HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", "5000"))
+HISTORY_LTTB_OVERSAMPLING = int(os.getenv("HISTORY_LTTB_OVERSAMPLING", "8"))
+SCENARIO_MAX_GRID = int(os.getenv("SCENARIO_MAX_GRID", "100000"))
+MONTE_CARLO_MAX_PATHS = int(os.getenv("MONTE_CARLO_MAX_PATHS", "1000000"))
+MONTE_CARLO_CHUNK_PATHS = int(os.getenv("MONTE_CARLO_CHUNK_PATHS", "10000"))
+MONTE_CARLO_WORKERS = int(os.getenv("MONTE_CARLO_WORKERS", "0"))
+IOT_FLUSH_ROWS = int(os.getenv("IOT_FLUSH_ROWS", "500000"))
+IOT_FLUSH_INTERVAL = float(os.getenv("IOT_FLUSH_INTERVAL", "5.0"))
+IOT_MAX_BUFFERED_ROWS = int(os.getenv("IOT_MAX_BUFFERED_ROWS", "5000000"))
+IOT_ASSET_BUCKETS = int(os.getenv("IOT_ASSET_BUCKETS", "16"))
+ROLLUP_HOURLY_TTL_DAYS = int(os.getenv("ROLLUP_HOURLY_TTL_DAYS", "90"))
+ROLLUP_DAILY_TTL_DAYS = int(os.getenv("ROLLUP_DAILY_TTL_DAYS", "1095"))
+ROLLUP_SKETCH_ALPHA = float(os.getenv("ROLLUP_SKETCH_ALPHA", "0.01"))
+WIRE_MAX_BODY_BYTES = int(os.getenv("WIRE_MAX_BODY_BYTES", str(64 * 1024 * 1024)))
+WIRE_COMPRESS_MIN_BYTES = int(os.getenv("WIRE_COMPRESS_MIN_BYTES", "1024"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_ROUTES = [route for route in os.getenv("PROFILE_ROUTES", "/price,/predict_yield,/risk_score,/anomaly").split(",") if route]
+PROFILE_HEADER_ENABLED = os.getenv("PROFILE_HEADER_ENABLED", "true").lower() == "true"
+PROFILE_HEADER_TOKEN = os.getenv("PROFILE_HEADER_TOKEN", "")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+PROFILE_INDEX_SIZE = int(os.getenv("PROFILE_INDEX_SIZE", "500"))
+MEMORY_TRACKING_ENABLED = os.getenv("MEMORY_TRACKING_ENABLED", "true").lower() == "true"
+MEMORY_SAMPLE_RATE = float(os.getenv("MEMORY_SAMPLE_RATE", "0"))
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "1"))
+MEMORY_TOP_ALLOCATIONS = int(os.getenv("MEMORY_TOP_ALLOCATIONS", "10"))
+MEMORY_MAX_TRACE_SECONDS = float(os.getenv("MEMORY_MAX_TRACE_SECONDS", "60"))
+VALUATION_SNAPSHOT_MAX_AGE = float(os.getenv("VALUATION_SNAPSHOT_MAX_AGE", "3600"))
+VALUATION_SNAPSHOT_TTL = int(os.getenv("VALUATION_SNAPSHOT_TTL", "172800"))
+PRICING_DELTA_ID_TTL = int(os.getenv("PRICING_DELTA_ID_TTL", "604800"))
+
+WireRequest.max_body_size = WIRE_MAX_BODY_BYTES
+WireRoute.compress_min_size = WIRE_COMPRESS_MIN_BYTES
 
 # Initialize connections
+# Synchronous client for code shared with Celery workers (model storage)
 redis_client = redis.from_url(REDIS_URL)
+# Async client used by request handlers
+async_redis = AsyncRedis(
+    REDIS_URL,
+    max_connections=REDIS_POOL_SIZE,
+    timeout=REDIS_TIMEOUT,
+    pool_timeout=REDIS_POOL_TIMEOUT,
+    failure_threshold=REDIS_BREAKER_FAILURES,
+    reset_timeout=REDIS_BREAKER_RESET
+)
 celery_app = Celery("ai_core", broker=REDIS_URL)
 
+# Prediction history store (connected on startup)
+prediction_store = PredictionStore(
+    POSTGRES_URL,
+    min_size=POSTGRES_POOL_MIN_SIZE,
+    max_size=POSTGRES_POOL_MAX_SIZE,
+    flush_rows=PREDICTION_FLUSH_ROWS,
+    flush_interval=PREDICTION_FLUSH_INTERVAL
+)
+
+# Overload detection and fallback answers
+load_monitor = LoadMonitor(
+    DEGRADE_LATENCY_BUDGET_MS / 1000,
+    DEGRADE_LOOP_LAG_BUDGET_MS / 1000,
+    recovery_ratio=DEGRADE_RECOVERY_RATIO,
+    min_degraded_seconds=DEGRADE_MIN_SECONDS
+)
+prediction_cache = PredictionCache(max_entries=DEGRADE_CACHE_SIZE, ttl=DEGRADE_CACHE_TTL)
+
 # MinIO client
 minio_client = minio.Minio(
     MINIO_ENDPOINT,
@@ -77,6 +192,59 @@ try:
 except Exception as e:
     logger.warning(f"Could not create MinIO bucket: {e}")
 
+# Hourly/daily/monthly sensor rollups, updated from the IoT flush
+rollup_store = RollupStore(
+    redis_client,
+    ttl_days={"hour": ROLLUP_HOURLY_TTL_DAYS, "day": ROLLUP_DAILY_TTL_DAYS},
+    alpha=ROLLUP_SKETCH_ALPHA
+)
+
+# Incremental pricing features, updated by POST /price/{asset_id}/delta
+pricing_state = PricingStateStore(redis_client, applied_delta_ttl=PRICING_DELTA_ID_TTL)
+
+# Bulk IoT telemetry buffer, flushed to MinIO as Parquet
+iot_ingest = IoTIngestBuffer(
+    minio_client,
+    MINIO_BUCKET,
+    flush_rows=IOT_FLUSH_ROWS,
+    flush_interval=IOT_FLUSH_INTERVAL,
+    max_buffered_rows=IOT_MAX_BUFFERED_ROWS,
+    asset_buckets=IOT_ASSET_BUCKETS,
+    rollups=rollup_store
+)
+
+# Opt-in request profiling, stored under profiles/ in the MinIO bucket
+request_profiler = RequestProfiler(
+    minio_client,
+    MINIO_BUCKET,
+    redis_client=redis_client,
+    sample_rate=PROFILE_SAMPLE_RATE,
+    routes=PROFILE_ROUTES,
+    header_enabled=PROFILE_HEADER_ENABLED,
+    header_token=PROFILE_HEADER_TOKEN,
+    interval=PROFILE_INTERVAL_MS / 1000,
+    max_concurrent=PROFILE_MAX_CONCURRENT,
+    index_size=PROFILE_INDEX_SIZE
+)
+
+# Per-route RSS growth and sampled tracemalloc snapshots of this worker
+memory_tracker = MemoryTracker(
+    sample_rate=MEMORY_SAMPLE_RATE,
+    top_n=MEMORY_TOP_ALLOCATIONS,
+    trace_frames=MEMORY_TRACE_FRAMES
+)
+
+# Model behind each profiled route, for tagging profiles with its version
+PROFILE_ROUTE_MODELS = {
+    "/price": "pricing",
+    "/price/scenarios": "pricing",
+    "/price/monte_carlo": "pricing",
+    "/predict_yield": "yield",
+    "/risk_score": "risk",
+    "/portfolio/risk": "risk",
+    "/anomaly": "anomaly"
+}
+
 # Data models
 class CashflowData(BaseModel):
     asset_id: str = Field(..., description="Asset identifier")
@@ -113,6 +281,14 @@ class PricingRequest(BaseModel):
     iot_data: Optional[List[IoTData]] = Field(None, description="IoT sensor data")
     valuation_date: str = Field(..., description="Valuation date")
 
+class PricingDeltaRequest(BaseModel):
+    cashflows: List[CashflowData] = Field(default_factory=list, description="New cashflow records")
+    market_data: List[MarketData] = Field(default_factory=list, description="New market rate records")
+    utilization: List[UtilizationData] = Field(default_factory=list, description="New utilization records")
+    valuation_date: Optional[str] = Field(None, description="Valuation date (default today)")
+    delta_id: Optional[str] = Field(None, description="Idempotency key; a repeated delta is not applied again")
+    reset: bool = Field(False, description="Replace the asset's state with these records (full history)")
+
 class YieldRequest(BaseModel):
     asset_id: str = Field(..., description="Asset identifier")
     historical_yields: List[float] = Field(..., description="Historical yield data")
@@ -127,7 +303,10 @@ class RiskRequest(BaseModel):
 
 class AnomalyRequest(BaseModel):
     asset_id: str = Field(..., description="Asset identifier")
-    time_series_data: List[Dict[str, Any]] = Field(..., description="Time series data for anomaly detection")
+    time_series_data: Optional[List[Dict[str, Any]]] = Field(None, description="Time series data for anomaly detection")
+    sensor_type: Optional[str] = Field(None, description="Sensor whose stored rollups are used when no time series is sent")
+    start: Optional[str] = Field(None, description="Rollup window start (ISO timestamp, default 30 days before end)")
+    end: Optional[str] = Field(None, description="Rollup window end (ISO timestamp, default now)")
 
 # Response models
 class PricingResponse(BaseModel):
@@ -138,6 +317,31 @@ class PricingResponse(BaseModel):
     feature_importance: Dict[str, float]
     model_version: str
     timestamp: str
+    degraded: Optional[str] = None
+
+class ValuationSnapshotResponse(BaseModel):
+    asset_id: str
+    estimated_value: float
+    confidence_interval: Dict[str, float]
+    model_version: str
+    valued_at: str
+    features_as_of: Optional[str] = None
+    age_seconds: float
+    stale: bool
+    refreshed: bool
+    degraded: Optional[str] = None
+
+class PricingDeltaResponse(BaseModel):
+    asset_id: str
+    valuation_date: str
+    estimated_value: float
+    confidence_interval: Dict[str, float]
+    features: Dict[str, float]
+    records_applied: int
+    duplicate: bool
+    model_version: str
+    timestamp: str
+    degraded: Optional[str] = None
 
 class YieldResponse(BaseModel):
     asset_id: str
@@ -147,6 +351,7 @@ class YieldResponse(BaseModel):
     feature_importance: Dict[str, float]
     model_version: str
     timestamp: str
+    degraded: Optional[str] = None
 
 class RiskResponse(BaseModel):
     asset_id: str
@@ -156,14 +361,95 @@ class RiskResponse(BaseModel):
     confidence_interval: Dict[str, float]
     model_version: str
     timestamp: str
+    degraded: Optional[str] = None
 
 class AnomalyResponse(BaseModel):
     asset_id: str
     anomalies_detected: List[Dict[str, Any]]
     anomaly_score: float
+    score_percentile: Optional[float] = None
     confidence_interval: Dict[str, float]
     model_version: str
     timestamp: str
+    degraded: Optional[str] = None
+
+class PortfolioHolding(BaseModel):
+    asset_id: str = Field(..., description="Asset identifier")
+    weight: float = Field(..., ge=0, description="Portfolio weight or position value")
+    sector: Optional[str] = Field(None, description="Sector used for concentration")
+    geography: Optional[str] = Field(None, description="Geography used for concentration")
+    financial_metrics: Optional[Dict[str, float]] = Field(None, description="Financial metrics (stored risk features are used if omitted)")
+    market_exposure: Optional[Dict[str, float]] = Field(None, description="Market exposure factors")
+    operational_metrics: Optional[Dict[str, float]] = Field(None, description="Operational metrics")
+
+class PortfolioRiskRequest(BaseModel):
+    portfolio_id: Optional[str] = Field(None, description="Portfolio identifier")
+    holdings: List[PortfolioHolding] = Field(..., min_length=1, description="Portfolio holdings")
+    include_holdings: bool = Field(True, description="Return per-holding scores")
+    top_contributors: int = Field(10, ge=0, description="Number of largest risk contributors to return")
+
+class PortfolioRiskResponse(BaseModel):
+    portfolio_id: Optional[str]
+    holdings_count: int
+    risk_score: float
+    risk_level: str
+    risk_factors: Dict[str, float]
+    concentration: Dict[str, Any]
+    top_contributors: List[Dict[str, Any]]
+    holdings: Optional[List[Dict[str, Any]]]
+    model_version: str
+    timestamp: str
+
+class ScenarioShock(BaseModel):
+    feature: str = Field(..., description="Pricing feature to shock, e.g. avg_interest_rate")
+    values: List[float] = Field(..., min_length=1, description="Shock values forming one axis of the grid")
+    mode: str = Field("absolute", description="absolute (added to the feature) or relative (fractional change)")
+
+class ScenarioRequest(BaseModel):
+    asset_id: str = Field(..., description="Asset identifier")
+    cashflows: List[CashflowData] = Field(..., description="Historical cashflow data")
+    market_data: List[MarketData] = Field(..., description="Market rate data")
+    utilization: List[UtilizationData] = Field(..., description="Utilization data")
+    valuation_date: str = Field(..., description="Valuation date")
+    shocks: List[ScenarioShock] = Field(..., min_length=1, description="Grid axes; every combination is priced")
+    include_surface: bool = Field(True, description="Return the full value surface")
+
+class ScenarioResponse(BaseModel):
+    asset_id: str
+    valuation_date: str
+    base_value: float
+    axes: List[Dict[str, Any]]
+    shape: List[int]
+    scenario_count: int
+    surface: Optional[List[Any]]
+    summary: Dict[str, Any]
+    model_version: str
+    timestamp: str
+    degraded: Optional[str] = None
+
+class MonteCarloRequest(BaseModel):
+    asset_id: str = Field(..., description="Asset identifier")
+    cashflows: List[CashflowData] = Field(..., min_length=1, description="Historical cashflow data")
+    market_data: List[MarketData] = Field(..., min_length=1, description="Market rate data")
+    valuation_date: str = Field(..., description="Valuation date")
+    n_paths: int = Field(10000, ge=100, description="Number of simulated paths")
+    horizon_months: int = Field(240, ge=1, le=600, description="Simulation horizon in months")
+    spread: float = Field(0.03, description="Discount spread over the simulated market rate")
+    terminal_multiple: float = Field(0.0, ge=0, description="Terminal value as a multiple of the final year's net cashflow")
+    percentiles: Optional[List[float]] = Field(None, description="Value percentiles to report (0-100)")
+    seed: Optional[int] = Field(None, description="Random seed for reproducible runs")
+
+class MonteCarloResponse(BaseModel):
+    asset_id: str
+    valuation_date: str
+    n_paths: int
+    horizon_months: int
+    expected_value: float
+    distribution: Dict[str, Any]
+    parameters: Dict[str, float]
+    seed: Optional[int]
+    elapsed_ms: float
+    timestamp: str
 
 class MetricsResponse(BaseModel):
     total_requests: int
@@ -171,6 +457,7 @@ class MetricsResponse(BaseModel):
     failed_requests: int
     average_response_time: float
     model_performance: Dict[str, Dict[str, float]]
+    memory: Optional[Dict[str, Any]] = None
     last_updated: str
 
 # Mock data generators
@@ -296,20 +583,30 @@ def generate_mock_utilization(asset_id: str, days: int = 365) -> List[Utilizatio
 
 # Model management
 class ModelManager:
-    def __init__(self):
+    def __init__(self, shared: bool = SHARED_MODELS_ENABLED):
+        self.shared = shared
         self.models = {}
         self.scalers = {}
+        self.calibrations = {}
         self.model_versions = {}
+        self.training_state = {}
+        # Held while a model version is installed or pinned
+        self._swap_lock = threading.Lock()
         self.load_models()
     
-    def load_models(self):
-        """Load or initialize models"""
+    def load_models(self, shared: Optional[bool] = None):
+        """Load or initialize models
+        
+        With shared=True the forests are attached from the host's shared
+        model directory instead of being unpickled into this process.
+        Training code loads with shared=False to get fitted estimators.
+        """
         try:
             # Try to load existing models from MinIO
-            self.load_model_from_storage("pricing")
-            self.load_model_from_storage("yield")
-            self.load_model_from_storage("risk")
-            self.load_model_from_storage("anomaly")
+            self.load_model_from_storage("pricing", shared=shared)
+            self.load_model_from_storage("yield", shared=shared)
+            self.load_model_from_storage("risk", shared=shared)
+            self.load_model_from_storage("anomaly", shared=shared)
         except Exception as e:
             logger.warning(f"Could not load existing models, initializing new ones: {e}")
             self.initialize_models()
@@ -338,9 +635,27 @@ class ModelManager:
         
         logger.info("Initialized new models")
     
-    def load_model_from_storage(self, model_name: str):
+    def load_model_from_storage(self, model_name: str, shared: Optional[bool] = None):
         """Load model from MinIO storage"""
+        shared = self.shared if shared is None else shared
         try:
+            # Get model version from metadata
+            try:
+                metadata_key = f"models/{model_name}/metadata.json"
+                metadata_obj = minio_client.get_object(MINIO_BUCKET, metadata_key)
+                metadata = json.loads(metadata_obj.read())
+            except:
+                metadata = {}
+            version = metadata.get("version", "unknown")
+            
+            if shared and version != "unknown":
+                try:
+                    self.attach_shared_model(model_name, version, metadata)
+                    logger.info(f"Attached shared {model_name} model {version}")
+                    return
+                except Exception as e:
+                    logger.warning(f"Could not attach shared {model_name} model, loading a private copy: {e}")
+            
             model_key = f"models/{model_name}/model.pkl"
             scaler_key = f"models/{model_name}/scaler.pkl"
             
@@ -349,27 +664,128 @@ class ModelManager:
             minio_client.fget_object(MINIO_BUCKET, scaler_key, f"/tmp/{model_name}_scaler.pkl")
             
             # Load models
-            self.models[model_name] = joblib.load(f"/tmp/{model_name}_model.pkl")
-            self.scalers[model_name] = joblib.load(f"/tmp/{model_name}_scaler.pkl")
-            
-            # Get model version from metadata
-            try:
-                metadata_key = f"models/{model_name}/metadata.json"
-                metadata_obj = minio_client.get_object(MINIO_BUCKET, metadata_key)
-                metadata = json.loads(metadata_obj.read())
-                self.model_versions[model_name] = metadata.get("version", "unknown")
-            except:
-                self.model_versions[model_name] = "unknown"
+            self.install(
+                model_name,
+                joblib.load(f"/tmp/{model_name}_model.pkl"),
+                joblib.load(f"/tmp/{model_name}_scaler.pkl"),
+                self.load_calibration(model_name),
+                metadata
+            )
             
             logger.info(f"Loaded {model_name} model from storage")
-            
+        
         except Exception as e:
             logger.warning(f"Could not load {model_name} model from storage: {e}")
             raise
     
+    def pin(self, model_name: str) -> PinnedModel:
+        """Take the current model with its scaler, version and calibration"""
+        with self._swap_lock:
+            pinned = PinnedModel(
+                model_name,
+                self.models[model_name],
+                self.scalers[model_name],
+                self.model_versions.get(model_name, "unknown"),
+                self.calibrations.get(model_name)
+            )
+        record_pinned_version(model_name, pinned.version)
+        return pinned
+    
+    def install(self, model_name: str, model, scaler, calibration: Optional[ScoreCalibration],
+                metadata: Dict[str, Any]):
+        """Swap in a loaded model version with its scaler, calibration and metadata
+        
+        All four change under the swap lock, so pin() never mixes versions.
+        """
+        calibration = self.checked_calibration(model_name, calibration, metadata.get("version", "unknown"))
+        with self._swap_lock:
+            self.models[model_name], self.scalers[model_name] = model, scaler
+            if calibration is None:
+                self.calibrations.pop(model_name, None)
+            else:
+                self.calibrations[model_name] = calibration
+            self.set_model_metadata(model_name, metadata)
+    
+    def set_model_metadata(self, model_name: str, metadata: Dict[str, Any]):
+        """Record version and training state from stored metadata"""
+        self.model_versions[model_name] = metadata.get("version", "unknown")
+        self.training_state[model_name] = {
+            "trained_through": metadata.get("trained_through"),
+            "training_mode": metadata.get("training_mode"),
+            "last_full_rebuild": metadata.get("last_full_rebuild")
+        }
+    
+    def load_calibration(self, model_name: str) -> Optional[ScoreCalibration]:
+        """Fetch a model's score calibration table from MinIO, if it has one"""
+        try:
+            calibration_obj = minio_client.get_object(MINIO_BUCKET, f"models/{model_name}/calibration.json")
+            return ScoreCalibration.from_json(calibration_obj.read())
+        except Exception:
+            return None
+    
+    def checked_calibration(self, model_name: str, calibration: Optional[ScoreCalibration],
+                            version: str) -> Optional[ScoreCalibration]:
+        """Keep a calibration table only if it was built for the loaded model version"""
+        if calibration is not None and calibration.version != version:
+            logger.warning(
+                f"Ignoring {model_name} calibration for version {calibration.version} (model is {version})"
+            )
+            return None
+        return calibration
+    
+    def attach_shared_model(self, model_name: str, version: str, metadata: Dict[str, Any]):
+        """Attach a model version from the host's shared model directory
+        
+        The first worker on a host to need a version downloads its export
+        bundle and publishes it; every other worker only memory-maps the
+        published node arrays and keeps a private copy of the small scaler
+        and calibration table.
+        """
+        if not is_published(SHARED_MODEL_DIR, model_name, version):
+            with publish_lock(SHARED_MODEL_DIR, model_name):
+                publish(
+                    SHARED_MODEL_DIR, model_name, version,
+                    lambda path: self.materialize_shared_model(model_name, version, path),
+                    keep_versions=SHARED_MODEL_KEEP_VERSIONS
+                )
+        
+        path = version_dir(SHARED_MODEL_DIR, model_name, version)
+        model = SharedModel.open(path)
+        scaler = joblib.load(os.path.join(path, "scaler.pkl"))
+        calibration = None
+        calibration_path = os.path.join(path, "calibration.json")
+        if os.path.exists(calibration_path):
+            with open(calibration_path, "rb") as f:
+                calibration = ScoreCalibration.from_json(f.read())
+        
+        self.install(model_name, model, scaler, calibration, metadata)
+    
+    def materialize_shared_model(self, model_name: str, version: str, path: str):
+        """Unpack a model's export bundle from MinIO into a shared directory"""
+        bundle_path = f"/tmp/{model_name}_bundle.npz"
+        minio_client.fget_object(MINIO_BUCKET, f"models/{model_name}/bundle.npz", bundle_path)
+        
+        with np.load(bundle_path) as bundle:
+            meta = json.loads(bundle["__meta__"].tobytes())
+            if meta.get("version") != version:
+                raise ValueError(f"Bundle version {meta.get('version')} does not match published version {version}")
+            
+            arrays = {name: bundle[name] for name in bundle.files if not name.startswith("__")}
+            save_arrays(path, arrays, meta)
+            
+            with open(os.path.join(path, "scaler.pkl"), "wb") as f:
+                f.write(bundle["__scaler__"].tobytes())
+            
+            if "__calibration__" in bundle.files:
+                with open(os.path.join(path, "calibration.json"), "wb") as f:
+                    f.write(bundle["__calibration__"].tobytes())
+    
     def save_model_to_storage(self, model_name: str):
         """Save model to MinIO storage"""
         try:
+            if isinstance(self.models[model_name], SharedModel):
+                raise ValueError("Shared models are read-only; save from a process that loaded fitted models")
+            
             # Save model files locally first
             model_path = f"/tmp/{model_name}_model.pkl"
             scaler_path = f"/tmp/{model_name}_scaler.pkl"
@@ -384,12 +800,29 @@ class ModelManager:
             minio_client.fput_object(MINIO_BUCKET, model_key, model_path)
             minio_client.fput_object(MINIO_BUCKET, scaler_key, scaler_path)
             
+            # Score calibration, stamped with the version it was built for
+            calibration = self.calibrations.get(model_name)
+            if calibration is not None:
+                calibration.version = self.model_versions[model_name]
+                calibration_json = calibration.to_json()
+                minio_client.put_object(
+                    MINIO_BUCKET,
+                    f"models/{model_name}/calibration.json",
+                    io.BytesIO(calibration_json),
+                    length=len(calibration_json)
+                )
+            
+            # Export bundle for shared serving: node arrays plus the scaler in
+            # a single object, so the two can never come from different versions
+            self.save_export_bundle(model_name)
+            
             # Save metadata
             metadata = {
                 "version": self.model_versions[model_name],
                 "last_updated": datetime.now().isoformat(),
                 "model_type": type(self.models[model_name]).__name__,
-                "scaler_type": type(self.scalers[model_name]).__name__
+                "scaler_type": type(self.scalers[model_name]).__name__,
+                **self.training_state.get(model_name, {})
             }
             
             metadata_key = f"models/{model_name}/metadata.json"
@@ -400,14 +833,136 @@ class ModelManager:
                 length=len(json.dumps(metadata))
             )
             
-            logger.info(f"Saved {model_name} model to storage")
+            # Announce the new version to API and Celery workers
+            try:
+                redis_client.set(MODEL_VERSION_KEY.format(model_name=model_name), self.model_versions[model_name])
+            except Exception as e:
+                logger.warning(f"Could not publish {model_name} model version: {e}")
             
+            logger.info(f"Saved {model_name} model to storage")
+        
         except Exception as e:
             logger.error(f"Could not save {model_name} model to storage: {e}")
             raise
+    
+    def save_export_bundle(self, model_name: str):
+        """Export a fitted model to node arrays and upload them with its scaler and calibration"""
+        try:
+            arrays, meta = export_model(self.models[model_name])
+        except (ValueError, AttributeError) as e:
+            logger.warning(f"{model_name} model cannot be exported for shared serving: {e}")
+            return
+        
+        # Serve with the scaler folded into the split thresholds when the
+        # folded model reproduces the scaled one exactly
+        try:
+            folded_arrays, folded_meta = fold_scaler(arrays, meta, self.scalers[model_name])
+            if verify_folded(arrays, meta, folded_arrays, folded_meta, self.scalers[model_name]):
+                arrays, meta = folded_arrays, folded_meta
+            else:
+                logger.warning(f"Folded {model_name} model differs from the scaled one, exporting it unfolded")
+        except ValueError as e:
+            logger.warning(f"Could not fold the {model_name} scaler into its model: {e}")
+        
+        meta["version"] = self.model_versions[model_name]
+        scaler_buffer = io.BytesIO()
+        joblib.dump(self.scalers[model_name], scaler_buffer)
+        
+        extras = {}
+        if model_name in self.calibrations:
+            extras["__calibration__"] = np.frombuffer(self.calibrations[model_name].to_json(), dtype=np.uint8)
+        
+        bundle_path = f"/tmp/{model_name}_bundle.npz"
+        np.savez(
+            bundle_path,
+            __meta__=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8),
+            __scaler__=np.frombuffer(scaler_buffer.getvalue(), dtype=np.uint8),
+            **extras,
+            **arrays
+        )
+        minio_client.fput_object(MINIO_BUCKET, f"models/{model_name}/bundle.npz", bundle_path)
 
 # Initialize model manager
 model_manager = ModelManager()
+# Picks up versions published by the retraining workers
+model_cache = ModelCache(model_manager, redis_client, minio_client, MINIO_BUCKET)
+
+# Feature set definitions shared by training and serving; bump the version
+# whenever a feature's definition or the column order changes
+PRICING_FEATURE_NAMES = [
+    "avg_monthly_revenue", "revenue_volatility", "avg_monthly_expenses",
+    "expense_volatility", "avg_interest_rate", "avg_inflation_rate",
+    "avg_market_volatility", "avg_utilization", "avg_efficiency",
+    "cashflow_count", "market_data_count", "utilization_count"
+]
+
+YIELD_FEATURE_NAMES = [
+    "avg_yield", "yield_std", "min_yield", "max_yield", "data_points",
+    "interest_rate", "inflation_rate", "market_volatility", "economic_growth", "sector_performance"
+]
+
+RISK_FEATURE_NAMES = [
+    "debt_to_equity", "current_ratio", "profit_margin", "return_on_equity", "cash_flow_coverage",
+    "interest_rate_sensitivity", "currency_exposure", "commodity_exposure",
+    "geographic_concentration", "sector_concentration",
+    "utilization_rate", "efficiency", "maintenance_ratio", "staff_turnover", "quality_score"
+]
+
+ANOMALY_FEATURE_NAMES = [
+    "mean", "std", "min", "max", "p25", "p75", "count", "trend"
+]
+
+# Request fields feeding each block of RISK_FEATURE_NAMES
+RISK_FEATURE_GROUPS = [
+    ("financial_metrics", RISK_FEATURE_NAMES[0:5]),
+    ("market_exposure", RISK_FEATURE_NAMES[5:10]),
+    ("operational_metrics", RISK_FEATURE_NAMES[10:15])
+]
+
+# Signed loadings of the standardized risk features on each risk factor;
+# positive means a higher feature value raises that factor
+RISK_FACTOR_LOADINGS = {
+    "financial_risk": {"debt_to_equity": 1.0, "profit_margin": -1.0, "return_on_equity": -1.0},
+    "market_risk": {"interest_rate_sensitivity": 1.0, "currency_exposure": 1.0, "commodity_exposure": 1.0},
+    "operational_risk": {
+        "utilization_rate": -1.0, "efficiency": -1.0, "maintenance_ratio": 1.0,
+        "staff_turnover": 1.0, "quality_score": -1.0
+    },
+    "liquidity_risk": {"current_ratio": -1.0, "cash_flow_coverage": -1.0},
+    "concentration_risk": {"geographic_concentration": 1.0, "sector_concentration": 1.0}
+}
+
+RISK_FACTOR_NAMES = list(RISK_FACTOR_LOADINGS)
+
+# (factors x features) matrix with each factor's loadings averaged
+RISK_FACTOR_MATRIX = np.array([
+    [loadings.get(name, 0.0) / len(loadings) for name in RISK_FEATURE_NAMES]
+    for loadings in RISK_FACTOR_LOADINGS.values()
+])
+
+FEATURE_SETS = {
+    "pricing": {"version": 1, "columns": PRICING_FEATURE_NAMES},
+    "yield": {"version": 1, "columns": YIELD_FEATURE_NAMES},
+    "risk": {"version": 1, "columns": RISK_FEATURE_NAMES},
+    "anomaly": {"version": 1, "columns": ANOMALY_FEATURE_NAMES}
+}
+
+# Initialize feature store
+feature_store = FeatureStore(
+    FEATURE_STORE_DIR,
+    flush_rows=FEATURE_FLUSH_ROWS,
+    compact_parts=FEATURE_COMPACT_PARTS,
+    compact_max_rows=FEATURE_COMPACT_MAX_ROWS
+)
+for feature_set_name, feature_set in FEATURE_SETS.items():
+    feature_store.register(feature_set_name, feature_set["version"], feature_set["columns"])
+
+def record_features(feature_set: str, asset_id: str, as_of, features: np.ndarray):
+    """Materialize features computed on the online path into the feature store"""
+    try:
+        feature_store.append(feature_set, asset_id, as_of, features)
+    except Exception as e:
+        logger.warning(f"Could not record {feature_set} features for {asset_id}: {e}")
 
 # Feature engineering functions
 def extract_pricing_features(cashflows: List[CashflowData], market_data: List[MarketData], utilization: List[UtilizationData]) -> np.ndarray:
@@ -438,9 +993,9 @@ def extract_pricing_features(cashflows: List[CashflowData], market_data: List[Ma
     # Combine features
     features = [
         monthly_revenue.mean() if len(monthly_revenue) > 0 else 0,
-        monthly_revenue.std() if len(monthly_revenue) > 0 else 0,
+        monthly_revenue.std() if len(monthly_revenue) > 1 else 0,
         monthly_expenses.mean() if len(monthly_expenses) > 0 else 0,
-        monthly_expenses.std() if len(monthly_expenses) > 0 else 0,
+        monthly_expenses.std() if len(monthly_expenses) > 1 else 0,
         market_df['interest_rate'].mean(),
         market_df['inflation_rate'].mean(),
         market_df['market_volatility'].mean(),
@@ -511,6 +1066,86 @@ def extract_risk_features(financial_metrics: Dict[str, float], market_exposure:
     
     return np.array(features).reshape(1, -1)
 
+async def predict_with_fallback(model_name: str, asset_id: str, features: np.ndarray,
+                                method: str = "predict") -> Tuple[float, Optional[str], PinnedModel]:
+    """Predict one asset, falling back while overloaded or if the model fails
+    
+    Returns the value, the degradation reason (None for a full-model
+    answer) and the pinned model version the request used; callers take
+    its scaler, calibration and version rather than re-reading the model
+    manager, which a model refresh may have changed meanwhile. Fallbacks,
+    cheapest first: the asset's last cached prediction (this worker's, then
+    the one shared through Redis), then a truncated ensemble of the pinned
+    model.
+    """
+    mark_inference_start()
+    cache_key = f"degraded:last:{model_name}:{asset_id}"
+    failure = None
+    model = model_manager.pin(model_name)
+    
+    if not load_monitor.degraded:
+        try:
+            value = float(getattr(model, method)(features)[0])
+            prediction_cache.put(model_name, asset_id, value)
+            async_redis.pipeline_background([("setex", cache_key, DEGRADE_CACHE_TTL, value)])
+            return value, None, model
+        except Exception as e:
+            logger.error(f"{model_name} model unavailable, serving fallback: {e}")
+            failure = e
+    
+    value = prediction_cache.get(model_name, asset_id)
+    if value is None:
+        cached = await async_redis.call("get", cache_key)
+        value = float(cached) if cached is not None else None
+    if value is not None:
+        mark_degraded("cached")
+        return value, "cached", model
+    
+    try:
+        value = float(approximate_predict(
+            model.model, model.inputs(features), method, DEGRADE_TREE_FRACTION
+        )[0])
+    except Exception as e:
+        logger.error(f"No fallback for {model_name} prediction of {asset_id}: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"{model_name} model unavailable" if failure else "Service overloaded",
+            headers={"Retry-After": "5"}
+        )
+    
+    mark_degraded("approximate")
+    return value, "approximate", model
+
+def compute_risk_factors(scaled_features: np.ndarray) -> np.ndarray:
+    """Score each risk factor 0-100 from standardized risk features
+    
+    Returns an (assets x factors) array in RISK_FACTOR_NAMES order: the
+    logistic of each factor's averaged signed z-scores, so 50 is a
+    training-population average asset.
+    """
+    return 100.0 / (1.0 + np.exp(-(scaled_features @ RISK_FACTOR_MATRIX.T)))
+
+def classify_risk_score(risk_score: float) -> str:
+    """Map a 0-100 risk score to a risk level"""
+    if risk_score < 30:
+        return "LOW"
+    elif risk_score < 70:
+        return "MEDIUM"
+    return "HIGH"
+
+def herfindahl_index(labels: List[Optional[str]], weights: np.ndarray) -> Dict[str, Any]:
+    """Herfindahl-Hirschman concentration of normalized weights grouped by label"""
+    groups, inverse = np.unique(np.array([label or "unknown" for label in labels]), return_inverse=True)
+    group_weights = np.bincount(inverse, weights=weights, minlength=len(groups))
+    hhi = float(group_weights @ group_weights)
+    
+    order = np.argsort(group_weights)[::-1]
+    return {
+        "hhi": hhi,
+        "effective_count": 1.0 / hhi if hhi > 0 else 0.0,
+        "weights": {str(groups[i]): float(group_weights[i]) for i in order}
+    }
+
 def extract_anomaly_features(time_series_data: List[Dict[str, Any]]) -> np.ndarray:
     """Extract features for anomaly detection"""
     features = []
@@ -544,6 +1179,45 @@ def extract_anomaly_features(time_series_data: List[Dict[str, Any]]) -> np.ndarr
     
     return np.array(features).reshape(1, -1)
 
+def rollup_window(start: Optional[str], end: Optional[str], default_days: int = 30) -> Tuple[datetime, datetime]:
+    """Parse a rollup query window as naive UTC datetimes"""
+    try:
+        end_time = parse_history_time(end, datetime.now(timezone.utc))
+        start_time = parse_history_time(start, end_time - timedelta(days=default_days))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if start_time >= end_time:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return (
+        start_time.astimezone(timezone.utc).replace(tzinfo=None),
+        end_time.astimezone(timezone.utc).replace(tzinfo=None)
+    )
+
+async def summarize_rollups(asset_id: str, sensor_type: str, start: datetime, end: datetime,
+                            quantiles: Optional[List[float]] = None) -> Dict[str, Any]:
+    """Summary statistics of a sensor over [start, end) from the coarsest covering rollups"""
+    covering = rollup_store.keys(asset_id, sensor_type, start, end)
+    hashes = await async_redis.pipeline([("hgetall", key) for _, _, key in covering])
+    if hashes is None:
+        raise HTTPException(status_code=503, detail="Rollups are not available")
+    return rollup_store.summarize(covering, hashes, start, quantiles)
+
+async def extract_anomaly_features_from_rollups(asset_id: str, sensor_type: Optional[str], start: Optional[str],
+                                                end: Optional[str]) -> np.ndarray:
+    """Anomaly features (ANOMALY_FEATURE_NAMES) of a sensor computed from its rollups"""
+    if not sensor_type:
+        raise HTTPException(status_code=422, detail="Send time_series_data or a sensor_type with stored rollups")
+    start_time, end_time = rollup_window(start, end)
+    summary = await summarize_rollups(asset_id, sensor_type, start_time, end_time, [0.25, 0.75])
+    if summary["count"] == 0:
+        raise HTTPException(status_code=404, detail=f"No {sensor_type} readings stored for asset {asset_id} in the window")
+    
+    return np.array([
+        summary["mean"], summary["std"], summary["min"], summary["max"],
+        summary["quantiles"]["p25"], summary["quantiles"]["p75"],
+        summary["count"], summary["trend_per_hour"]
+    ]).reshape(1, -1)
+
 # API endpoints
 @app.get("/")
 async def root():
@@ -552,10 +1226,12 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {
-        "status": "healthy",
+        "status": "degraded" if load_monitor.degraded else "healthy",
         "timestamp": datetime.now().isoformat(),
         "service": "ai-core",
-        "models_loaded": list(model_manager.models.keys())
+        "models_loaded": list(model_manager.models.keys()),
+        "load": load_monitor.status(),
+        "iot_ingest": iot_ingest.status()
     }
 
 @app.post("/price", response_model=PricingResponse)
@@ -568,55 +1244,322 @@ async def price_asset(request: PricingRequest):
             request.market_data, 
             request.utilization
         )
-        
-        # Scale features
-        scaled_features = model_manager.scalers["pricing"].transform(features)
+        record_features("pricing", request.asset_id, request.valuation_date, features)
         
         # Make prediction
-        prediction = model_manager.models["pricing"].predict(scaled_features)[0]
+        prediction, degraded, model = await predict_with_fallback("pricing", request.asset_id, features)
         
         # Generate confidence interval (mock for now)
-        confidence_interval = {
-            "lower": prediction * 0.8,
-            "upper": prediction * 1.2
-        }
+        interval = confidence_interval(prediction)
         
         # Generate feature importance (mock for now)
-        feature_names = [
-            "avg_monthly_revenue", "revenue_volatility", "avg_monthly_expenses",
-            "expense_volatility", "avg_interest_rate", "avg_inflation_rate",
-            "avg_market_volatility", "avg_utilization", "avg_efficiency",
-            "cashflow_count", "market_data_count", "utilization_count"
-        ]
+        feature_importance = dict(zip(PRICING_FEATURE_NAMES, np.random.random(len(PRICING_FEATURE_NAMES))))
         
-        feature_importance = dict(zip(feature_names, np.random.random(len(feature_names))))
+        if not degraded:
+            prediction_store.record(
+                request.asset_id, "pricing", model.version, prediction,
+                payload={"valuation_date": request.valuation_date, "confidence_interval": interval}
+            )
         
         return PricingResponse(
             asset_id=request.asset_id,
             valuation_date=request.valuation_date,
             estimated_value=prediction,
-            confidence_interval=confidence_interval,
+            confidence_interval=interval,
             feature_importance=feature_importance,
-            model_version=model_manager.model_versions["pricing"],
-            timestamp=datetime.now().isoformat()
+            model_version=model.version,
+            timestamp=datetime.now().isoformat(),
+            degraded=degraded
         )
-        
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in pricing endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def refresh_valuation_snapshot(asset_id: str) -> Optional[Tuple[Dict[str, Any], Optional[str]]]:
+    """Revalue one asset from its stored pricing features
+    
+    Returns the new snapshot and the degradation reason, or None when the
+    asset has no stored features. Degraded answers are not written back.
+    """
+    stored = feature_store.lookup("pricing", asset_id)
+    if stored is None:
+        return None
+    
+    features, features_as_of = stored
+    value, degraded, model = await predict_with_fallback("pricing", asset_id, features.reshape(1, -1))
+    payload = encode_snapshot(value, model.version, features_as_of=str(features_as_of))
+    if not degraded:
+        async_redis.pipeline_background([("setex", snapshot_key(asset_id), VALUATION_SNAPSHOT_TTL, payload)])
+    return decode_snapshot(payload), degraded
+
+@app.get("/price/{asset_id}", response_model=ValuationSnapshotResponse)
+async def get_asset_valuation(asset_id: str, max_age: Optional[float] = None, refresh: bool = True):
+    """Current value of an asset from its precomputed valuation snapshot
+    
+    Snapshots are written for every asset by the revalue_universe task.
+    One older than max_age seconds (default VALUATION_SNAPSHOT_MAX_AGE) is
+    revalued on demand from the asset's stored features unless refresh is
+    false; if that is not possible the stale snapshot is returned as such.
+    """
+    max_age = VALUATION_SNAPSHOT_MAX_AGE if max_age is None else max_age
+    try:
+        payload = await async_redis.call("get", snapshot_key(asset_id))
+        snapshot = decode_snapshot(payload) if payload is not None else None
+        
+        refreshed = False
+        degraded = None
+        if refresh and (snapshot is None or time.time() - snapshot["valued_at"] > max_age):
+            result = await refresh_valuation_snapshot(asset_id)
+            if result is not None:
+                snapshot, degraded = result
+                refreshed = True
+        
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail=f"No valuation available for asset {asset_id}")
+        
+        age = max(0.0, time.time() - snapshot["valued_at"])
+        return ValuationSnapshotResponse(
+            asset_id=asset_id,
+            estimated_value=snapshot["value"],
+            confidence_interval={"lower": snapshot["lower"], "upper": snapshot["upper"]},
+            model_version=snapshot["model_version"],
+            valued_at=datetime.fromtimestamp(snapshot["valued_at"]).isoformat(),
+            features_as_of=snapshot.get("features_as_of"),
+            age_seconds=age,
+            stale=not refreshed and age > max_age,
+            refreshed=refreshed,
+            degraded=degraded
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in valuation snapshot endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/price/{asset_id}/delta", response_model=PricingDeltaResponse)
+async def price_asset_delta(asset_id: str, request: PricingDeltaRequest):
+    """Revalue an asset from new records only
+    
+    The records are folded into the asset's incremental pricing state in
+    Redis (monthly sums, their running mean and variance, market and
+    utilization sums and counts), so the cost is proportional to the delta
+    rather than the history. The first delta of an asset, or one sent with
+    reset, should carry its full history. The new valuation also replaces
+    the asset's snapshot.
+    """
+    try:
+        mismatched = [
+            record.asset_id for record in (*request.cashflows, *request.utilization)
+            if record.asset_id != asset_id
+        ]
+        if mismatched:
+            raise HTTPException(status_code=400, detail=f"Records for asset {mismatched[0]} sent to asset {asset_id}")
+        
+        try:
+            state, applied = await run_in_threadpool(
+                pricing_state.apply, asset_id, request.cashflows, request.market_data, request.utilization,
+                reset=request.reset, delta_id=request.delta_id
+            )
+        except redis.RedisError as e:
+            logger.error(f"Pricing state unavailable for {asset_id}: {e}")
+            raise HTTPException(status_code=503, detail="Pricing state is not available")
+        
+        valuation_date = request.valuation_date or datetime.now().date().isoformat()
+        features = features_from_state(state)
+        if applied:
+            record_features("pricing", asset_id, valuation_date, features)
+        
+        prediction, degraded, model = await predict_with_fallback("pricing", asset_id, features)
+        interval = confidence_interval(prediction)
+        model_version = model.version
+        
+        if not degraded:
+            prediction_store.record(
+                asset_id, "pricing", model_version, prediction,
+                payload={"valuation_date": valuation_date, "confidence_interval": interval, "delta_id": request.delta_id}
+            )
+            payload = encode_snapshot(prediction, model_version, features_as_of=valuation_date)
+            async_redis.pipeline_background([("setex", snapshot_key(asset_id), VALUATION_SNAPSHOT_TTL, payload)])
+        
+        return PricingDeltaResponse(
+            asset_id=asset_id,
+            valuation_date=valuation_date,
+            estimated_value=prediction,
+            confidence_interval=interval,
+            features=dict(zip(PRICING_FEATURE_NAMES, features.ravel().tolist())),
+            records_applied=len(request.cashflows) + len(request.market_data) + len(request.utilization) if applied else 0,
+            duplicate=not applied,
+            model_version=model_version,
+            timestamp=datetime.now().isoformat(),
+            degraded=degraded
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in pricing delta endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def apply_scenario_grid(base: np.ndarray, shocks: List[ScenarioShock]) -> np.ndarray:
+    """Expand one feature row into a (scenarios x features) matrix
+    
+    Each shock is one axis of the grid; a shocked column is the base value
+    broadcast against the axes that touch it, so scenarios are ordered as
+    np.ndindex over the grid shape (last axis fastest).
+    """
+    shape = tuple(len(shock.values) for shock in shocks)
+    columns = list(base.ravel())
+    for axis, shock in enumerate(shocks):
+        axis_shape = [1] * len(shape)
+        axis_shape[axis] = -1
+        values = np.asarray(shock.values, dtype=np.float64).reshape(axis_shape)
+        j = PRICING_FEATURE_NAMES.index(shock.feature)
+        if shock.mode == "relative":
+            columns[j] = columns[j] * (1.0 + values)
+        else:
+            columns[j] = columns[j] + values
+    
+    return np.column_stack([np.broadcast_to(column, shape).ravel() for column in columns])
+
+@app.post("/price/scenarios", response_model=ScenarioResponse)
+async def price_scenarios(request: ScenarioRequest):
+    """Price an asset under a grid of feature shocks
+    
+    Features are extracted once; the shock grid is applied as a broadcasted
+    scenarios x features matrix and all scenarios, plus the unshocked base,
+    are priced in a single model call.
+    """
+    for shock in request.shocks:
+        if shock.feature not in PRICING_FEATURE_NAMES:
+            raise HTTPException(status_code=422, detail=f"Unknown pricing feature: {shock.feature}")
+        if shock.mode not in ("absolute", "relative"):
+            raise HTTPException(status_code=422, detail=f"Unknown shock mode: {shock.mode}")
+    shape = [len(shock.values) for shock in request.shocks]
+    scenario_count = int(np.prod(shape))
+    if scenario_count > SCENARIO_MAX_GRID:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Scenario grid has {scenario_count} scenarios; the limit is {SCENARIO_MAX_GRID}"
+        )
+    
+    try:
+        base = extract_pricing_features(request.cashflows, request.market_data, request.utilization)
+        record_features("pricing", request.asset_id, request.valuation_date, base)
+        matrix = np.vstack([base, apply_scenario_grid(base, request.shocks)])
+        
+        mark_inference_start()
+        model = model_manager.pin("pricing")
+        degraded = None
+        if load_monitor.degraded:
+            predictions = approximate_predict(model.model, model.inputs(matrix), "predict", DEGRADE_TREE_FRACTION)
+            degraded = "approximate"
+            mark_degraded(degraded)
+        else:
+            predictions = model.predict(matrix)
+        
+        base_value = float(predictions[0])
+        values = predictions[1:]
+        worst, best = int(np.argmin(values)), int(np.argmax(values))
+        
+        def scenario(index: int) -> Dict[str, Any]:
+            coordinates = np.unravel_index(index, shape)
+            return {
+                "shocks": {
+                    shock.feature: shock.values[i] for shock, i in zip(request.shocks, coordinates)
+                },
+                "value": float(values[index]),
+                "change": float(values[index] - base_value),
+                "change_pct": float((values[index] - base_value) / base_value * 100) if base_value else 0.0
+            }
+        
+        return ScenarioResponse(
+            asset_id=request.asset_id,
+            valuation_date=request.valuation_date,
+            base_value=base_value,
+            axes=[shock.dict() for shock in request.shocks],
+            shape=shape,
+            scenario_count=scenario_count,
+            surface=values.reshape(shape).tolist() if request.include_surface else None,
+            summary={
+                "min": float(values.min()),
+                "max": float(values.max()),
+                "mean": float(values.mean()),
+                "percentiles": dict(zip(["p5", "p50", "p95"], np.percentile(values, [5, 50, 95]).tolist())),
+                "worst": scenario(worst),
+                "best": scenario(best)
+            },
+            model_version=model.version,
+            timestamp=datetime.now().isoformat(),
+            degraded=degraded
+        )
+    
+    except Exception as e:
+        logger.error(f"Error in scenario pricing endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/price/monte_carlo", response_model=MonteCarloResponse)
+async def price_asset_monte_carlo(request: MonteCarloRequest):
+    """Distributional valuation by Monte Carlo simulation of cashflow and discount-rate paths
+    
+    Revenue, expense and market-rate processes are calibrated from the
+    request's history and simulated as (paths x months) matrices in chunks of
+    MONTE_CARLO_CHUNK_PATHS, optionally across MONTE_CARLO_WORKERS processes.
+    """
+    if request.n_paths > MONTE_CARLO_MAX_PATHS:
+        raise HTTPException(status_code=422, detail=f"n_paths may not exceed {MONTE_CARLO_MAX_PATHS}")
+    if request.percentiles and any(p < 0 or p > 100 for p in request.percentiles):
+        raise HTTPException(status_code=422, detail="percentiles must be between 0 and 100")
+    
+    try:
+        params = monte_carlo.calibrate(
+            request.cashflows, request.market_data,
+            spread=request.spread, terminal_multiple=request.terminal_multiple
+        )
+        
+        started = time.perf_counter()
+        values = await run_in_threadpool(
+            monte_carlo.simulate, params, request.horizon_months, request.n_paths,
+            seed=request.seed, chunk_size=MONTE_CARLO_CHUNK_PATHS, workers=MONTE_CARLO_WORKERS
+        )
+        distribution = monte_carlo.summarize(values, request.percentiles)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        
+        prediction_store.record(
+            request.asset_id, "pricing_monte_carlo", "monte_carlo", distribution["mean"],
+            payload={"valuation_date": request.valuation_date, "percentiles": distribution["percentiles"]}
+        )
+        
+        return MonteCarloResponse(
+            asset_id=request.asset_id,
+            valuation_date=request.valuation_date,
+            n_paths=request.n_paths,
+            horizon_months=request.horizon_months,
+            expected_value=distribution["mean"],
+            distribution=distribution,
+            parameters=params.to_dict(),
+            seed=request.seed,
+            elapsed_ms=elapsed_ms,
+            timestamp=datetime.now().isoformat()
+        )
+    
+    except Exception as e:
+        logger.error(f"Error in Monte Carlo pricing endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/predict_yield", response_model=YieldResponse)
 async def predict_yield(request: YieldRequest):
     """Predict future yields based on historical data and market conditions"""
     try:
         # Extract features
         features = extract_yield_features(request.historical_yields, request.market_conditions)
-        
-        # Scale features
-        scaled_features = model_manager.scalers["yield"].transform(features)
+        record_features("yield", request.asset_id, datetime.now(), features)
         
         # Make prediction
-        prediction = model_manager.models["yield"].predict(scaled_features)[0]
+        prediction, degraded, model = await predict_with_fallback("yield", request.asset_id, features)
         
         # Generate forecast for the specified horizon
         predicted_yields = [prediction * (1 + np.random.normal(0, 0.05)) for _ in range(request.forecast_horizon)]
@@ -630,12 +1573,13 @@ async def predict_yield(request: YieldRequest):
         ]
         
         # Generate feature importance (mock for now)
-        feature_names = [
-            "avg_yield", "yield_std", "min_yield", "max_yield", "data_points",
-            "interest_rate", "inflation_rate", "market_volatility", "economic_growth", "sector_performance"
-        ]
+        feature_importance = dict(zip(YIELD_FEATURE_NAMES, np.random.random(len(YIELD_FEATURE_NAMES))))
         
-        feature_importance = dict(zip(feature_names, np.random.random(len(feature_names))))
+        if not degraded:
+            prediction_store.record(
+                request.asset_id, "yield", model.version, prediction,
+                payload={"forecast_horizon": request.forecast_horizon, "predicted_yields": predicted_yields}
+            )
         
         return YieldResponse(
             asset_id=request.asset_id,
@@ -643,10 +1587,13 @@ async def predict_yield(request: YieldRequest):
             predicted_yields=predicted_yields,
             confidence_intervals=confidence_intervals,
             feature_importance=feature_importance,
-            model_version=model_manager.model_versions["yield"],
-            timestamp=datetime.now().isoformat()
+            model_version=model.version,
+            timestamp=datetime.now().isoformat(),
+            degraded=degraded
         )
-        
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in yield prediction endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -661,23 +1608,16 @@ async def calculate_risk_score(request: RiskRequest):
             request.market_exposure,
             request.operational_metrics
         )
-        
-        # Scale features
-        scaled_features = model_manager.scalers["risk"].transform(features)
+        record_features("risk", request.asset_id, datetime.now(), features)
         
         # Make prediction
-        risk_score = model_manager.models["risk"].predict(scaled_features)[0]
+        risk_score, degraded, model = await predict_with_fallback("risk", request.asset_id, features)
         
         # Normalize risk score to 0-100 range
         risk_score = max(0, min(100, risk_score))
         
         # Determine risk level
-        if risk_score < 30:
-            risk_level = "LOW"
-        elif risk_score < 70:
-            risk_level = "MEDIUM"
-        else:
-            risk_level = "HIGH"
+        risk_level = classify_risk_score(risk_score)
         
         # Generate confidence interval
         confidence_interval = {
@@ -685,14 +1625,16 @@ async def calculate_risk_score(request: RiskRequest):
             "upper": min(100, risk_score + 10)
         }
         
-        # Generate risk factors (mock for now)
-        risk_factors = {
-            "financial_risk": np.random.random() * 100,
-            "market_risk": np.random.random() * 100,
-            "operational_risk": np.random.random() * 100,
-            "liquidity_risk": np.random.random() * 100,
-            "concentration_risk": np.random.random() * 100
-        }
+        # Break the score down by risk factor, standardized by the scaler of
+        # the version that produced the score
+        scaled_features = model.scaler.transform(features)
+        risk_factors = dict(zip(RISK_FACTOR_NAMES, compute_risk_factors(scaled_features)[0].tolist()))
+        
+        if not degraded:
+            prediction_store.record(
+                request.asset_id, "risk", model.version, risk_score,
+                payload={"risk_level": risk_level, "risk_factors": risk_factors}
+            )
         
         return RiskResponse(
             asset_id=request.asset_id,
@@ -700,40 +1642,151 @@ async def calculate_risk_score(request: RiskRequest):
             risk_level=risk_level,
             risk_factors=risk_factors,
             confidence_interval=confidence_interval,
-            model_version=model_manager.model_versions["risk"],
-            timestamp=datetime.now().isoformat()
+            model_version=model.version,
+            timestamp=datetime.now().isoformat(),
+            degraded=degraded
         )
-        
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in risk scoring endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/portfolio/risk", response_model=PortfolioRiskResponse)
+async def calculate_portfolio_risk(request: PortfolioRiskRequest):
+    """Aggregate risk across a portfolio of holdings
+    
+    All holdings are scored in one batched pass through the risk model;
+    weighted scores, factor breakdowns and sector/geography concentration
+    are then computed with array operations.
+    """
+    holdings = request.holdings
+    weights = np.array([holding.weight for holding in holdings], dtype=np.float64)
+    total_weight = weights.sum()
+    if total_weight <= 0:
+        raise HTTPException(status_code=400, detail="Holding weights must sum to a positive value")
+    weights = weights / total_weight
+    
+    # Risk features from the request, or the asset's latest stored features
+    features = np.zeros((len(holdings), len(RISK_FEATURE_NAMES)))
+    stored = []
+    for i, holding in enumerate(holdings):
+        if holding.financial_metrics is None and holding.market_exposure is None and holding.operational_metrics is None:
+            stored.append(i)
+        else:
+            features[i] = [
+                (getattr(holding, field) or {}).get(name, 0)
+                for field, names in RISK_FEATURE_GROUPS
+                for name in names
+            ]
+    
+    if stored:
+        try:
+            matrix = feature_store.load_matrix("risk", asset_ids=[holdings[i].asset_id for i in stored])
+        except Exception as e:
+            logger.error(f"Error loading stored risk features: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        
+        rows = {str(asset_id): row for asset_id, row in zip(matrix.asset_ids, matrix.values)}
+        missing = [holdings[i].asset_id for i in stored if holdings[i].asset_id not in rows]
+        if missing:
+            raise HTTPException(
+                status_code=422,
+                detail=f"No risk metrics given or stored for {len(missing)} assets: {', '.join(missing[:10])}"
+            )
+        for i in stored:
+            features[i] = rows[holdings[i].asset_id]
+    
+    try:
+        # Score every holding in one batch
+        model = model_manager.pin("risk")
+        scores = np.clip(model.predict(features), 0, 100)
+        factors = compute_risk_factors(model.scaler.transform(features))
+        
+        portfolio_score = float(weights @ scores)
+        contributions = weights * scores
+        
+        order = np.argsort(contributions)[::-1][:request.top_contributors]
+        top_contributors = [
+            {
+                "asset_id": holdings[i].asset_id,
+                "weight": float(weights[i]),
+                "risk_score": float(scores[i]),
+                "contribution": float(contributions[i]),
+                "share_of_risk": float(contributions[i] / portfolio_score) if portfolio_score > 0 else 0.0
+            }
+            for i in order
+        ]
+        
+        holding_results = None
+        if request.include_holdings:
+            holding_results = [
+                {
+                    "asset_id": holding.asset_id,
+                    "weight": weight,
+                    "risk_score": score,
+                    "risk_level": classify_risk_score(score),
+                    "contribution": contribution
+                }
+                for holding, weight, score, contribution in zip(
+                    holdings, weights.tolist(), scores.tolist(), contributions.tolist()
+                )
+            ]
+        
+        return PortfolioRiskResponse(
+            portfolio_id=request.portfolio_id,
+            holdings_count=len(holdings),
+            risk_score=portfolio_score,
+            risk_level=classify_risk_score(portfolio_score),
+            risk_factors=dict(zip(RISK_FACTOR_NAMES, (weights @ factors).tolist())),
+            concentration={
+                "asset_hhi": float(weights @ weights),
+                "sector": herfindahl_index([holding.sector for holding in holdings], weights),
+                "geography": herfindahl_index([holding.geography for holding in holdings], weights)
+            },
+            top_contributors=top_contributors,
+            holdings=holding_results,
+            model_version=model.version,
+            timestamp=datetime.now().isoformat()
+        )
+    
+    except Exception as e:
+        logger.error(f"Error in portfolio risk endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/anomaly", response_model=AnomalyResponse)
 async def detect_anomalies(request: AnomalyRequest):
     """Detect anomalies in time series data"""
     try:
-        # Extract features
-        features = extract_anomaly_features(request.time_series_data)
-        
-        # Scale features
-        scaled_features = model_manager.scalers["anomaly"].transform(features)
+        # Extract features, from the request's series or the stored rollups
+        if request.time_series_data is not None:
+            features = extract_anomaly_features(request.time_series_data)
+        else:
+            features = await extract_anomaly_features_from_rollups(
+                request.asset_id, request.sensor_type, request.start, request.end
+            )
+        record_features("anomaly", request.asset_id, datetime.now(), features)
         
         # Make prediction
-        anomaly_scores = model_manager.models["anomaly"].score_samples(scaled_features)
-        anomaly_score = anomaly_scores[0]
+        anomaly_score, degraded, model = await predict_with_fallback(
+            "anomaly", request.asset_id, features, method="score_samples"
+        )
         
-        # Detect anomalies (scores below threshold are anomalies)
-        threshold = np.percentile(anomaly_scores, 10)  # 10% threshold
-        is_anomaly = anomaly_score < threshold
+        # Place the score in the training score distribution stored with the
+        # version that produced it (lower scores are more anomalous)
+        calibration = model.calibration
+        score_percentile = calibration.percentile(anomaly_score) if calibration is not None else None
+        severity = anomaly_severity(score_percentile)
         
-        # Generate anomaly details (mock for now)
         anomalies_detected = []
-        if is_anomaly:
+        if severity is not None:
             anomalies_detected.append({
                 "timestamp": datetime.now().isoformat(),
-                "severity": "HIGH" if anomaly_score < threshold * 0.5 else "MEDIUM",
+                "severity": severity,
                 "description": "Unusual pattern detected in time series data",
-                "anomaly_score": float(anomaly_score)
+                "anomaly_score": float(anomaly_score),
+                "score_percentile": score_percentile
             })
         
         # Generate confidence interval
@@ -742,30 +1795,228 @@ async def detect_anomalies(request: AnomalyRequest):
             "upper": min(1, anomaly_score + 0.1)
         }
         
+        if not degraded:
+            prediction_store.record(
+                request.asset_id, "anomaly", model.version, anomaly_score,
+                payload={"anomalies_detected": len(anomalies_detected)}
+            )
+        
         return AnomalyResponse(
             asset_id=request.asset_id,
             anomalies_detected=anomalies_detected,
             anomaly_score=float(anomaly_score),
+            score_percentile=score_percentile,
             confidence_interval=confidence_interval,
-            model_version=model_manager.model_versions["anomaly"],
-            timestamp=datetime.now().isoformat()
+            model_version=model.version,
+            timestamp=datetime.now().isoformat(),
+            degraded=degraded
         )
-        
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in anomaly detection endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/features/{feature_set}/{asset_id}")
+async def get_asset_features(feature_set: str, asset_id: str, as_of: Optional[str] = None):
+    """Look up the latest materialized feature vector of an asset"""
+    if feature_set not in FEATURE_SETS:
+        raise HTTPException(status_code=404, detail=f"Unknown feature set: {feature_set}")
+    
+    try:
+        result = feature_store.lookup(feature_set, asset_id, as_of)
+    except Exception as e:
+        logger.error(f"Error in feature lookup endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No {feature_set} features stored for asset {asset_id}")
+    
+    features, features_as_of = result
+    return {
+        "asset_id": asset_id,
+        "feature_set": feature_set,
+        "feature_set_version": feature_store.version(feature_set),
+        "as_of": str(features_as_of),
+        "features": dict(zip(feature_store.columns(feature_set), features.tolist()))
+    }
+
+@app.post("/ingest/iot")
+async def ingest_iot(request: Request):
+    """Ingest a batch of IoT readings sent as Arrow IPC or NDJSON
+    
+    Columns: asset_id, timestamp, sensor_type, value and optionally unit.
+    Invalid rows are dropped and counted; valid ones are buffered and
+    written to object storage by the background flush. Responds 429 when
+    the buffer is full, i.e. the flush is falling behind.
+    """
+    if iot_ingest.saturated():
+        raise HTTPException(status_code=429, detail="IoT ingestion is behind, retry later", headers={"Retry-After": "1"})
+    
+    body = await request.body()
+    if not body:
+        raise HTTPException(status_code=400, detail="Empty batch")
+    
+    try:
+        table, rejected = await run_in_threadpool(parse_iot_batch, body, request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in IoT ingestion endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if not iot_ingest.offer(table):
+        raise HTTPException(status_code=429, detail="IoT ingestion is behind, retry later", headers={"Retry-After": "1"})
+    
+    return {
+        "accepted": table.num_rows,
+        "rejected": sum(rejected.values()),
+        "rejected_by_reason": rejected,
+        "buffered_rows": iot_ingest.buffered_rows
+    }
+
+@app.get("/assets/{asset_id}/rollups/{sensor_type}")
+async def get_asset_rollups(asset_id: str, sensor_type: str, start: Optional[str] = None, end: Optional[str] = None,
+                            quantiles: str = "0.25,0.5,0.75"):
+    """Summary statistics of an asset's sensor readings over a window
+    
+    Served from the stored hourly/daily/monthly rollups (hour granularity),
+    reading whole months and days at their coarsest resolution. Hours and
+    days past ROLLUP_HOURLY_TTL_DAYS / ROLLUP_DAILY_TTL_DAYS are read from
+    the enclosing day or month, so covered_start/covered_end can be wider
+    than the requested window; partial is set if rollups had expired.
+    """
+    try:
+        qs = [float(q) for q in quantiles.split(",") if q.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="quantiles must be comma-separated numbers")
+    if any(q < 0 or q > 1 for q in qs):
+        raise HTTPException(status_code=400, detail="quantiles must be between 0 and 1")
+    start_time, end_time = rollup_window(start, end)
+    
+    summary = await summarize_rollups(asset_id, sensor_type, start_time, end_time, qs)
+    return {
+        "asset_id": asset_id,
+        "sensor_type": sensor_type,
+        "start": start_time.isoformat() + "Z",
+        "end": end_time.isoformat() + "Z",
+        **summary
+    }
+
+# Chart metrics and the model whose predictions back them
+HISTORY_METRICS = {
+    "valuation": "pricing",
+    "yield": "yield",
+    "risk": "risk",
+    "anomaly": "anomaly"
+}
+
+def parse_history_time(value: Optional[str], default: datetime) -> datetime:
+    """Parse an ISO timestamp as UTC"""
+    if value is None:
+        return default
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+@app.get("/assets/{asset_id}/history")
+async def get_asset_history(asset_id: str, metric: str = "valuation", start: Optional[str] = None,
+                            end: Optional[str] = None, points: int = 500, method: str = "minmax"):
+    """Return an asset's prediction history downsampled to at most `points` points
+    
+    minmax returns one point per time bucket with its min, max and mean so
+    spikes stay visible; lttb returns `points` representative samples.
+    """
+    if metric not in HISTORY_METRICS:
+        raise HTTPException(status_code=400, detail=f"Unknown metric: {metric}")
+    if method not in ("minmax", "lttb"):
+        raise HTTPException(status_code=400, detail=f"Unknown downsampling method: {method}")
+    if not 3 <= points <= HISTORY_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"points must be between 3 and {HISTORY_MAX_POINTS}")
+    if prediction_store.pool is None:
+        raise HTTPException(status_code=503, detail="Prediction history is not available")
+    
+    try:
+        # Default to the last 30 days, ending on the next minute boundary so
+        # repeated chart loads share a cache entry
+        now = datetime.now(timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        end_time = parse_history_time(end, now)
+        start_time = parse_history_time(start, end_time - timedelta(days=30))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if start_time >= end_time:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    
+    model_name = HISTORY_METRICS[metric]
+    cache_key = f"history:{asset_id}:{model_name}:{start_time.timestamp():.0f}:{end_time.timestamp():.0f}:{points}:{method}"
+    cached = await async_redis.call("get", cache_key)
+    if cached:
+        return json.loads(cached)
+    
+    try:
+        if method == "minmax":
+            buckets = await prediction_store.history_buckets(asset_id, model_name, start_time, end_time, points)
+            series = [
+                {
+                    "timestamp": bucket["bucket_start"].isoformat(),
+                    "min": bucket["min"],
+                    "max": bucket["max"],
+                    "mean": bucket["mean"],
+                    "count": bucket["count"]
+                }
+                for bucket in buckets
+            ]
+        else:
+            # Pre-aggregate in SQL so LTTB never sees more than a few
+            # thousand points, however many rows the range holds
+            buckets = await prediction_store.history_buckets(
+                asset_id, model_name, start_time, end_time, points * HISTORY_LTTB_OVERSAMPLING
+            )
+            x = np.array([bucket["bucket_start"].timestamp() for bucket in buckets])
+            y = np.array([bucket["mean"] for bucket in buckets])
+            series = [
+                {"timestamp": buckets[i]["bucket_start"].isoformat(), "value": buckets[i]["mean"]}
+                for i in lttb(x, y, points)
+            ]
+        
+        result = {
+            "asset_id": asset_id,
+            "metric": metric,
+            "model_name": model_name,
+            "start": start_time.isoformat(),
+            "end": end_time.isoformat(),
+            "method": method,
+            "total_count": sum(bucket["count"] for bucket in buckets),
+            "points": series
+        }
+    
+    except Exception as e:
+        logger.error(f"Error in asset history endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    await async_redis.call("setex", cache_key, HISTORY_CACHE_TTL, json.dumps(result))
+    
+    return result
+
 @app.get("/metrics", response_model=MetricsResponse)
 async def get_metrics():
     """Get service metrics and model performance"""
     try:
-        # Get basic metrics from Redis
-        total_requests = redis_client.get("total_requests") or 0
-        successful_requests = redis_client.get("successful_requests") or 0
-        failed_requests = redis_client.get("failed_requests") or 0
+        # Get basic metrics from Redis in one round trip
+        total_requests, successful_requests, failed_requests, response_times = await async_redis.pipeline(
+            [
+                ("get", "total_requests"),
+                ("get", "successful_requests"),
+                ("get", "failed_requests"),
+                ("lrange", "response_times", 0, -1)
+            ],
+            default=[0, 0, 0, []]
+        )
+        total_requests = total_requests or 0
+        successful_requests = successful_requests or 0
+        failed_requests = failed_requests or 0
         
         # Calculate average response time
-        response_times = redis_client.lrange("response_times", 0, -1)
         if response_times:
             avg_response_time = sum(float(rt) for rt in response_times) / len(response_times)
         else:
@@ -801,13 +2052,87 @@ async def get_metrics():
             failed_requests=int(failed_requests),
             average_response_time=avg_response_time,
             model_performance=model_performance,
+            memory=memory_tracker.summary(samples=False) if MEMORY_TRACKING_ENABLED else None,
             last_updated=datetime.now().isoformat()
         )
-        
+    
     except Exception as e:
         logger.error(f"Error in metrics endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/profiles")
+async def list_profiles(limit: int = 50, route: Optional[str] = None):
+    """List recent request profiles, newest first
+    
+    Profiles are recorded for requests sent with the X-AIMY-Profile header
+    or sampled at PROFILE_SAMPLE_RATE; fetch one with /profiles/{profile_id}.
+    Without the Redis index the listing comes from MinIO and has no tags.
+    """
+    limit = max(1, min(limit, PROFILE_INDEX_SIZE))
+    try:
+        entries = await async_redis.call("lrange", PROFILE_INDEX_KEY, 0, -1)
+        if entries:
+            profiles = request_profiler.recent(entries, limit, route)
+        elif route is None:
+            profiles = await run_in_threadpool(request_profiler.list_stored, limit)
+        else:
+            profiles = []
+        
+        return {"profiles": profiles, "count": len(profiles)}
+    
+    except Exception as e:
+        logger.error(f"Error in profile listing endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """Fetch a stored profile as speedscope JSON (open it at speedscope.app)"""
+    payload = await run_in_threadpool(request_profiler.fetch, profile_id)
+    if payload is None:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}")
+    
+    return Response(
+        content=payload,
+        media_type="application/json",
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.speedscope.json"'}
+    )
+
+@app.get("/debug/memory")
+async def debug_memory(trace_seconds: float = 0, task_records: int = 10):
+    """Memory of this API worker and of recent Celery tasks
+    
+    Reports RSS and peak RSS, per-route RSS growth, the sampled tracemalloc
+    snapshots of this worker and per-task peak RSS recorded by the Celery
+    workers. With trace_seconds, traces all allocations of this worker for
+    that long and returns the top allocation sites still live at the end.
+    """
+    if not MEMORY_TRACKING_ENABLED:
+        raise HTTPException(status_code=404, detail="Memory tracking is disabled")
+    
+    try:
+        trace = None
+        if trace_seconds > 0:
+            probe = memory_tracker.start("debug/trace", trace=True)
+            if not probe.traced:
+                raise HTTPException(status_code=409, detail="tracemalloc is already tracing in this worker")
+            await asyncio.sleep(min(trace_seconds, MEMORY_MAX_TRACE_SECONDS))
+            trace = memory_tracker.stop(probe)
+        
+        entries = await async_redis.call("lrange", TASK_MEMORY_KEY, 0, -1, default=[])
+        
+        return {
+            "api_worker": memory_tracker.summary(),
+            "tasks": summarize_records(entries or [], samples=task_records),
+            "trace": trace,
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in memory debug endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/demo/generate_data")
 async def generate_demo_data(asset_id: str = "demo-asset-001"):
     """Generate demo data for testing and demonstration"""
@@ -848,77 +2173,213 @@ async def generate_demo_data(asset_id: str = "demo-asset-001"):
                 "utilization": len(utilization)
             }
         }
-        
+    
     except Exception as e:
         logger.error(f"Error generating demo data: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/retrain")
-async def retrain_models(background_tasks: BackgroundTasks):
+async def retrain_models(background_tasks: BackgroundTasks, mode: str = "incremental"):
     """Trigger model retraining (runs in background)"""
     try:
+        if mode not in ("incremental", "full"):
+            raise HTTPException(status_code=400, detail=f"Unknown retraining mode: {mode}")
+        
         # Add retraining task to background
-        background_tasks.add_task(retrain_models_task)
+        background_tasks.add_task(retrain_models_task, mode)
         
         return {
             "message": "Model retraining started",
             "status": "scheduled",
+            "mode": mode,
             "timestamp": datetime.now().isoformat()
         }
-        
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error scheduling model retraining: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def retrain_models_task():
-    """Background task for model retraining"""
+async def retrain_models_task(mode: str = "incremental"):
+    """Background task for model retraining
+    
+    API workers serve read-only shared models, so training runs on the
+    Celery model_training queue, which loads the fitted estimators.
+    """
     try:
-        logger.info("Starting model retraining...")
-        
-        # This would typically involve:
-        # 1. Loading new training data
-        # 2. Retraining models
-        # 3. Evaluating performance
-        # 4. Saving updated models
-        
-        # For now, just update model versions
-        for model_name in model_manager.models:
-            model_manager.model_versions[model_name] = f"v1.0.1-{datetime.now().strftime('%Y%m%d')}"
-            model_manager.save_model_to_storage(model_name)
-        
-        logger.info("Model retraining completed")
-        
+        logger.info(f"Scheduling model retraining (mode: {mode})...")
+        celery_app.send_task(
+            "celery_tasks.retrain_models",
+            kwargs={"mode": mode},
+            queue="model_training"
+        )
+    
     except Exception as e:
         logger.error(f"Error in model retraining: {e}")
 
+@app.on_event("startup")
+async def connect_prediction_store():
+    """Open the prediction history pool; serving continues without it"""
+    try:
+        await prediction_store.start()
+    except Exception as e:
+        logger.warning(f"Prediction history disabled, could not connect to Postgres: {e}")
+
+@app.on_event("startup")
+async def start_iot_ingest():
+    """Start the periodic IoT buffer flush"""
+    iot_ingest.start()
+
+@app.on_event("shutdown")
+async def flush_iot_ingest():
+    """Write buffered IoT readings"""
+    await iot_ingest.close()
+
+@app.on_event("startup")
+async def start_load_monitor():
+    """Start the event-loop lag probe"""
+    load_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_load_monitor():
+    await load_monitor.stop()
+
+async def refresh_models_periodically():
+    """Swap in model versions published since the last check (one Redis MGET)"""
+    while True:
+        await asyncio.sleep(MODEL_REFRESH_INTERVAL)
+        try:
+            await run_in_threadpool(model_cache.refresh, list(model_manager.models))
+        except Exception as e:
+            logger.warning(f"Model version check failed: {e}")
+
+@app.on_event("startup")
+async def start_model_refresh():
+    """Start watching for newly published model versions"""
+    if MODEL_REFRESH_INTERVAL > 0:
+        app.state.model_refresh_task = asyncio.create_task(refresh_models_periodically())
+
+@app.on_event("shutdown")
+async def stop_model_refresh():
+    task = getattr(app.state, "model_refresh_task", None)
+    if task is not None:
+        task.cancel()
+
+async def flush_feature_store_periodically():
+    """Write buffered online features every FEATURE_FLUSH_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(FEATURE_FLUSH_INTERVAL)
+        try:
+            await run_in_threadpool(feature_store.flush)
+        except Exception as e:
+            logger.warning(f"Periodic feature flush failed: {e}")
+
+@app.on_event("startup")
+async def start_feature_flush():
+    """Start the periodic feature store flush"""
+    if os.path.commonpath([tempfile.gettempdir(), os.path.abspath(FEATURE_STORE_DIR)]) == tempfile.gettempdir():
+        logger.warning(
+            f"FEATURE_STORE_DIR {FEATURE_STORE_DIR} is a local temporary directory; features recorded "
+            "by the API are invisible to Celery workers on other hosts and lost with the container"
+        )
+    if FEATURE_FLUSH_INTERVAL > 0:
+        app.state.feature_flush_task = asyncio.create_task(flush_feature_store_periodically())
+
+@app.on_event("shutdown")
+async def flush_feature_store():
+    """Write features still buffered by this worker"""
+    task = getattr(app.state, "feature_flush_task", None)
+    if task is not None:
+        task.cancel()
+    feature_store.flush()
+
+@app.on_event("shutdown")
+async def close_prediction_store():
+    """Write buffered predictions and close the pool"""
+    await prediction_store.close()
+
+@app.on_event("shutdown")
+async def close_async_redis():
+    """Finish pending metric writes and close the Redis pool"""
+    await async_redis.close()
+
+@app.on_event("shutdown")
+async def stop_monte_carlo_pool():
+    monte_carlo.shutdown()
+
+@app.on_event("shutdown")
+async def flush_profiles():
+    """Finish queued profile uploads"""
+    await run_in_threadpool(request_profiler.shutdown)
+
+def profile_tags(request: Request, response, versions: Dict[str, str]) -> Dict[str, Any]:
+    """Route, model version and payload size a request profile is stored with
+    
+    The version is the one the request pinned, not the current one.
+    """
+    model_name = PROFILE_ROUTE_MODELS.get(request.url.path)
+    return {
+        "method": request.method,
+        "route": request.url.path,
+        "model": model_name,
+        "model_version": versions.get(model_name) if model_name else None,
+        "payload_bytes": int(request.headers.get("content-length") or 0),
+        "status_code": response.status_code if response is not None else 500
+    }
+
 # Middleware for metrics collection
 @app.middleware("http")
 async def metrics_middleware(request, call_next):
     start_time = time.time()
     
-    # Process request
-    response = await call_next(request)
+    # Sampled or header-requested profiling; a single flag check when off
+    profiler = versions_token = None
+    if request_profiler.enabled and request_profiler.wants(request):
+        profiler = request_profiler.start()
+        if profiler is not None:
+            versions = {}
+            versions_token = pinned_versions.set(versions)
+    memory_probe = memory_tracker.start(request.url.path) if MEMORY_TRACKING_ENABLED else None
+    
+    # Process request; inference records its queueing delay and endpoints
+    # their fallback answers in the context
+    degradation = {"arrived": time.monotonic()}
+    token = degradation_context.set(degradation)
+    response = None
+    try:
+        response = await call_next(request)
+    finally:
+        degradation_context.reset(token)
+        if profiler is not None:
+            pinned_versions.reset(versions_token)
+            profile_id = request_profiler.finish(profiler, profile_tags(request, response, versions))
+        if memory_probe is not None:
+            # Aggregate by route template, not by path with its parameters
+            route = request.scope.get("route")
+            memory_tracker.stop(memory_probe, name=route.path if route is not None else "unmatched")
     
     # Calculate response time
     response_time = time.time() - start_time
+    # Only inference requests, which have fallbacks, feed the overload
+    # detector, and with their wait rather than the whole handler time
+    if "queued" in degradation:
+        load_monitor.observe_latency(degradation["queued"])
+    if "reason" in degradation:
+        response.headers[DEGRADED_HEADER] = degradation["reason"]
+    if profiler is not None:
+        response.headers[PROFILE_ID_HEADER] = profile_id
     
-    # Store metrics in Redis
-    try:
-        redis_client.incr("total_requests")
-        if response.status_code < 400:
-            redis_client.incr("successful_requests")
-        else:
-            redis_client.incr("failed_requests")
-        
+    # Store metrics in Redis without holding up the response
+    async_redis.pipeline_background([
+        ("incr", "total_requests"),
+        ("incr", "successful_requests" if response.status_code < 400 else "failed_requests"),
         # Store response time (keep last 100)
-        redis_client.lpush("response_times", response_time)
-        redis_client.ltrim("response_times", 0, 99)
-        
-    except Exception as e:
-        logger.warning(f"Could not store metrics: {e}")
+        ("lpush", "response_times", response_time),
+        ("ltrim", "response_times", 0, 99)
+    ])
     
     return response
 
 if __name__ == "__main__":
-    import time
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,204 @@
+"""
+Memory instrumentation for AIMY AI Core Service
+Tracks resident set size and peak RSS per request and per Celery task, and
+takes sampled tracemalloc snapshots reporting the top allocation sites
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import resource
+import threading
+import tracemalloc
+from collections import deque
+from typing import List, Dict, Optional, Any
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Recent Celery task memory records, newest first (written by the workers)
+TASK_MEMORY_KEY = "memory:tasks:recent"
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Frames that only show the tracer itself
+TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>")
+)
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return psutil.Process().memory_info().rss
+
+def peak_rss() -> int:
+    """Peak resident set size in bytes since start or the last reset_peak_rss()"""
+    try:
+        with open("/proc/self/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS to the current RSS (Linux 4.0+)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def top_allocations(snapshot: tracemalloc.Snapshot, limit: int, frames: int = 1) -> List[Dict[str, Any]]:
+    """Largest live allocation sites of a snapshot, grouped by call stack when frames > 1"""
+    snapshot = snapshot.filter_traces(TRACE_FILTERS)
+    sites = []
+    for stat in snapshot.statistics("traceback" if frames > 1 else "lineno")[:limit]:
+        site = {
+            "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_bytes": stat.size,
+            "count": stat.count
+        }
+        if frames > 1:
+            site["traceback"] = [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+        sites.append(site)
+    return sites
+
+class MemoryProbe:
+    """Memory state at the start of one request or task"""
+    
+    def __init__(self, name: str, rss: int, peak_reset: bool, traced: bool):
+        self.name = name
+        self.rss = rss
+        self.peak_reset = peak_reset
+        self.traced = traced
+        self.started = time.perf_counter()
+
+class MemoryTracker:
+    """Per-process memory accounting for requests or tasks
+    
+    Every probe records RSS before and after; with reset_peak, the peak RSS
+    in between too, which is exact when the process runs one unit of work
+    at a time (a prefork Celery child) and an upper bound otherwise. A
+    sample_rate fraction of probes also run tracemalloc and keep the top
+    allocation sites still live at the end. tracemalloc is process-wide, so
+    only one probe is traced at a time, and in a concurrent API worker its
+    snapshot also includes allocations of requests that overlapped it.
+    """
+    
+    def __init__(self, sample_rate: float = 0.0, top_n: int = 10, trace_frames: int = 1,
+                 keep_samples: int = 20):
+        self.sample_rate = sample_rate
+        self.top_n = top_n
+        self.trace_frames = trace_frames
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self.samples: deque = deque(maxlen=keep_samples)
+        self._lock = threading.Lock()
+        self._tracing = False
+    
+    def _claim_tracing(self) -> bool:
+        with self._lock:
+            # Leave tracemalloc alone if something else started it
+            if self._tracing or tracemalloc.is_tracing():
+                return False
+            self._tracing = True
+        tracemalloc.start(self.trace_frames)
+        return True
+    
+    def start(self, name: str, reset_peak: bool = False, trace: Optional[bool] = None) -> MemoryProbe:
+        """Begin measuring; trace=None samples at sample_rate"""
+        if trace is None:
+            trace = self.sample_rate > 0 and random.random() < self.sample_rate
+        traced = trace and self._claim_tracing()
+        peak_reset = reset_peak and reset_peak_rss()
+        return MemoryProbe(name, current_rss(), peak_reset, traced)
+    
+    def stop(self, probe: MemoryProbe, name: Optional[str] = None) -> Dict[str, Any]:
+        """Finish measuring and return the record; name overrides the probe's"""
+        rss = current_rss()
+        record = {
+            "name": name or probe.name,
+            "pid": os.getpid(),
+            "timestamp": time.time(),
+            "duration_ms": round((time.perf_counter() - probe.started) * 1000, 3),
+            "rss_before_bytes": probe.rss,
+            "rss_after_bytes": rss,
+            "rss_growth_bytes": rss - probe.rss
+        }
+        if probe.peak_reset:
+            record["peak_rss_bytes"] = peak_rss()
+        
+        if probe.traced:
+            try:
+                snapshot = tracemalloc.take_snapshot()
+                traced_current, traced_peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+                with self._lock:
+                    self._tracing = False
+            record["traced_current_bytes"] = traced_current
+            record["traced_peak_bytes"] = traced_peak
+            record["top_allocations"] = top_allocations(snapshot, self.top_n, self.trace_frames)
+            self.samples.appendleft(record)
+        
+        self.observe(record)
+        return record
+    
+    def observe(self, record: Dict[str, Any]):
+        """Fold a record into the per-name aggregates"""
+        with self._lock:
+            stats = self.stats.setdefault(record["name"], {
+                "count": 0,
+                "traced": 0,
+                "rss_growth_total_bytes": 0,
+                "rss_growth_max_bytes": 0,
+                "peak_rss_max_bytes": 0,
+                "traced_peak_max_bytes": 0
+            })
+            stats["count"] += 1
+            stats["rss_growth_total_bytes"] += record["rss_growth_bytes"]
+            stats["rss_growth_max_bytes"] = max(stats["rss_growth_max_bytes"], record["rss_growth_bytes"])
+            stats["peak_rss_max_bytes"] = max(stats["peak_rss_max_bytes"], record.get("peak_rss_bytes", 0))
+            if "traced_peak_bytes" in record:
+                stats["traced"] += 1
+                stats["traced_peak_max_bytes"] = max(stats["traced_peak_max_bytes"], record["traced_peak_bytes"])
+    
+    def summary(self, samples: bool = True) -> Dict[str, Any]:
+        """Process memory, per-name aggregates and optionally the sampled snapshots"""
+        with self._lock:
+            stats = {name: dict(values) for name, values in self.stats.items()}
+        summary = {
+            "pid": os.getpid(),
+            "rss_bytes": current_rss(),
+            "peak_rss_bytes": peak_rss(),
+            "tracemalloc_active": tracemalloc.is_tracing(),
+            "sample_rate": self.sample_rate,
+            "stats": stats
+        }
+        if samples:
+            summary["samples"] = list(self.samples)
+        return summary
+
+def summarize_records(entries: List[bytes], samples: int = 10) -> Dict[str, Any]:
+    """Per-name aggregates and the latest traced records of stored JSON records"""
+    tracker = MemoryTracker(keep_samples=samples)
+    traced = []
+    for raw in reversed(entries):
+        record = json.loads(raw)
+        tracker.observe(record)
+        if "top_allocations" in record:
+            traced.append(record)
+    return {"stats": tracker.stats, "samples": traced[::-1][:samples]}
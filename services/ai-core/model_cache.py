@@ -0,0 +1,108 @@
+"""
+Version-aware model cache for AIMY AI Core Celery workers
+Checks the published model versions at task start, reloads only what
+changed and pins one version per model for the length of a job
+"""
+
+import json
+import logging
+from contextlib import contextmanager
+from typing import List, Dict, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Redis key holding the latest published version of a model
+MODEL_VERSION_KEY = "models:{model_name}:version"
+
+class PinnedModel:
+    """A model, its scaler, calibration and version, fixed for the duration of a job"""
+    
+    def __init__(self, name: str, model, scaler, version: str, calibration=None):
+        self.name = name
+        self.model = model
+        self.scaler = scaler
+        self.version = version
+        self.calibration = calibration
+    
+    def inputs(self, features: np.ndarray) -> np.ndarray:
+        """Features in the units the model splits on
+        
+        Exported models with the scaler folded into their thresholds take
+        raw features, so the scaler is skipped and cannot disagree with them.
+        """
+        if getattr(self.model, "scaler_folded", False):
+            return features
+        return self.scaler.transform(features)
+    
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        return self.model.predict(self.inputs(features))
+    
+    def score_samples(self, features: np.ndarray) -> np.ndarray:
+        return self.model.score_samples(self.inputs(features))
+
+class ModelCache:
+    """Worker-local cache in front of a ModelManager
+    
+    The published version is read from Redis (one MGET per check) with the
+    MinIO metadata as fallback, and a model is only reloaded when that
+    version differs from the one this worker holds.
+    """
+    
+    def __init__(self, model_manager, redis_client, minio_client, bucket: str):
+        self.model_manager = model_manager
+        self.redis_client = redis_client
+        self.minio_client = minio_client
+        self.bucket = bucket
+    
+    def published_versions(self, model_names: List[str]) -> Dict[str, Optional[str]]:
+        """Return the latest published version of each model"""
+        versions: Dict[str, Optional[str]] = {}
+        try:
+            keys = [MODEL_VERSION_KEY.format(model_name=name) for name in model_names]
+            for name, version in zip(model_names, self.redis_client.mget(keys)):
+                versions[name] = version.decode() if isinstance(version, bytes) else version
+        except Exception as e:
+            logger.warning(f"Could not read published model versions from Redis: {e}")
+        
+        for name in model_names:
+            if versions.get(name) is None:
+                versions[name] = self.metadata_version(name)
+        
+        return versions
+    
+    def metadata_version(self, model_name: str) -> Optional[str]:
+        """Read a model's published version from its MinIO metadata"""
+        try:
+            metadata_obj = self.minio_client.get_object(self.bucket, f"models/{model_name}/metadata.json")
+            return json.loads(metadata_obj.read()).get("version")
+        except Exception as e:
+            logger.warning(f"Could not read {model_name} metadata: {e}")
+            return None
+    
+    def refresh(self, model_names: List[str]) -> Dict[str, str]:
+        """Reload the models whose published version changed; return the versions held"""
+        for name, version in self.published_versions(model_names).items():
+            if version is None or version == self.model_manager.model_versions.get(name):
+                continue
+            
+            logger.info(
+                f"Reloading {name} model: {self.model_manager.model_versions.get(name)} -> {version}"
+            )
+            try:
+                self.model_manager.load_model_from_storage(name)
+            except Exception as e:
+                # Keep serving the version already loaded
+                logger.warning(f"Could not reload {name} model, keeping current version: {e}")
+        
+        return {name: self.model_manager.model_versions.get(name, "unknown") for name in model_names}
+    
+    @contextmanager
+    def pinned(self, model_names: List[str]):
+        """Pin the current version of each model for the length of a job
+        
+        Yields {name: PinnedModel}. The pinned objects are references taken
+        once, so a reload during the job cannot change the models it uses.
+        """
+        self.refresh(model_names)
+        yield {name: self.model_manager.pin(name) for name in model_names}
@@ -0,0 +1,311 @@
+"""
+Monte Carlo cashflow valuation for AIMY AI Core Service
+Simulates revenue, expense and discount-rate paths as (paths x months)
+matrices, calibrated from an asset's cashflow and market history, and
+returns the distribution of present values
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Any
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PERCENTILES = [1, 5, 10, 25, 50, 75, 90, 95, 99]
+
+# Used when the history is too short to estimate a parameter
+DEFAULT_MONTHLY_VOLATILITY = 0.05
+DEFAULT_CASHFLOW_PERSISTENCE = 0.5
+DEFAULT_RATE_MEAN_REVERSION = 0.5  # per year
+DEFAULT_RATE_VOLATILITY = 0.01  # per sqrt(year)
+DEFAULT_CASHFLOW_CORRELATION = 0.3
+
+# Months averaged for the starting revenue/expense level
+TRAILING_LEVEL_MONTHS = 6
+# Largest trend in monthly log level (about 12.7% a year); trends are only
+# fitted on at least a year of complete months and dropped unless
+# significant at two standard errors
+MAX_MONTHLY_DRIFT = 0.01
+MIN_TREND_MONTHS = 12
+# A fitted trend fades with this half-life, so cumulative growth stays
+# bounded (at most drift / (1 - 0.5 ** (1 / half-life)), about 35x the
+# monthly drift) instead of compounding over the whole horizon
+TREND_HALF_LIFE_MONTHS = 24
+MAX_CASHFLOW_PERSISTENCE = 0.95
+
+class MonteCarloParams:
+    """Calibrated simulation parameters (monthly steps, annual rates)"""
+    
+    def __init__(self, revenue: float, revenue_drift: float, revenue_volatility: float,
+                 expense: float, expense_drift: float, expense_volatility: float,
+                 cashflow_correlation: float, rate: float, rate_mean: float,
+                 rate_mean_reversion: float, rate_volatility: float, spread: float = 0.03,
+                 terminal_multiple: float = 0.0, revenue_persistence: float = DEFAULT_CASHFLOW_PERSISTENCE,
+                 expense_persistence: float = DEFAULT_CASHFLOW_PERSISTENCE):
+        self.revenue = revenue
+        self.revenue_drift = revenue_drift
+        self.revenue_volatility = revenue_volatility
+        self.revenue_persistence = revenue_persistence
+        self.expense = expense
+        self.expense_drift = expense_drift
+        self.expense_volatility = expense_volatility
+        self.expense_persistence = expense_persistence
+        self.cashflow_correlation = cashflow_correlation
+        self.rate = rate
+        self.rate_mean = rate_mean
+        self.rate_mean_reversion = rate_mean_reversion
+        self.rate_volatility = rate_volatility
+        self.spread = spread
+        self.terminal_multiple = terminal_multiple
+    
+    def to_dict(self) -> Dict[str, float]:
+        return dict(self.__dict__)
+
+def _complete_months(monthly: pd.DataFrame) -> pd.DataFrame:
+    """Drop the first and last month, which a history rarely covers in full"""
+    return monthly.iloc[1:-1] if len(monthly) >= 5 else monthly
+
+def _level_process(series: pd.Series):
+    """Level, monthly drift, volatility, persistence and log residuals of a monthly series
+    
+    The level is the trailing mean; the log level around it is a linear
+    trend plus AR(1) noise, with volatility the noise's stationary standard
+    deviation and persistence its lag-1 autocorrelation.
+    """
+    if len(series) == 0:
+        return 0.0, 0.0, 0.0, 0.0, pd.Series(dtype=float)
+    level = float(series.iloc[-TRAILING_LEVEL_MONTHS:].mean())
+    positive = series[series > 0]
+    if len(positive) < 3 or level <= 0:
+        volatility = float(series.std(ddof=1) / series.mean()) if len(series) > 1 and series.mean() > 0 else DEFAULT_MONTHLY_VOLATILITY
+        return max(level, 0.0), 0.0, volatility, DEFAULT_CASHFLOW_PERSISTENCE, pd.Series(dtype=float)
+    
+    t = np.array([period.ordinal for period in positive.index], dtype=np.float64)
+    t -= t.mean()
+    logs = np.log(positive.values)
+    slope = float(t @ (logs - logs.mean()) / (t @ t))
+    residuals = logs - logs.mean() - slope * t
+    drift = 0.0
+    if len(positive) >= MIN_TREND_MONTHS:
+        standard_error = np.sqrt(residuals @ residuals / (len(positive) - 2) / (t @ t))
+        if abs(slope) > 2 * standard_error:
+            drift = float(np.clip(slope, -MAX_MONTHLY_DRIFT, MAX_MONTHLY_DRIFT))
+            residuals = logs - logs.mean() - drift * t
+            residuals -= residuals.mean()
+    
+    volatility = float(residuals.std(ddof=1))
+    persistence = DEFAULT_CASHFLOW_PERSISTENCE
+    if len(residuals) >= 6 and residuals[:-1] @ residuals[:-1] > 0:
+        persistence = float(np.clip(residuals[:-1] @ residuals[1:] / (residuals[:-1] @ residuals[:-1]), 0.0, MAX_CASHFLOW_PERSISTENCE))
+    return level, drift, volatility, persistence, pd.Series(residuals, index=positive.index)
+
+def calibrate(cashflows: List[Any], market_data: List[Any], spread: float = 0.03,
+              terminal_multiple: float = 0.0) -> MonteCarloParams:
+    """Estimate simulation parameters from cashflow and market history
+    
+    Cashflows need .date, .amount and .type; market data needs .date and
+    .interest_rate. Monthly revenue and expense magnitudes start from their
+    trailing mean over complete months and revert to it (times a capped,
+    fading trend) with correlated AR(1) log noise, so month-to-month noise in the
+    history does not compound over the horizon; the discount rate follows a
+    mean-reverting (Vasicek) process fitted as an AR(1) on month-end rates.
+    """
+    cashflow_df = pd.DataFrame({
+        "date": pd.to_datetime([cf.date for cf in cashflows]),
+        "amount": [abs(cf.amount) for cf in cashflows],
+        "type": [cf.type for cf in cashflows]
+    })
+    months = cashflow_df["date"].dt.to_period("M")
+    monthly = cashflow_df.pivot_table(index=months, columns="type", values="amount", aggfunc="sum", fill_value=0.0)
+    # Calendar months without any cashflow are zero, not missing
+    if len(monthly):
+        monthly = monthly.reindex(pd.period_range(monthly.index.min(), monthly.index.max(), freq="M"), fill_value=0.0)
+    monthly = _complete_months(monthly)
+    revenue = monthly["revenue"] if "revenue" in monthly else pd.Series(dtype=float)
+    expense = monthly["expense"] if "expense" in monthly else pd.Series(dtype=float)
+    
+    revenue_level, revenue_drift, revenue_volatility, revenue_persistence, revenue_residuals = _level_process(revenue)
+    expense_level, expense_drift, expense_volatility, expense_persistence, expense_residuals = _level_process(expense)
+    
+    correlation = DEFAULT_CASHFLOW_CORRELATION
+    both = revenue_residuals.index.intersection(expense_residuals.index)
+    if len(both) >= 4:
+        estimated = np.corrcoef(revenue_residuals[both].values, expense_residuals[both].values)[0, 1]
+        if np.isfinite(estimated):
+            correlation = float(np.clip(estimated, -0.99, 0.99))
+    
+    market_df = pd.DataFrame({
+        "date": pd.to_datetime([md.date for md in market_data]),
+        "rate": [md.interest_rate for md in market_data]
+    }).sort_values("date")
+    month_end = market_df.groupby(market_df["date"].dt.to_period("M"))["rate"].last().values
+    rate = float(market_df["rate"].iloc[-1]) if len(market_df) else 0.05
+    rate_mean = float(market_df["rate"].mean()) if len(market_df) else rate
+    mean_reversion, rate_volatility = DEFAULT_RATE_MEAN_REVERSION, DEFAULT_RATE_VOLATILITY
+    
+    if len(month_end) >= 6:
+        # r[t+1] - m = b (r[t] - m) + e with b = exp(-kappa dt); the long-run
+        # level m is the sample mean, as a/(1 - b) explodes for trending history
+        deviations = month_end - rate_mean
+        b = float(deviations[:-1] @ deviations[1:] / (deviations[:-1] @ deviations[:-1])) if np.any(deviations[:-1]) else 0.0
+        if 0 < b < 1:
+            mean_reversion = float(-np.log(b) * 12)
+        residuals = deviations[1:] - b * deviations[:-1]
+        rate_volatility = float(residuals.std(ddof=1) * np.sqrt(12))
+    
+    return MonteCarloParams(
+        revenue_level, revenue_drift, revenue_volatility,
+        expense_level, expense_drift, expense_volatility,
+        correlation, rate, rate_mean, mean_reversion, rate_volatility,
+        spread=spread, terminal_multiple=terminal_multiple,
+        revenue_persistence=revenue_persistence, expense_persistence=expense_persistence
+    )
+
+def trend(drift: float, horizon_months: int) -> np.ndarray:
+    """Cumulative log growth of a damped monthly trend at months 1..horizon_months"""
+    damping = 0.5 ** (1.0 / TREND_HALF_LIFE_MONTHS)
+    return drift * (1.0 - damping ** np.arange(1, horizon_months + 1)) / (1.0 - damping)
+
+def _expected_discount(params: MonteCarloParams, horizon_months: int) -> np.ndarray:
+    """Discount factors along the expected (mean) rate path"""
+    dt = 1.0 / 12.0
+    decay = np.exp(-params.rate_mean_reversion * dt) ** np.arange(1, horizon_months + 1)
+    rates = params.rate_mean + (params.rate - params.rate_mean) * decay + params.spread
+    return np.exp(-np.cumsum(rates) * dt)
+
+def deterministic_value(params: MonteCarloParams, horizon_months: int) -> float:
+    """Present value of the expected cashflows at the expected rate path, without noise"""
+    net = (params.revenue * np.exp(trend(params.revenue_drift, horizon_months))
+           - params.expense * np.exp(trend(params.expense_drift, horizon_months)))
+    discount = _expected_discount(params, horizon_months)
+    value = float(net @ discount)
+    if params.terminal_multiple:
+        value += params.terminal_multiple * float(net[-min(12, horizon_months):].sum()) * float(discount[-1])
+    return value
+
+def simulate_chunk(params: MonteCarloParams, horizon_months: int, n_paths: int,
+                   seed: np.random.SeedSequence) -> np.ndarray:
+    """Present values of n_paths simulated paths"""
+    rng = np.random.default_rng(seed)
+    dt = 1.0 / 12.0
+    
+    # Correlated revenue/expense shocks, independent rate shocks
+    z_revenue = rng.standard_normal((n_paths, horizon_months))
+    z_expense = rng.standard_normal((n_paths, horizon_months))
+    z_expense *= np.sqrt(1.0 - params.cashflow_correlation ** 2)
+    z_expense += params.cashflow_correlation * z_revenue
+    z_rate = rng.standard_normal((n_paths, horizon_months))
+    
+    # Monthly levels: level * exp(trend[t] + y[t]), y an AR(1) starting at 0
+    # with stationary standard deviation volatility, built in place; the
+    # -variance/2 term keeps the expected level on the trend
+    months = np.arange(1, horizon_months + 1)
+    
+    def level_paths(shocks: np.ndarray, level: float, drift: float, volatility: float,
+                    persistence: float) -> np.ndarray:
+        shocks *= volatility * np.sqrt(1.0 - persistence ** 2)
+        if persistence:
+            for month in range(1, horizon_months):
+                shocks[:, month] += persistence * shocks[:, month - 1]
+        variance = volatility ** 2 * (1.0 - persistence ** (2 * months))
+        shocks += trend(drift, horizon_months) - 0.5 * variance
+        np.exp(shocks, out=shocks)
+        shocks *= level
+        return shocks
+    
+    revenue = level_paths(z_revenue, params.revenue, params.revenue_drift, params.revenue_volatility,
+                          params.revenue_persistence)
+    expense = level_paths(z_expense, params.expense, params.expense_drift, params.expense_volatility,
+                          params.expense_persistence)
+    net = np.subtract(revenue, expense, out=revenue)
+    
+    # Exact Vasicek discretization, stepped month by month
+    decay = np.exp(-params.rate_mean_reversion * dt)
+    if params.rate_mean_reversion > 0:
+        step_volatility = params.rate_volatility * np.sqrt((1 - decay ** 2) / (2 * params.rate_mean_reversion))
+    else:
+        step_volatility = params.rate_volatility * np.sqrt(dt)
+    # Deviations from the long-run mean: x[t] = decay * x[t-1] + shock[t]
+    deviations = z_rate
+    deviations *= step_volatility
+    deviations[:, 0] += (params.rate - params.rate_mean) * decay
+    for month in range(1, horizon_months):
+        deviations[:, month] += decay * deviations[:, month - 1]
+    
+    # Discount at the short rate plus the asset's spread
+    deviations += params.rate_mean + params.spread
+    discount = np.cumsum(deviations, axis=1, out=deviations)
+    discount *= -dt
+    np.exp(discount, out=discount)
+    
+    values = np.einsum("ij,ij->i", net, discount)
+    if params.terminal_multiple:
+        final_year = net[:, -min(12, horizon_months):].sum(axis=1)
+        values += params.terminal_multiple * final_year * discount[:, -1]
+    return values
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_workers = 0
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    global _process_pool, _process_pool_workers
+    if _process_pool is None or _process_pool_workers != workers:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False)
+        _process_pool = ProcessPoolExecutor(max_workers=workers)
+        _process_pool_workers = workers
+    return _process_pool
+
+def shutdown():
+    """Stop the simulation process pool, if one was started"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True)
+        _process_pool = None
+
+def simulate(params: MonteCarloParams, horizon_months: int, n_paths: int, seed: Optional[int] = None,
+             chunk_size: int = 10000, workers: int = 0) -> np.ndarray:
+    """Present values of n_paths paths, simulated in chunks
+    
+    Each chunk draws from its own child of one SeedSequence, so a seeded run
+    returns the same values whether chunks run in-process or in a process
+    pool. Peak memory is a few (chunk_size x horizon_months) float64 arrays.
+    """
+    sizes = [min(chunk_size, n_paths - start) for start in range(0, n_paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    
+    if workers > 1 and len(sizes) > 1:
+        pool = _get_process_pool(workers)
+        futures = [
+            pool.submit(simulate_chunk, params, horizon_months, size, chunk_seed)
+            for size, chunk_seed in zip(sizes, seeds)
+        ]
+        chunks = [future.result() for future in futures]
+    else:
+        chunks = [
+            simulate_chunk(params, horizon_months, size, chunk_seed)
+            for size, chunk_seed in zip(sizes, seeds)
+        ]
+    
+    return np.concatenate(chunks)
+
+def summarize(values: np.ndarray, percentiles: Optional[List[float]] = None) -> Dict[str, Any]:
+    """Distribution summary of simulated present values"""
+    percentiles = percentiles or DEFAULT_PERCENTILES
+    mean = float(values.mean())
+    std = float(values.std(ddof=1)) if len(values) > 1 else 0.0
+    quantiles = np.percentile(values, percentiles)
+    p5 = float(np.percentile(values, 5))
+    tail = values[values <= p5]
+    
+    return {
+        "mean": mean,
+        "std": std,
+        "standard_error": std / np.sqrt(len(values)) if len(values) else 0.0,
+        "percentiles": {f"p{p:g}": float(q) for p, q in zip(percentiles, quantiles)},
+        "value_at_risk_95": mean - p5,
+        "expected_shortfall_95": mean - float(tail.mean()) if len(tail) else 0.0,
+        "probability_of_loss": float((values < 0).mean())
+    }
@@ -0,0 +1,299 @@
+"""
+Prediction persistence for AIMY AI Core Service
+Stores the prediction and valuation history in PostgreSQL behind connection
+pools: an asyncpg pool with a buffered COPY writer for the API and a
+psycopg2 pool for Celery workers
+"""
+
+import io
+import csv
+import json
+import asyncio
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Tuple, Any
+
+logger = logging.getLogger(__name__)
+
+PREDICTIONS_TABLE = "predictions"
+
+# Column order used by both COPY paths
+PREDICTION_COLUMNS = (
+    "asset_id", "model_name", "model_version", "predicted_at", "value", "payload"
+)
+
+# History queries filter by asset and model over a time range, so the
+# composite B-tree serves them directly. Rows arrive roughly in time order,
+# which keeps a BRIN index on predicted_at tiny for time-only scans.
+SCHEMA_SQL = f"""
+CREATE TABLE IF NOT EXISTS {PREDICTIONS_TABLE} (
+    asset_id TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    model_version TEXT,
+    predicted_at TIMESTAMPTZ NOT NULL,
+    value DOUBLE PRECISION,
+    payload JSONB
+);
+CREATE INDEX IF NOT EXISTS {PREDICTIONS_TABLE}_asset_model_time_idx
+    ON {PREDICTIONS_TABLE} (asset_id, model_name, predicted_at);
+CREATE INDEX IF NOT EXISTS {PREDICTIONS_TABLE}_predicted_at_brin
+    ON {PREDICTIONS_TABLE} USING BRIN (predicted_at);
+"""
+
+HISTORY_SQL = f"""
+SELECT predicted_at, model_name, model_version, value, payload
+FROM {PREDICTIONS_TABLE}
+WHERE asset_id = $1 AND model_name = $2 AND predicted_at >= $3 AND predicted_at < $4
+ORDER BY predicted_at
+LIMIT $5
+"""
+
+# Fixed-width time buckets over [start, end); width_bucket numbers them 1..buckets
+HISTORY_BUCKETS_SQL = f"""
+SELECT width_bucket(extract(epoch FROM predicted_at)::float8, $3::float8, $4::float8, $5::int) AS bucket,
+       count(*) AS count,
+       min(value) AS min,
+       max(value) AS max,
+       avg(value) AS mean
+FROM {PREDICTIONS_TABLE}
+WHERE asset_id = $1 AND model_name = $2
+  AND predicted_at >= to_timestamp($3::float8) AND predicted_at < to_timestamp($4::float8)
+  AND value IS NOT NULL
+GROUP BY bucket
+ORDER BY bucket
+"""
+
+def prediction_record(asset_id: str, model_name: str, model_version: Optional[str], value: Optional[float],
+                      payload: Optional[Dict[str, Any]] = None, predicted_at: Optional[datetime] = None) -> Tuple:
+    """Build a row in PREDICTION_COLUMNS order"""
+    if predicted_at is None:
+        predicted_at = datetime.now(timezone.utc)
+    elif predicted_at.tzinfo is None:
+        predicted_at = predicted_at.replace(tzinfo=timezone.utc)
+    
+    return (
+        asset_id,
+        model_name,
+        model_version,
+        predicted_at,
+        None if value is None else float(value),
+        None if payload is None else json.dumps(payload, default=str)
+    )
+
+class PredictionStore:
+    """Async prediction store used by the API
+    
+    record() only appends to an in-memory buffer, so serving a request adds
+    no database round trip. A background task bulk-loads the buffer with
+    COPY every flush_interval seconds, or sooner once flush_rows are queued.
+    """
+    
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10, flush_rows: int = 500,
+                 flush_interval: float = 1.0, max_buffered_rows: int = 100000):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.pool = None
+        self._buffer: deque = deque(maxlen=max_buffered_rows)
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.dropped_rows = 0
+    
+    async def start(self):
+        """Open the pool, create the schema and start the background writer"""
+        import asyncpg
+        
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=self.min_size, max_size=self.max_size)
+        async with self.pool.acquire() as conn:
+            await conn.execute(SCHEMA_SQL)
+        
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        logger.info(f"Prediction store connected (pool {self.min_size}-{self.max_size})")
+    
+    async def close(self):
+        """Stop the background writer, flush what is left and close the pool"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        
+        if self.pool is not None:
+            await self.flush()
+            await self.pool.close()
+            self.pool = None
+    
+    def record(self, asset_id: str, model_name: str, model_version: Optional[str], value: Optional[float],
+               payload: Optional[Dict[str, Any]] = None, predicted_at: Optional[datetime] = None):
+        """Queue a prediction for the next bulk write"""
+        if self.pool is None:
+            return
+        
+        if len(self._buffer) == self._buffer.maxlen:
+            # Oldest rows are dropped rather than blocking the request path
+            self.dropped_rows += 1
+        
+        self._buffer.append(prediction_record(asset_id, model_name, model_version, value, payload, predicted_at))
+        
+        if self._flush_requested is not None and len(self._buffer) >= self.flush_rows:
+            self._flush_requested.set()
+    
+    async def flush(self) -> int:
+        """Write all buffered rows with a single COPY; return the number written"""
+        if self.pool is None or not self._buffer:
+            return 0
+        
+        async with self._flush_lock:
+            rows = []
+            while self._buffer:
+                rows.append(self._buffer.popleft())
+            
+            try:
+                async with self.pool.acquire() as conn:
+                    await conn.copy_records_to_table(
+                        PREDICTIONS_TABLE,
+                        records=rows,
+                        columns=list(PREDICTION_COLUMNS)
+                    )
+            except Exception as e:
+                # Put the batch back in front of newer rows and retry next cycle
+                logger.error(f"Error writing {len(rows)} predictions: {e}")
+                room = self._buffer.maxlen - len(self._buffer)
+                if room > 0:
+                    self._buffer.extendleft(reversed(rows[-room:]))
+                self.dropped_rows += max(0, len(rows) - room)
+                return 0
+            
+            return len(rows)
+    
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error in prediction flush loop: {e}")
+    
+    async def history(self, asset_id: str, model_name: str, start: datetime, end: datetime,
+                      limit: int = 10000) -> List[Dict[str, Any]]:
+        """Return stored predictions of an asset in [start, end)"""
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(HISTORY_SQL, asset_id, model_name, start, end, limit)
+        
+        return [
+            {
+                "predicted_at": row["predicted_at"].isoformat(),
+                "model_name": row["model_name"],
+                "model_version": row["model_version"],
+                "value": row["value"],
+                "payload": json.loads(row["payload"]) if row["payload"] else None
+            }
+            for row in rows
+        ]
+
+    async def history_buckets(self, asset_id: str, model_name: str, start: datetime, end: datetime,
+                              buckets: int) -> List[Dict[str, Any]]:
+        """Aggregate stored prediction values into fixed-width time buckets
+        
+        Only non-empty buckets are returned. Each carries its start time,
+        row count and the min, max and mean value, so the result size is
+        bounded by the number of buckets rather than the number of rows.
+        """
+        start_epoch = start.timestamp()
+        end_epoch = end.timestamp()
+        width = (end_epoch - start_epoch) / buckets
+        
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(HISTORY_BUCKETS_SQL, asset_id, model_name, start_epoch, end_epoch, buckets)
+        
+        return [
+            {
+                "bucket_start": datetime.fromtimestamp(start_epoch + (row["bucket"] - 1) * width, tz=timezone.utc),
+                "count": row["count"],
+                "min": row["min"],
+                "max": row["max"],
+                "mean": row["mean"]
+            }
+            for row in rows
+        ]
+
+class SyncPredictionStore:
+    """Pooled prediction store used by Celery workers
+    
+    The pool is created lazily so that each forked worker process opens its
+    own connections. Batches are written with COPY FROM STDIN.
+    """
+    
+    def __init__(self, dsn: str, min_connections: int = 1, max_connections: int = 4):
+        self.dsn = dsn
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self._pool = None
+        self._lock = threading.Lock()
+    
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    from psycopg2.pool import ThreadedConnectionPool
+                    
+                    pool = ThreadedConnectionPool(self.min_connections, self.max_connections, self.dsn)
+                    conn = pool.getconn()
+                    try:
+                        with conn.cursor() as cursor:
+                            cursor.execute(SCHEMA_SQL)
+                        conn.commit()
+                    finally:
+                        pool.putconn(conn)
+                    self._pool = pool
+        return self._pool
+    
+    def write(self, records: List[Tuple]) -> int:
+        """Bulk-load rows built with prediction_record(); return the number written"""
+        if not records:
+            return 0
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for record in records:
+            writer.writerow(
+                "" if field is None else field.isoformat() if isinstance(field, datetime) else field
+                for field in record
+            )
+        buffer.seek(0)
+        
+        pool = self._get_pool()
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                cursor.copy_expert(
+                    f"COPY {PREDICTIONS_TABLE} ({', '.join(PREDICTION_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                    buffer
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn)
+        
+        return len(records)
+    
+    def close(self):
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
@@ -0,0 +1,315 @@
+"""
+Portfolio optimizer for AIMY AI Core Service
+Long-only mean-variance (accelerated projected gradient) and risk-parity
+(convex log-barrier formulation, constrained risk budgeting under box and
+group constraints) allocation
+"""
+
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+from scipy.optimize import minimize
+
+def shrunk_covariance(returns: np.ndarray) -> np.ndarray:
+    """Ledoit-Wolf covariance of (periods x assets) returns, shrunk toward a scaled identity"""
+    returns = np.asarray(returns, dtype=np.float64)
+    periods, n = returns.shape
+    centered = returns - returns.mean(axis=0)
+    sample = centered.T @ centered / periods
+    
+    mu = np.trace(sample) / n
+    delta = sample.copy()
+    delta[np.diag_indices(n)] -= mu
+    delta_norm = (delta * delta).sum() / n
+    
+    squared = centered * centered
+    beta = ((squared.T @ squared) / periods - sample * sample).sum() / (n * periods)
+    shrinkage = min(beta, delta_norm) / delta_norm if delta_norm > 0 else 1.0
+    
+    covariance = (1.0 - shrinkage) * sample
+    covariance[np.diag_indices(n)] += shrinkage * mu
+    return covariance
+
+def structured_covariance(volatilities: np.ndarray, groups: List[str], within_correlation: float = 0.6,
+                          across_correlation: float = 0.2) -> np.ndarray:
+    """Covariance from per-asset volatilities and a two-level (same group / other group) correlation"""
+    volatilities = np.asarray(volatilities, dtype=np.float64)
+    _, group_index = np.unique(np.asarray(groups), return_inverse=True)
+    same_group = group_index[:, None] == group_index[None, :]
+    correlation = np.where(same_group, within_correlation, across_correlation)
+    np.fill_diagonal(correlation, 1.0)
+    return correlation * np.outer(volatilities, volatilities)
+
+def _solve_decreasing(sum_at, lo: np.ndarray, hi: np.ndarray, target: np.ndarray,
+                      initial: Optional[np.ndarray] = None, iterations: int = 100) -> np.ndarray:
+    """Solve sum_at(theta) = target elementwise on [lo, hi]
+    
+    sum_at returns the (non-increasing, piecewise-linear) sums and their
+    slopes' magnitudes. Newton steps land exactly on the root once inside
+    the right linear piece; bisection of the bracket safeguards them.
+    """
+    theta = 0.5 * (lo + hi)
+    if initial is not None:
+        theta = np.where((initial > lo) & (initial < hi), initial, theta)
+    for _ in range(iterations):
+        sums, free = sum_at(theta)
+        error = sums - target
+        done = np.abs(error) <= 1e-12 * np.maximum(1.0, np.abs(target))
+        if np.all(done):
+            break
+        lo = np.where(error > 0, theta, lo)
+        hi = np.where(error > 0, hi, theta)
+        newton = theta + error / np.maximum(free, 1)
+        inside = (free > 0) & (newton > lo) & (newton < hi)
+        theta = np.where(done, theta, np.where(inside, newton, 0.5 * (lo + hi)))
+    return theta
+
+class ConstraintSet:
+    """Long-only budget, per-asset box and per-group bounds on the weights
+    
+    Groups are disjoint (each asset belongs to one group). The Euclidean
+    projection onto the set has the form x_i = clip(v_i - theta_g(i), l_i, u_i):
+    a common budget multiplier tau, shifted per group only where the group
+    bound is active. tau and the active groups' thetas are found by
+    safeguarded Newton iterations, each costing O(n).
+    """
+    
+    def __init__(self, n: int, lower: Optional[np.ndarray] = None, upper: Optional[np.ndarray] = None,
+                 group_index: Optional[np.ndarray] = None, group_lower: Optional[np.ndarray] = None,
+                 group_upper: Optional[np.ndarray] = None):
+        self.lower = np.zeros(n) if lower is None else np.broadcast_to(np.asarray(lower, dtype=np.float64), (n,)).copy()
+        self.upper = np.ones(n) if upper is None else np.broadcast_to(np.asarray(upper, dtype=np.float64), (n,)).copy()
+        if np.any(self.lower > self.upper) or self.lower.sum() > 1.0 + 1e-9 or self.upper.sum() < 1.0 - 1e-9:
+            raise ValueError("Asset weight bounds are infeasible")
+        
+        if group_index is None:
+            group_index = np.zeros(n, dtype=np.int64)
+            group_lower = np.zeros(1)
+            group_upper = np.ones(1)
+        self.group_index = np.asarray(group_index, dtype=np.int64)
+        groups = int(self.group_index.max()) + 1
+        
+        # Group bounds can never be looser than what the asset bounds allow
+        self.group_lower = np.maximum(np.asarray(group_lower, dtype=np.float64),
+                                      np.bincount(self.group_index, weights=self.lower, minlength=groups))
+        self.group_upper = np.minimum(np.asarray(group_upper, dtype=np.float64),
+                                      np.bincount(self.group_index, weights=self.upper, minlength=groups))
+        self._last_tau = 0.0
+        self._last_theta = np.zeros(groups)
+        if np.any(self.group_lower > self.group_upper + 1e-12) or self.group_lower.sum() > 1.0 + 1e-9 \
+                or self.group_upper.sum() < 1.0 - 1e-9:
+            raise ValueError("Group weight bounds are infeasible")
+    
+    def _group_sums(self, v: np.ndarray, theta: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-group weight sums at the given thetas and the number of unclipped weights"""
+        shifted = v - theta[self.group_index]
+        x = np.clip(shifted, self.lower, self.upper)
+        free = (shifted > self.lower) & (shifted < self.upper)
+        groups = len(self.group_lower)
+        return (
+            np.bincount(self.group_index, weights=x, minlength=groups),
+            np.bincount(self.group_index, weights=free, minlength=groups)
+        )
+    
+    def project(self, v: np.ndarray) -> np.ndarray:
+        """Euclidean projection of v onto the constraint set"""
+        groups = len(self.group_lower)
+        lo = np.min(v - self.upper)
+        hi = np.max(v - self.lower)
+        
+        # Budget: the group sums, clamped to their bounds, total 1
+        def total_at(tau):
+            sums, free = self._group_sums(v, np.full(groups, tau[0]))
+            inside = (sums > self.group_lower) & (sums < self.group_upper)
+            return (
+                np.array([np.clip(sums, self.group_lower, self.group_upper).sum()]),
+                np.array([free[inside].sum()])
+            )
+        
+        # Successive projections inside a solver have nearby multipliers
+        tau = _solve_decreasing(
+            total_at, np.array([lo]), np.array([hi]), np.array([1.0]), initial=np.array([self._last_tau])
+        )[0]
+        self._last_tau = tau
+        
+        # Groups whose sum at tau falls outside their bounds move onto the bound
+        sums, _ = self._group_sums(v, np.full(groups, tau))
+        targets = np.clip(sums, self.group_lower, self.group_upper)
+        active = targets != sums
+        theta = np.full(groups, tau)
+        if np.any(active):
+            solved = _solve_decreasing(
+                lambda t: self._group_sums(v, np.where(active, t, tau)),
+                np.full(groups, lo), np.full(groups, hi), np.where(active, targets, sums),
+                initial=self._last_theta
+            )
+            theta = np.where(active, solved, tau)
+        self._last_theta = theta
+        
+        return np.clip(v - theta[self.group_index], self.lower, self.upper)
+
+def _largest_eigenvalue(matrix: np.ndarray, iterations: int = 50) -> float:
+    vector = np.ones(matrix.shape[0]) / np.sqrt(matrix.shape[0])
+    value = 0.0
+    for _ in range(iterations):
+        product = matrix @ vector
+        norm = np.linalg.norm(product)
+        if norm == 0:
+            return 0.0
+        vector = product / norm
+        if abs(norm - value) <= 1e-9 * norm:
+            break
+        value = norm
+    return float(norm)
+
+def mean_variance(expected_returns: np.ndarray, covariance: np.ndarray, risk_aversion: float,
+                  constraints: ConstraintSet, initial_weights: Optional[np.ndarray] = None,
+                  max_iterations: int = 2000, tol: float = 1e-7) -> Tuple[np.ndarray, int]:
+    """Maximize mu'w - (risk_aversion / 2) w'Sw over the constraint set
+    
+    Solved with FISTA (accelerated projected gradient, with adaptive
+    restart) using a 1/L step, warm-started from initial_weights. Returns the weights and iterations used.
+    """
+    mu = np.asarray(expected_returns, dtype=np.float64)
+    lipschitz = risk_aversion * _largest_eigenvalue(covariance) * 1.01 + 1e-12
+    step = 1.0 / lipschitz
+    
+    n = len(mu)
+    start = np.full(n, 1.0 / n) if initial_weights is None else np.asarray(initial_weights, dtype=np.float64)
+    x = constraints.project(start)
+    z = x.copy()
+    t = 1.0
+    iteration = 0
+    for iteration in range(1, max_iterations + 1):
+        gradient = risk_aversion * (covariance @ z) - mu
+        x_next = constraints.project(z - step * gradient)
+        converged = np.max(np.abs(x_next - x)) < tol
+        
+        # Restart the momentum when it stops pointing downhill
+        if (z - x_next) @ (x_next - x) > 0:
+            t = 1.0
+        t_next = 0.5 * (1.0 + np.sqrt(1.0 + 4.0 * t * t))
+        z = x_next + ((t - 1.0) / t_next) * (x_next - x)
+        x, t = x_next, t_next
+        if converged:
+            break
+    
+    return x, iteration
+
+def _risk_budgeting_objective(covariance: np.ndarray, budgets: np.ndarray, scale: float):
+    """0.5 w'Sw - scale * b'log(w) and its gradient; assets without a budget
+    carry no log term, so they may sit at zero"""
+    held = budgets > 0
+    
+    def objective(w: np.ndarray) -> Tuple[float, np.ndarray]:
+        sw = covariance @ w
+        gradient = sw.copy()
+        gradient[held] -= scale * budgets[held] / w[held]
+        return 0.5 * w @ sw - scale * budgets[held] @ np.log(w[held]), gradient
+    
+    return objective
+
+def _constrained_risk_budgeting(covariance: np.ndarray, budgets: np.ndarray, scale: float,
+                                constraints: ConstraintSet, start: np.ndarray, max_iterations: int = 5000,
+                                tol: float = 1e-10) -> Tuple[np.ndarray, int]:
+    """Minimize 0.5 w'Sw - scale * b'log(w) over the constraint set
+    
+    Projected gradient with backtracking: a step is accepted once the
+    projected point keeps every budgeted weight positive and satisfies the
+    sufficient-decrease condition, and the step grows again after success.
+    """
+    held = budgets > 0
+    objective = _risk_budgeting_objective(covariance, budgets, scale)
+    
+    # A strictly positive feasible start: the projected warm start, pulled
+    # toward the projection of an even split where it touches zero
+    x = constraints.project(start)
+    if np.any(x[held] <= 0):
+        even = constraints.project(np.where(held, 1.0 / max(held.sum(), 1), 0.0))
+        if np.any(even[held] <= 0):
+            raise ValueError("Constraints force a budgeted asset to zero weight; risk parity is undefined")
+        x = 0.5 * (x + even)
+    
+    value, gradient = objective(x)
+    step = 1.0 / (_largest_eigenvalue(covariance) + scale * np.max(budgets[held] / x[held] ** 2))
+    iteration = 0
+    for iteration in range(1, max_iterations + 1):
+        while True:
+            candidate = constraints.project(x - step * gradient)
+            if np.all(candidate[held] > 0):
+                difference = candidate - x
+                candidate_value, candidate_gradient = objective(candidate)
+                if candidate_value <= value + gradient @ difference + (difference @ difference) / (2 * step):
+                    break
+            step *= 0.5
+            if step < 1e-20:
+                return x, iteration
+        
+        converged = np.max(np.abs(candidate - x)) < tol
+        x, value, gradient = candidate, candidate_value, candidate_gradient
+        if converged:
+            break
+        step *= 2.0
+    
+    return x, iteration
+
+def risk_parity(covariance: np.ndarray, risk_budgets: Optional[np.ndarray] = None,
+                initial_weights: Optional[np.ndarray] = None, constraints: Optional[ConstraintSet] = None) -> Tuple[np.ndarray, int]:
+    """Weights whose risk contributions match the budgets (equal by default)
+    
+    Minimizes the strictly convex 0.5 y'Sy - b'log(y) with L-BFGS-B and
+    normalizes y to the budget. With box or group constraints the solution
+    is the constrained risk-budgeting portfolio: the minimum of
+    0.5 w'Sw - c b'log(w) over the constraint set, where c is the variance
+    of the unconstrained solution, so that it is the exact risk-parity
+    portfolio whenever no constraint binds.
+    """
+    n = covariance.shape[0]
+    budgets = np.full(n, 1.0 / n) if risk_budgets is None else np.asarray(risk_budgets, dtype=np.float64) / np.sum(risk_budgets)
+    
+    if initial_weights is None:
+        y0 = 1.0 / np.sqrt(np.diag(covariance))
+    else:
+        y0 = np.maximum(np.asarray(initial_weights, dtype=np.float64), 1e-6)
+    # Scale the warm start onto the optimal ray (y'Sy = sum(b) = 1 at the optimum)
+    y0 = y0 / np.sqrt(y0 @ covariance @ y0)
+    
+    def objective(y):
+        sy = covariance @ y
+        return 0.5 * y @ sy - budgets @ np.log(y), sy - budgets / y
+    
+    result = minimize(objective, y0, jac=True, method="L-BFGS-B", bounds=[(1e-12, None)] * n,
+                      options={"maxiter": 1000, "ftol": 1e-15, "gtol": 1e-10})
+    weights = result.x / result.x.sum()
+    iterations = int(result.nit)
+    if constraints is None or np.max(np.abs(constraints.project(weights) - weights)) <= 1e-12:
+        return weights, iterations
+    
+    # Budgets of assets the constraints cannot hold are dropped
+    can_hold = (constraints.upper > 0) & (constraints.group_upper[constraints.group_index] > 0)
+    budgets = np.where(can_hold, budgets, 0.0)
+    if budgets.sum() <= 0:
+        raise ValueError("Constraints leave no asset that can hold weight")
+    budgets = budgets / budgets.sum()
+    
+    # The unconstrained solution is the natural warm start
+    weights, constrained_iterations = _constrained_risk_budgeting(
+        covariance, budgets, float(weights @ covariance @ weights), constraints, weights
+    )
+    return weights, iterations + constrained_iterations
+
+def risk_contributions(weights: np.ndarray, covariance: np.ndarray) -> np.ndarray:
+    """Fraction of portfolio variance contributed by each asset"""
+    marginal = covariance @ weights
+    variance = weights @ marginal
+    return weights * marginal / variance if variance > 0 else np.zeros_like(weights)
+
+def portfolio_statistics(weights: np.ndarray, expected_returns: np.ndarray, covariance: np.ndarray) -> Dict[str, float]:
+    volatility = float(np.sqrt(max(weights @ covariance @ weights, 0.0)))
+    expected_return = float(weights @ expected_returns)
+    hhi = float(weights @ weights)
+    return {
+        "expected_return": expected_return,
+        "volatility": volatility,
+        "sharpe": expected_return / volatility if volatility > 0 else 0.0,
+        "effective_holdings": 1.0 / hhi if hhi > 0 else 0.0
+    }
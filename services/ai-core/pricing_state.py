@@ -0,0 +1,205 @@
+"""
+Incremental pricing features for AIMY AI Core Service
+Per-asset running state (monthly revenue/expense sums with their Welford
+mean and variance, market and utilization sums and record counts) kept in
+Redis, so new cashflow, market and utilization records update the pricing
+features in O(records) instead of re-aggregating the full history
+"""
+
+import math
+from collections import defaultdict
+from typing import List, Dict, Optional, Tuple, Any
+import numpy as np
+import pandas as pd
+
+PRICING_STATE_KEY = "pricing:state:{asset_id}"
+# Idempotency keys of the deltas already applied to an asset's state
+APPLIED_DELTAS_KEY = "pricing:state:{asset_id}:deltas"
+
+# Monthly sums live in the state hash as <series>:<YYYY-MM>
+MONTHLY_SERIES = {"revenue": "rev", "expense": "exp"}
+
+# Hash fields the features are computed from (monthly sums are not needed)
+STATE_FIELDS = (
+    "rev_n", "rev_mean", "rev_m2", "exp_n", "exp_mean", "exp_m2",
+    "cashflow_count", "market_count", "interest_rate_sum", "inflation_rate_sum",
+    "market_volatility_sum", "utilization_count", "utilization_rate_sum", "efficiency_sum"
+)
+
+# Applies one delta to a state hash atomically and returns STATE_FIELDS.
+# ARGV: reset flag, delta id ('' for none), applied-delta TTL, the number
+# of STATE_FIELDS, the fields, the number of (field, increment) scalar
+# pairs, the pairs, then (<series>:<month>, amount) monthly pairs. A month
+# that already has a sum is taken out of its series' Welford accumulator
+# (n, mean, m2) and put back with the new sum.
+UPDATE_SCRIPT = """
+local key = KEYS[1]
+local applied = KEYS[2]
+if ARGV[1] == '1' then
+    redis.call('DEL', key, applied)
+end
+
+local n_fields = tonumber(ARGV[4])
+local fields = {}
+for i = 1, n_fields do
+    fields[i] = ARGV[4 + i]
+end
+
+if ARGV[2] ~= '' and redis.call('SADD', applied, ARGV[2]) == 0 then
+    return {0, redis.call('HMGET', key, unpack(fields))}
+end
+if ARGV[2] ~= '' then
+    redis.call('EXPIRE', applied, tonumber(ARGV[3]))
+end
+
+local i = 5 + n_fields
+local n_scalars = tonumber(ARGV[i])
+i = i + 1
+for _ = 1, n_scalars do
+    redis.call('HINCRBYFLOAT', key, ARGV[i], ARGV[i + 1])
+    i = i + 2
+end
+
+while i <= #ARGV do
+    local field = ARGV[i]
+    local amount = tonumber(ARGV[i + 1])
+    local series = string.match(field, '^(%a+):')
+    local n = tonumber(redis.call('HGET', key, series .. '_n') or '0')
+    local mean = tonumber(redis.call('HGET', key, series .. '_mean') or '0')
+    local m2 = tonumber(redis.call('HGET', key, series .. '_m2') or '0')
+    
+    local value = amount
+    local previous = redis.call('HGET', key, field)
+    if previous then
+        previous = tonumber(previous)
+        value = previous + amount
+        if n <= 1 then
+            n, mean, m2 = 0, 0, 0
+        else
+            local reduced_mean = (n * mean - previous) / (n - 1)
+            m2 = m2 - (previous - mean) * (previous - reduced_mean)
+            mean = reduced_mean
+            n = n - 1
+        end
+    end
+    
+    n = n + 1
+    local delta = value - mean
+    mean = mean + delta / n
+    m2 = m2 + delta * (value - mean)
+    if m2 < 0 then
+        m2 = 0
+    end
+    
+    redis.call('HSET', key, field, string.format('%.17g', value), series .. '_n', n,
+        series .. '_mean', string.format('%.17g', mean), series .. '_m2', string.format('%.17g', m2))
+    i = i + 2
+end
+
+return {1, redis.call('HMGET', key, unpack(fields))}
+"""
+
+def delta_updates(cashflows: List[Any], market_data: List[Any],
+                  utilization: List[Any]) -> Tuple[List[Tuple[str, float]], List[Tuple[str, float]]]:
+    """Scalar increments and per-month amounts of a batch of new records
+    
+    Records are the CashflowData, MarketData and UtilizationData request
+    models; months are grouped as in extract_pricing_features.
+    """
+    scalars = [
+        ("cashflow_count", len(cashflows)),
+        ("market_count", len(market_data)),
+        ("interest_rate_sum", math.fsum(md.interest_rate for md in market_data)),
+        ("inflation_rate_sum", math.fsum(md.inflation_rate for md in market_data)),
+        ("market_volatility_sum", math.fsum(md.market_volatility for md in market_data)),
+        ("utilization_count", len(utilization)),
+        ("utilization_rate_sum", math.fsum(u.utilization_rate for u in utilization)),
+        ("efficiency_sum", math.fsum(u.efficiency for u in utilization))
+    ]
+    
+    monthly: Dict[str, float] = defaultdict(float)
+    relevant = [cf for cf in cashflows if cf.type in MONTHLY_SERIES]
+    if relevant:
+        months = pd.to_datetime([cf.date for cf in relevant]).to_period("M").astype(str)
+        for cf, month in zip(relevant, months):
+            monthly[f"{MONTHLY_SERIES[cf.type]}:{month}"] += cf.amount
+    
+    return [(field, value) for field, value in scalars if value], sorted(monthly.items())
+
+def features_from_state(state: Dict[str, float]) -> np.ndarray:
+    """Pricing feature row (PRICING_FEATURE_NAMES order) of a running state
+    
+    Means of empty series are 0, and standard deviations use ddof=1 and are
+    0 below two months, matching extract_pricing_features.
+    """
+    def mean(total: str, count: str) -> float:
+        return state[total] / state[count] if state[count] > 0 else 0.0
+    
+    def std(series: str) -> float:
+        n = state[f"{series}_n"]
+        return math.sqrt(state[f"{series}_m2"] / (n - 1)) if n > 1 else 0.0
+    
+    return np.array([
+        state["rev_mean"] if state["rev_n"] > 0 else 0.0,
+        std("rev"),
+        state["exp_mean"] if state["exp_n"] > 0 else 0.0,
+        std("exp"),
+        mean("interest_rate_sum", "market_count"),
+        mean("inflation_rate_sum", "market_count"),
+        mean("market_volatility_sum", "market_count"),
+        mean("utilization_rate_sum", "utilization_count"),
+        mean("efficiency_sum", "utilization_count"),
+        state["cashflow_count"],
+        state["market_count"],
+        state["utilization_count"]
+    ], dtype=np.float64).reshape(1, -1)
+
+class PricingStateStore:
+    """Per-asset incremental pricing state in Redis
+    
+    The state has no TTL: it is the only record of the history it was
+    built from, so Redis needs persistence (RDB/AOF) for it to survive
+    restarts. A state can be rebuilt by applying the full history with
+    reset=True.
+    """
+    
+    def __init__(self, redis_client, applied_delta_ttl: int = 7 * 86400):
+        self.redis_client = redis_client
+        self.applied_delta_ttl = applied_delta_ttl
+        self._update = redis_client.register_script(UPDATE_SCRIPT)
+    
+    @staticmethod
+    def key(asset_id: str) -> str:
+        return PRICING_STATE_KEY.format(asset_id=asset_id)
+    
+    def apply(self, asset_id: str, cashflows: List[Any], market_data: List[Any], utilization: List[Any],
+              reset: bool = False, delta_id: Optional[str] = None) -> Tuple[Dict[str, float], bool]:
+        """Fold new records into an asset's state
+        
+        Returns the updated state and whether the delta was applied; a
+        delta_id seen within applied_delta_ttl is not applied twice.
+        """
+        scalars, monthly = delta_updates(cashflows, market_data, utilization)
+        args: List[Any] = ["1" if reset else "0", delta_id or "", self.applied_delta_ttl, len(STATE_FIELDS)]
+        args.extend(STATE_FIELDS)
+        args.append(len(scalars))
+        for pairs in (scalars, monthly):
+            for field, value in pairs:
+                args.extend((field, repr(float(value))))
+        
+        applied, values = self._update(
+            keys=[self.key(asset_id), APPLIED_DELTAS_KEY.format(asset_id=asset_id)],
+            args=args
+        )
+        return self._decode(values), bool(applied)
+    
+    def state(self, asset_id: str) -> Optional[Dict[str, float]]:
+        """Current state of an asset, or None if it has none"""
+        values = self.redis_client.hmget(self.key(asset_id), STATE_FIELDS)
+        if all(value is None for value in values):
+            return None
+        return self._decode(values)
+    
+    @staticmethod
+    def _decode(values: List[Optional[bytes]]) -> Dict[str, float]:
+        return {field: float(value) if value is not None else 0.0 for field, value in zip(STATE_FIELDS, values)}
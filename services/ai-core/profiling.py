@@ -0,0 +1,211 @@
+"""
+Request profiling for AIMY AI Core Service
+Wraps selected requests in pyinstrument's sampling profiler and stores the
+result as a speedscope flame graph in object storage, tagged with the route,
+model version and payload size
+"""
+
+import io
+import re
+import hmac
+import json
+import uuid
+import random
+import logging
+import threading
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Any
+from pyinstrument import Profiler
+from pyinstrument.renderers import SpeedscopeRenderer
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-AIMY-Profile"
+PROFILE_ID_HEADER = "X-AIMY-Profile-Id"
+PROFILE_PREFIX = "profiles/"
+PROFILE_INDEX_KEY = "profiles:recent"
+PROFILE_ID_PATTERN = re.compile(r"^(\d{8})T\d{6}-[0-9a-f]{12}$")
+
+# Model versions pinned while serving a profiled request (None otherwise);
+# the profile is tagged with these rather than whatever is current when the
+# request finishes, which a model refresh may have changed
+pinned_versions: ContextVar[Optional[Dict[str, str]]] = ContextVar("pinned_versions", default=None)
+
+def record_pinned_version(model_name: str, version: str):
+    """Note the version of a model the current request pinned (first pin wins)"""
+    versions = pinned_versions.get()
+    if versions is not None:
+        versions.setdefault(model_name, version)
+
+class RequestProfiler:
+    """Opt-in per-request sampling profiler
+    
+    A request is profiled when it carries the PROFILE_HEADER (matching
+    header_token when one is configured) or, for the configured routes, with
+    probability sample_rate. At most max_concurrent requests are profiled at
+    once. Rendering and upload happen on a background thread after the
+    response is sent; a small index of recent profiles is kept in Redis.
+    
+    pyinstrument follows the request's task across awaits; work handed to a
+    thread or process pool shows up as time spent awaiting it.
+    """
+    
+    def __init__(self, minio_client, bucket: str, redis_client=None, sample_rate: float = 0.0,
+                 routes: Optional[List[str]] = None, header_enabled: bool = True,
+                 header_token: Optional[str] = None, interval: float = 0.001,
+                 max_concurrent: int = 2, index_size: int = 500):
+        self.minio_client = minio_client
+        self.bucket = bucket
+        self.redis_client = redis_client
+        self.sample_rate = sample_rate
+        self.routes = set(routes or [])
+        self.header_enabled = header_enabled
+        self.header_token = header_token or None
+        self.interval = interval
+        self.max_concurrent = max_concurrent
+        self.index_size = index_size
+        
+        self._active = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-upload")
+    
+    @property
+    def enabled(self) -> bool:
+        return self.header_enabled or self.sample_rate > 0
+    
+    def wants(self, request) -> bool:
+        """Whether to profile this request; call only when enabled"""
+        if self.header_enabled:
+            value = request.headers.get(PROFILE_HEADER)
+            if value is not None:
+                if self.header_token is not None:
+                    return hmac.compare_digest(value.encode(), self.header_token.encode())
+                return value.lower() in ("1", "true", "yes")
+        
+        return self.sample_rate > 0 and request.url.path in self.routes and random.random() < self.sample_rate
+    
+    def start(self) -> Optional[Profiler]:
+        """Start a profiler, or return None when max_concurrent are running"""
+        with self._lock:
+            if self._active >= self.max_concurrent:
+                return None
+            self._active += 1
+        
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        try:
+            profiler.start()
+        except Exception as e:
+            with self._lock:
+                self._active -= 1
+            logger.warning(f"Could not start request profiler: {e}")
+            return None
+        return profiler
+    
+    def finish(self, profiler: Profiler, tags: Dict[str, Any]) -> str:
+        """Stop the profiler and queue the upload; return the profile id"""
+        try:
+            session = profiler.stop()
+        finally:
+            with self._lock:
+                self._active -= 1
+        
+        now = datetime.now(timezone.utc)
+        profile_id = f"{now.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:12]}"
+        tags = {
+            **tags,
+            "profile_id": profile_id,
+            "recorded_at": now.isoformat(),
+            "duration_ms": round(session.duration * 1000, 3),
+            "samples": session.sample_count
+        }
+        self._executor.submit(self._store, session, tags)
+        return profile_id
+    
+    @staticmethod
+    def key(profile_id: str) -> Optional[str]:
+        """Object key of a profile id, or None when the id is malformed"""
+        match = PROFILE_ID_PATTERN.match(profile_id)
+        if match is None:
+            return None
+        day = datetime.strptime(match.group(1), "%Y%m%d").strftime("%Y-%m-%d")
+        return f"{PROFILE_PREFIX}{day}/{profile_id}.speedscope.json"
+    
+    def _store(self, session, tags: Dict[str, Any]):
+        try:
+            session.target_description = (
+                f"{tags.get('method')} {tags.get('route')} "
+                f"model={tags.get('model_version')} payload={tags.get('payload_bytes')}B "
+                f"status={tags.get('status_code')}"
+            )
+            payload = SpeedscopeRenderer().render(session).encode()
+            key = self.key(tags["profile_id"])
+            self.minio_client.put_object(
+                self.bucket,
+                key,
+                io.BytesIO(payload),
+                length=len(payload),
+                content_type="application/json",
+                metadata={name: str(value) for name, value in tags.items() if value is not None}
+            )
+            
+            entry = {**tags, "key": key, "size": len(payload)}
+            if self.redis_client is not None:
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.lpush(PROFILE_INDEX_KEY, json.dumps(entry))
+                pipe.ltrim(PROFILE_INDEX_KEY, 0, self.index_size - 1)
+                pipe.execute()
+            logger.info(f"Stored profile {tags['profile_id']} of {tags.get('route')} ({tags['duration_ms']} ms)")
+        except Exception as e:
+            logger.error(f"Failed to store profile {tags.get('profile_id')}: {e}")
+    
+    def recent(self, entries: List[bytes], limit: int, route: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Decode index entries, newest first, optionally for one route"""
+        profiles = []
+        for raw in entries:
+            entry = json.loads(raw)
+            if route is None or entry.get("route") == route:
+                profiles.append(entry)
+                if len(profiles) >= limit:
+                    break
+        return profiles
+    
+    def list_stored(self, limit: int) -> List[Dict[str, Any]]:
+        """Newest stored profiles from an object listing, without tags
+        
+        Used when the Redis index is unavailable.
+        """
+        objects = self.minio_client.list_objects(self.bucket, prefix=PROFILE_PREFIX, recursive=True)
+        keys = sorted((obj.object_name for obj in objects), reverse=True)
+        profiles = []
+        for key in keys[:limit]:
+            profile_id = key.rsplit("/", 1)[-1].split(".", 1)[0]
+            profiles.append({"profile_id": profile_id, "key": key})
+        return profiles
+    
+    def fetch(self, profile_id: str) -> Optional[bytes]:
+        """Speedscope JSON of a stored profile, or None when it doesn't exist"""
+        key = self.key(profile_id)
+        if key is None:
+            return None
+        try:
+            response = self.minio_client.get_object(self.bucket, key)
+        except Exception as e:
+            logger.info(f"Profile {profile_id} not found: {e}")
+            return None
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+    
+    def shutdown(self):
+        """Wait for queued uploads
+        
+        A fresh executor (whose thread starts on first use) takes over, so
+        an app restarted in the same process can still store profiles.
+        """
+        executor = self._executor
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-upload")
+        executor.shutdown(wait=True)
@@ -0,0 +1,153 @@
+"""
+Retention cleanup for AIMY AI Core Service
+Lists MinIO prefixes in parallel, selects objects past their retention by
+age or by number of kept versions and removes them with batched
+multi-object deletes
+"""
+
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Optional, Tuple
+from minio.deleteobjects import DeleteObject
+
+logger = logging.getLogger(__name__)
+
+# S3 accepts at most 1000 keys per multi-object delete
+DELETE_BATCH_SIZE = 1000
+
+class RetentionRule:
+    """Retention policy for one prefix
+    
+    An object expires when it is older than max_age_days and, if
+    keep_latest is set, is not among the keep_latest newest objects of its
+    group. Groups are formed by the first group_depth path segments of the
+    key (default: the object's parent "directory"). Without max_age_days
+    everything beyond keep_latest expires.
+    """
+    
+    def __init__(self, prefix: str, max_age_days: Optional[int] = None, keep_latest: Optional[int] = None,
+                 group_depth: Optional[int] = None):
+        if max_age_days is None and keep_latest is None:
+            raise ValueError(f"Retention rule for {prefix} needs max_age_days or keep_latest")
+        self.prefix = prefix
+        self.max_age_days = max_age_days
+        self.keep_latest = keep_latest
+        self.group_depth = group_depth
+    
+    def group(self, object_name: str) -> str:
+        if self.group_depth is None:
+            return object_name.rsplit("/", 1)[0]
+        return "/".join(object_name.split("/")[:self.group_depth])
+
+# Listed object: (name, last_modified, size)
+ObjectInfo = Tuple[str, datetime, int]
+
+def list_prefix(client, bucket: str, prefix: str, workers: int = 8, expand_depth: int = 2) -> List[ObjectInfo]:
+    """List every object under a prefix
+    
+    A single listing is a sequential chain of 1000-key pages, so the
+    "directories" under the prefix are discovered first (up to expand_depth
+    levels, until there are enough to keep the workers busy) and then paged
+    through concurrently.
+    """
+    objects: List[ObjectInfo] = []
+    sub_prefixes = [prefix]
+    for _ in range(expand_depth):
+        if len(sub_prefixes) >= workers:
+            break
+        next_level = []
+        for sub_prefix in sub_prefixes:
+            for obj in client.list_objects(bucket, prefix=sub_prefix, recursive=False):
+                if obj.is_dir:
+                    next_level.append(obj.object_name)
+                else:
+                    objects.append((obj.object_name, obj.last_modified, obj.size))
+        sub_prefixes = next_level
+    
+    def list_recursive(sub_prefix: str) -> List[ObjectInfo]:
+        return [
+            (obj.object_name, obj.last_modified, obj.size)
+            for obj in client.list_objects(bucket, prefix=sub_prefix, recursive=True)
+        ]
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for listed in executor.map(list_recursive, sub_prefixes):
+            objects.extend(listed)
+    
+    return objects
+
+def select_expired(objects: List[ObjectInfo], rule: RetentionRule, now: Optional[datetime] = None) -> List[ObjectInfo]:
+    """Return the objects a rule expires"""
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=rule.max_age_days) if rule.max_age_days is not None else None
+    
+    if rule.keep_latest is None:
+        return [obj for obj in objects if obj[1] < cutoff]
+    
+    groups: Dict[str, List[ObjectInfo]] = defaultdict(list)
+    for obj in objects:
+        groups[rule.group(obj[0])].append(obj)
+    
+    expired = []
+    for group_objects in groups.values():
+        group_objects.sort(key=lambda obj: obj[1], reverse=True)
+        for obj in group_objects[rule.keep_latest:]:
+            if cutoff is None or obj[1] < cutoff:
+                expired.append(obj)
+    
+    return expired
+
+def delete_objects(client, bucket: str, object_names: List[str], workers: int = 4) -> List[str]:
+    """Delete objects in batches of DELETE_BATCH_SIZE; return the names that failed"""
+    batches = [
+        object_names[i:i + DELETE_BATCH_SIZE]
+        for i in range(0, len(object_names), DELETE_BATCH_SIZE)
+    ]
+    
+    def delete_batch(batch: List[str]) -> List[str]:
+        # remove_objects is lazy; iterating the errors sends the request
+        errors = client.remove_objects(bucket, [DeleteObject(name) for name in batch])
+        return [error.name for error in errors]
+    
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch_failed in executor.map(delete_batch, batches):
+            failed.extend(batch_failed)
+    
+    return failed
+
+def apply_retention(client, bucket: str, rules: List[RetentionRule], dry_run: bool = False,
+                    list_workers: int = 8, delete_workers: int = 4, now: Optional[datetime] = None) -> List[Dict]:
+    """Apply retention rules and report what was (or, in dry-run, would be) removed"""
+    reports = []
+    for rule in rules:
+        objects = list_prefix(client, bucket, rule.prefix, workers=list_workers)
+        expired = select_expired(objects, rule, now=now)
+        
+        failed = []
+        if expired and not dry_run:
+            failed = delete_objects(client, bucket, [obj[0] for obj in expired], workers=delete_workers)
+        
+        failed_names = set(failed)
+        deleted = [obj for obj in expired if obj[0] not in failed_names]
+        report = {
+            "prefix": rule.prefix,
+            "dry_run": dry_run,
+            "objects_scanned": len(objects),
+            "objects_expired": len(expired),
+            "objects_deleted": 0 if dry_run else len(deleted),
+            "objects_failed": len(failed),
+            "bytes_reclaimed": sum(obj[2] for obj in deleted)
+        }
+        reports.append(report)
+        
+        logger.info(
+            f"Retention {rule.prefix}: {report['objects_expired']}/{report['objects_scanned']} expired, "
+            f"{report['bytes_reclaimed']} bytes {'reclaimable' if dry_run else 'reclaimed'}"
+        )
+        if failed:
+            logger.warning(f"Retention {rule.prefix}: {len(failed)} objects could not be deleted")
+    
+    return reports
@@ -0,0 +1,380 @@
+"""
+Time-series rollups for AIMY AI Core Service
+Hourly, daily and monthly aggregates (count, sum, sum of squares, min, max,
+trend sums and a DDSketch quantile sketch) per asset and sensor, kept in
+Redis and updated incrementally as readings are ingested
+"""
+
+import math
+import time
+import logging
+from typing import List, Dict, Optional, Tuple, Any
+import numpy as np
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = ("hour", "day", "month")
+
+# numpy datetime64 unit of each resolution
+RESOLUTION_UNITS = {"hour": "h", "day": "D", "month": "M"}
+
+ROLLUP_KEY = "rollup:{resolution}:{asset_id}:{sensor_type}:{period}"
+
+# Scalar fields of a rollup hash; sketch bins are stored alongside as
+# p<index> (positive), n<index> (negative) and z (zero) counters.
+# t is hours since the start of the period, for the trend regression.
+SCALAR_FIELDS = ("count", "sum", "sumsq", "min", "max", "sum_t", "sum_tt", "sum_tv")
+
+# Adds one aggregate to a rollup hash atomically
+UPDATE_SCRIPT = """
+local key = KEYS[1]
+redis.call('HINCRBY', key, 'count', ARGV[2])
+redis.call('HINCRBYFLOAT', key, 'sum', ARGV[3])
+redis.call('HINCRBYFLOAT', key, 'sumsq', ARGV[4])
+local current = redis.call('HGET', key, 'min')
+if not current or tonumber(ARGV[5]) < tonumber(current) then
+    redis.call('HSET', key, 'min', ARGV[5])
+end
+current = redis.call('HGET', key, 'max')
+if not current or tonumber(ARGV[6]) > tonumber(current) then
+    redis.call('HSET', key, 'max', ARGV[6])
+end
+redis.call('HINCRBYFLOAT', key, 'sum_t', ARGV[7])
+redis.call('HINCRBYFLOAT', key, 'sum_tt', ARGV[8])
+redis.call('HINCRBYFLOAT', key, 'sum_tv', ARGV[9])
+for i = 10, #ARGV, 2 do
+    redis.call('HINCRBY', key, ARGV[i], ARGV[i + 1])
+end
+local ttl = tonumber(ARGV[1])
+if ttl > 0 then
+    redis.call('EXPIRE', key, ttl)
+end
+return 1
+"""
+
+class DDSketch:
+    """Mergeable quantile sketch with relative accuracy alpha
+    
+    Values fall into logarithmic bins gamma^(i-1) < |v| <= gamma^i with
+    gamma = (1 + alpha) / (1 - alpha); any quantile is then returned within
+    a relative error alpha. Sketches merge by adding bin counts.
+    """
+    
+    def __init__(self, alpha: float = 0.01, min_value: float = 1e-9):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+    
+    def bins(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Sign (-1, 0, 1) and logarithmic bin index of every value"""
+        magnitude = np.abs(values)
+        index = np.ceil(np.log(np.maximum(magnitude, self.min_value)) / self.log_gamma).astype(np.int64)
+        sign = np.where(magnitude < self.min_value, 0, np.sign(values)).astype(np.int64)
+        return sign, np.where(sign == 0, 0, index)
+    
+    @staticmethod
+    def field(sign: int, index: int) -> str:
+        if sign == 0:
+            return "z"
+        return f"{'p' if sign > 0 else 'n'}{index}"
+    
+    def quantiles(self, bins: Dict[str, int], qs: List[float]) -> List[Optional[float]]:
+        """Quantiles from merged bin counts"""
+        entries = []
+        for field, count in bins.items():
+            if field == "z":
+                entries.append((0.0, count))
+                continue
+            value = 2 * self.gamma ** int(field[1:]) / (self.gamma + 1)
+            entries.append((value if field[0] == "p" else -value, count))
+        if not entries:
+            return [None] * len(qs)
+        
+        entries.sort()
+        values = np.array([value for value, _ in entries])
+        cumulative = np.cumsum([count for _, count in entries])
+        ranks = np.asarray(qs, dtype=np.float64) * (cumulative[-1] - 1)
+        return values[np.searchsorted(cumulative, ranks, side="right")].tolist()
+
+def _period_start(period: np.ndarray, resolution: str) -> np.ndarray:
+    return period.astype(f"datetime64[{RESOLUTION_UNITS[resolution]}]")
+
+def _retained(resolution: str, period: np.datetime64, retained_since: Dict[str, np.datetime64]) -> bool:
+    horizon = retained_since.get(resolution)
+    return horizon is None or _period_start(period, resolution).astype("datetime64[h]") >= horizon
+
+def _widen(pieces: List[Tuple[str, np.datetime64]],
+           retained_since: Dict[str, np.datetime64]) -> List[Tuple[str, np.datetime64]]:
+    """Replace periods past their resolution's retention by the enclosing
+    period of the next coarser resolution still retained"""
+    widened = []
+    for resolution, period in pieces:
+        level = RESOLUTIONS.index(resolution)
+        while level < len(RESOLUTIONS) - 1 and not _retained(RESOLUTIONS[level], period, retained_since):
+            level += 1
+            period = _period_start(period, RESOLUTIONS[level])
+        widened.append((RESOLUTIONS[level], period))
+    
+    # Drop repeats and periods inside a coarser one that replaced them
+    months = {period for resolution, period in widened if resolution == "month"}
+    days = {period for resolution, period in widened if resolution == "day"}
+    kept, seen = [], set()
+    for resolution, period in widened:
+        if (resolution, period) in seen:
+            continue
+        if resolution != "month" and _period_start(period, "month") in months:
+            continue
+        if resolution == "hour" and _period_start(period, "day") in days:
+            continue
+        seen.add((resolution, period))
+        kept.append((resolution, period))
+    return kept
+
+def cover(start: np.datetime64, end: np.datetime64,
+          retained_since: Optional[Dict[str, np.datetime64]] = None) -> List[Tuple[str, np.datetime64]]:
+    """Coarsest (resolution, period) set exactly covering [start, end) at hour granularity
+    
+    Whole months are read as monthly rollups and whole days as daily ones,
+    so a multi-year range costs a few dozen reads instead of thousands.
+    With retained_since (the oldest period start each resolution still
+    holds), hours and days past retention are widened to their enclosing
+    day or month, so the cover may extend beyond [start, end).
+    """
+    pieces = _exact_cover(start, end)
+    return _widen(pieces, retained_since) if retained_since else pieces
+
+def _exact_cover(start: np.datetime64, end: np.datetime64) -> List[Tuple[str, np.datetime64]]:
+    start = start.astype("datetime64[h]")
+    end_hour = end.astype("datetime64[h]")
+    end = end_hour + np.timedelta64(1, "h") if end_hour < end else end_hour
+    
+    def hours(lo, hi):
+        return [("hour", h) for h in np.arange(lo, hi, dtype="datetime64[h]")]
+    
+    def days(lo, hi):
+        first = (lo + np.timedelta64(23, "h")).astype("datetime64[D]")
+        last = hi.astype("datetime64[D]")
+        if first >= last:
+            return hours(lo, hi)
+        return (
+            hours(lo, first.astype("datetime64[h]"))
+            + [("day", d) for d in np.arange(first, last, dtype="datetime64[D]")]
+            + hours(last.astype("datetime64[h]"), hi)
+        )
+    
+    if start >= end:
+        return []
+    first_month = start.astype("datetime64[M]")
+    if first_month.astype("datetime64[h]") < start:
+        first_month += np.timedelta64(1, "M")
+    last_month = end.astype("datetime64[M]")
+    if first_month >= last_month:
+        return days(start, end)
+    return (
+        days(start, first_month.astype("datetime64[h]"))
+        + [("month", m) for m in np.arange(first_month, last_month, dtype="datetime64[M]")]
+        + days(last_month.astype("datetime64[h]"), end)
+    )
+
+def _iso_hour(period: np.datetime64) -> str:
+    return np.datetime_as_string(period.astype("datetime64[h]"), unit="s") + "Z"
+
+class RollupStore:
+    """Multi-resolution rollups of sensor readings in Redis
+    
+    update() folds a batch of readings into the hour, day and month rollups
+    of every (asset, sensor) it touches: the batch is aggregated with numpy
+    and each touched rollup receives one atomic increment. Reads go through
+    keys() / summarize() so the API can fetch the hashes with its own
+    (async) client.
+    """
+    
+    def __init__(self, redis_client, ttl_days: Optional[Dict[str, Optional[int]]] = None, alpha: float = 0.01,
+                 batch_size: int = 1000):
+        self.redis = redis_client
+        self.ttl_days = {"hour": 90, "day": 1095, "month": None}
+        self.ttl_days.update(ttl_days or {})
+        self.sketch = DDSketch(alpha)
+        self.batch_size = batch_size
+        self._update = redis_client.register_script(UPDATE_SCRIPT)
+    
+    def key(self, resolution: str, asset_id: str, sensor_type: str, period) -> str:
+        return ROLLUP_KEY.format(
+            resolution=resolution, asset_id=asset_id, sensor_type=sensor_type,
+            period=np.datetime_as_string(_period_start(np.datetime64(period), resolution))
+        )
+    
+    def aggregate(self, table: pa.Table) -> List[Tuple[str, str, List]]:
+        """Per-rollup increments for a batch: (resolution, key, script args)"""
+        if table.num_rows == 0:
+            return []
+        
+        asset_ids = table.column("asset_id").combine_chunks().dictionary_encode()
+        sensor_types = table.column("sensor_type").combine_chunks().dictionary_encode()
+        asset_names = asset_ids.dictionary.to_pylist()
+        sensor_names = sensor_types.dictionary.to_pylist()
+        series = (
+            asset_ids.indices.to_numpy(zero_copy_only=False).astype(np.int64) * len(sensor_names)
+            + sensor_types.indices.to_numpy(zero_copy_only=False)
+        )
+        timestamps = table.column("timestamp").cast(pa.int64()).to_numpy().astype("datetime64[us]")
+        values = table.column("value").to_numpy()
+        signs, indices = self.sketch.bins(values)
+        
+        increments = []
+        for resolution in RESOLUTIONS:
+            period = timestamps.astype(f"datetime64[{RESOLUTION_UNITS[resolution]}]")
+            hours_in = (timestamps - period.astype("datetime64[us]")) / np.timedelta64(1, "h")
+            group_key = series * (1 << 24) + period.astype(np.int64)
+            
+            order = np.argsort(group_key, kind="stable")
+            sorted_keys = group_key[order]
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_keys)) + 1))
+            v = values[order]
+            t = hours_in[order]
+            
+            counts = np.diff(np.append(starts, len(order)))
+            sums = np.add.reduceat(v, starts)
+            sumsqs = np.add.reduceat(v * v, starts)
+            mins = np.minimum.reduceat(v, starts)
+            maxs = np.maximum.reduceat(v, starts)
+            sum_t = np.add.reduceat(t, starts)
+            sum_tt = np.add.reduceat(t * t, starts)
+            sum_tv = np.add.reduceat(t * v, starts)
+            
+            # Sketch bin counts per group, from one unique() over packed
+            # (group, sign, bin index) integers
+            group_index = np.repeat(np.arange(len(starts)), counts)
+            packed = ((group_index * 3 + signs[order] + 1) << 32) + (indices[order] + (1 << 31))
+            bins, bin_counts = np.unique(packed, return_counts=True)
+            group_bins: Dict[int, List] = {}
+            for entry, count in zip(bins.tolist(), bin_counts.tolist()):
+                group, sign = divmod(entry >> 32, 3)
+                field = self.sketch.field(sign - 1, (entry & 0xFFFFFFFF) - (1 << 31))
+                group_bins.setdefault(group, []).extend([field, count])
+            
+            first = order[starts]
+            for g, row in enumerate(first.tolist()):
+                asset_code, sensor_code = divmod(int(series[row]), len(sensor_names))
+                key = self.key(resolution, asset_names[asset_code], sensor_names[sensor_code], period[row])
+                increments.append((resolution, key, [
+                    int(counts[g]), repr(float(sums[g])), repr(float(sumsqs[g])),
+                    repr(float(mins[g])), repr(float(maxs[g])),
+                    repr(float(sum_t[g])), repr(float(sum_tt[g])), repr(float(sum_tv[g])),
+                    *group_bins.get(g, [])
+                ]))
+        
+        return increments
+    
+    def update(self, table: pa.Table) -> int:
+        """Fold a batch of readings into the rollups; return the rollups touched"""
+        increments = self.aggregate(table)
+        for i in range(0, len(increments), self.batch_size):
+            pipe = self.redis.pipeline(transaction=False)
+            for resolution, key, args in increments[i:i + self.batch_size]:
+                ttl = self.ttl_days[resolution]
+                self._update(keys=[key], args=[ttl * 86400 if ttl else 0, *args], client=pipe)
+            pipe.execute()
+        return len(increments)
+    
+    def retained_since(self, now: Optional[np.datetime64] = None) -> Dict[str, np.datetime64]:
+        """Oldest period start (hour precision) each expiring resolution still holds
+        
+        A rollup expires ttl days after its last update, which is never
+        before its period starts, so periods starting at or after now - ttl
+        are still stored; older ones may have expired.
+        """
+        now = np.datetime64(int(time.time()), "s") if now is None else np.datetime64(now, "s")
+        horizons = {}
+        for resolution, ttl in self.ttl_days.items():
+            if ttl:
+                oldest = now - np.timedelta64(ttl * 86400, "s")
+                hour = oldest.astype("datetime64[h]")
+                horizons[resolution] = hour + np.timedelta64(1, "h") if hour < oldest else hour
+        return horizons
+    
+    def keys(self, asset_id: str, sensor_type: str, start, end,
+             now: Optional[np.datetime64] = None) -> List[Tuple[str, np.datetime64, str]]:
+        """(resolution, period, key) of the rollups covering [start, end)
+        
+        Parts of the window older than a resolution's retention are read at
+        the next coarser resolution still retained, widening the window to
+        that period's boundaries (see covered_start/covered_end in summarize).
+        """
+        return [
+            (resolution, period, self.key(resolution, asset_id, sensor_type, period))
+            for resolution, period in cover(np.datetime64(start), np.datetime64(end), self.retained_since(now))
+        ]
+    
+    def summarize(self, covering: List[Tuple[str, np.datetime64, str]], hashes: List[Dict],
+                  start, quantiles: Optional[List[float]] = None,
+                  now: Optional[np.datetime64] = None) -> Dict[str, Any]:
+        """Merge fetched rollup hashes into summary statistics
+        
+        The trend is the least-squares slope of value against time, per hour.
+        covered_start/covered_end give the span actually summarized. Missing
+        rollups past their resolution's retention (possible only when even
+        the coarsest resolution expires) are listed in rollups_read
+        ["expired"] and the summary is flagged partial.
+        """
+        quantiles = quantiles or [0.25, 0.5, 0.75]
+        origin = np.datetime64(start).astype("datetime64[h]")
+        n = total = total_sq = sum_t = sum_tt = sum_tv = 0.0
+        low, high = math.inf, -math.inf
+        bins: Dict[str, int] = {}
+        reads: Dict[str, Any] = {resolution: 0 for resolution in RESOLUTIONS}
+        retained_since = self.retained_since(now)
+        expired = []
+        
+        for (resolution, period, _), stored in zip(covering, hashes):
+            if not stored:
+                if not _retained(resolution, period, retained_since):
+                    expired.append(f"{resolution}:{np.datetime_as_string(_period_start(period, resolution))}")
+                continue
+            stored = {
+                (field.decode() if isinstance(field, bytes) else field): value
+                for field, value in stored.items()
+            }
+            reads[resolution] += 1
+            count = float(stored["count"])
+            offset = float((_period_start(period, resolution).astype("datetime64[h]") - origin) / np.timedelta64(1, "h"))
+            # Shift the period's time sums onto the query origin
+            period_sum, period_t = float(stored["sum"]), float(stored["sum_t"])
+            sum_tt += float(stored["sum_tt"]) + 2 * offset * period_t + count * offset * offset
+            sum_t += period_t + count * offset
+            sum_tv += float(stored["sum_tv"]) + offset * period_sum
+            n += count
+            total += period_sum
+            total_sq += float(stored["sumsq"])
+            low = min(low, float(stored["min"]))
+            high = max(high, float(stored["max"]))
+            for field, value in stored.items():
+                if field not in SCALAR_FIELDS:
+                    bins[field] = bins.get(field, 0) + int(value)
+        
+        reads["expired"] = expired
+        coverage: Dict[str, Any] = {"partial": bool(expired)}
+        if covering:
+            (first_resolution, first, _), (last_resolution, last, _) = covering[0], covering[-1]
+            unit = RESOLUTION_UNITS[last_resolution]
+            coverage["covered_start"] = _iso_hour(_period_start(first, first_resolution))
+            coverage["covered_end"] = _iso_hour(_period_start(last, last_resolution) + np.timedelta64(1, unit))
+        
+        if n == 0:
+            return {"count": 0, **coverage, "rollups_read": reads}
+        
+        mean = total / n
+        denominator = n * sum_tt - sum_t * sum_t
+        return {
+            "count": int(n),
+            **coverage,
+            "mean": mean,
+            "std": math.sqrt(max(total_sq / n - mean * mean, 0.0)),
+            "min": low,
+            "max": high,
+            "quantiles": dict(zip((f"p{q * 100:g}" for q in quantiles), self.sketch.quantiles(bins, quantiles))),
+            "trend_per_hour": (n * sum_tv - sum_t * total) / denominator if denominator > 1e-12 else 0.0,
+            "rollups_read": reads
+        }
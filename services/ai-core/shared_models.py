@@ -0,0 +1,426 @@
+"""
+Shared model serving for AIMY AI Core Service
+Flattens fitted tree ensembles into plain node arrays that every worker
+process on a host memory-maps from a shared directory
+"""
+
+import os
+import json
+import fcntl
+import shutil
+import logging
+from contextlib import contextmanager
+from typing import Dict, Any, Tuple, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+EXPORT_FORMAT_VERSION = 1
+
+# Exported ensembles are stored as node arrays (roots, left, right, feature,
+# threshold, value) with all trees concatenated. Leaf children point back at
+# the leaf itself, so traversal runs a fixed number of vectorized steps over
+# every tree at once.
+
+def _average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """Average path length of an unsuccessful BST search (IsolationForest normalization)"""
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    result = np.zeros_like(n_samples)
+    result[n_samples == 2] = 1.0
+    mask = n_samples > 2
+    result[mask] = 2.0 * (np.log(n_samples[mask] - 1.0) + np.euler_gamma) - 2.0 * (n_samples[mask] - 1.0) / n_samples[mask]
+    return result
+
+def _node_depths(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Depth of every node of a single sklearn tree (nodes are stored in pre-order)"""
+    depths = np.zeros(len(left), dtype=np.float64)
+    for node in range(len(left)):
+        if left[node] != -1:
+            depths[left[node]] = depths[node] + 1
+            depths[right[node]] = depths[node] + 1
+    return depths
+
+def _flatten_sklearn_trees(estimators, leaf_values) -> Dict[str, np.ndarray]:
+    """Concatenate sklearn trees into global node arrays"""
+    roots, left, right, feature, threshold, value = [], [], [], [], [], []
+    offset = 0
+    for estimator, tree_values in zip(estimators, leaf_values):
+        tree = estimator.tree_
+        n_nodes = tree.node_count
+        node_ids = np.arange(n_nodes) + offset
+        is_leaf = tree.children_left == -1
+        
+        roots.append(offset)
+        left.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+        right.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+        value.append(tree_values)
+        offset += n_nodes
+    
+    return {
+        "roots": np.asarray(roots, dtype=np.int64),
+        "left": np.concatenate(left).astype(np.int64),
+        "right": np.concatenate(right).astype(np.int64),
+        "feature": np.concatenate(feature).astype(np.int64),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "value": np.concatenate(value).astype(np.float64)
+    }
+
+def _flatten_lightgbm(booster) -> Dict[str, np.ndarray]:
+    """Flatten a LightGBM booster dump into global node arrays"""
+    dump = booster.dump_model()
+    roots, left, right, feature, threshold, value, default_left, missing_nan = [], [], [], [], [], [], [], []
+    
+    for tree_info in dump["tree_info"]:
+        roots.append(len(left))
+        stack = [(tree_info["tree_structure"], None, None)]
+        while stack:
+            node, parent, side = stack.pop()
+            node_id = len(left)
+            if parent is not None:
+                (left if side == "left" else right)[parent] = node_id
+            
+            if "leaf_value" in node:
+                left.append(node_id)
+                right.append(node_id)
+                feature.append(0)
+                threshold.append(np.inf)
+                value.append(node["leaf_value"])
+                default_left.append(True)
+                missing_nan.append(False)
+                continue
+            
+            if node.get("decision_type", "<=") != "<=":
+                raise ValueError("Categorical LightGBM splits cannot be exported")
+            
+            left.append(-1)
+            right.append(-1)
+            feature.append(node["split_feature"])
+            threshold.append(node["threshold"])
+            value.append(0.0)
+            default_left.append(bool(node.get("default_left", True)))
+            missing_nan.append(node.get("missing_type") == "NaN")
+            stack.append((node["right_child"], node_id, "right"))
+            stack.append((node["left_child"], node_id, "left"))
+    
+    return {
+        "roots": np.asarray(roots, dtype=np.int64),
+        "left": np.asarray(left, dtype=np.int64),
+        "right": np.asarray(right, dtype=np.int64),
+        "feature": np.asarray(feature, dtype=np.int64),
+        "threshold": np.asarray(threshold, dtype=np.float64),
+        "value": np.asarray(value, dtype=np.float64),
+        "default_left": np.asarray(default_left, dtype=bool),
+        "missing_nan": np.asarray(missing_nan, dtype=bool)
+    }
+
+def export_model(model) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Export a fitted RandomForestRegressor, IsolationForest or LGBMRegressor to node arrays"""
+    model_type = type(model).__name__
+    
+    if model_type == "RandomForestRegressor":
+        if model.n_outputs_ != 1:
+            raise ValueError("Only single-output forests can be exported")
+        arrays = _flatten_sklearn_trees(
+            model.estimators_,
+            [estimator.tree_.value[:, 0, 0] for estimator in model.estimators_]
+        )
+        meta = {"kind": "forest_mean", "input_dtype": "float32"}
+    
+    elif model_type == "IsolationForest":
+        if model._max_features != model.n_features_in_:
+            raise ValueError("IsolationForest with feature subsampling cannot be exported")
+        # Per-leaf path length contribution, in the estimator's operation order:
+        # (nodes on the decision path + c(n_samples_in_leaf)) - 1
+        leaf_values = []
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            path_lengths = _node_depths(tree.children_left, tree.children_right) + 1.0
+            leaf_values.append(path_lengths + _average_path_length(tree.n_node_samples) - 1.0)
+        arrays = _flatten_sklearn_trees(model.estimators_, leaf_values)
+        meta = {
+            "kind": "isolation",
+            "input_dtype": "float32",
+            "average_path_length_max_samples": float(_average_path_length([model._max_samples])[0]),
+            "offset": float(model.offset_)
+        }
+    
+    elif model_type == "LGBMRegressor":
+        objective = model.booster_.dump_model().get("objective", "")
+        if not objective.startswith(("regression", "huber", "fair", "quantile", "mape")):
+            raise ValueError(f"LightGBM objective {objective} cannot be exported")
+        arrays = _flatten_lightgbm(model.booster_)
+        meta = {"kind": "boosted_sum", "input_dtype": "float64"}
+    
+    else:
+        raise ValueError(f"Unsupported model type for export: {model_type}")
+    
+    meta.update({
+        "format_version": EXPORT_FORMAT_VERSION,
+        "model_type": model_type,
+        "n_features_in": int(model.n_features_in_),
+        "n_trees": int(len(arrays["roots"])),
+        "max_depth": int(_max_depth(arrays))
+    })
+    return arrays, meta
+
+def _max_depth(arrays: Dict[str, np.ndarray]) -> int:
+    """Number of traversal steps needed to reach every leaf"""
+    left, right = arrays["left"], arrays["right"]
+    frontier = arrays["roots"]
+    depth = 0
+    while True:
+        internal = frontier[left[frontier] != frontier]
+        if len(internal) == 0:
+            return depth
+        frontier = np.concatenate([left[internal], right[internal]])
+        depth += 1
+
+def _scaler_parameters(scaler, n_features: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-feature (mean, scale) of a fitted StandardScaler"""
+    if type(scaler).__name__ != "StandardScaler" or not hasattr(scaler, "n_features_in_"):
+        raise ValueError("Only fitted StandardScalers can be folded")
+    mean = np.zeros(n_features) if scaler.mean_ is None else np.asarray(scaler.mean_, dtype=np.float64)
+    scale = np.ones(n_features) if scaler.scale_ is None else np.asarray(scaler.scale_, dtype=np.float64)
+    if len(mean) != n_features or np.any(scale <= 0):
+        raise ValueError("Scaler does not match the model's features")
+    return mean, scale
+
+def _raw_thresholds(threshold: np.ndarray, mean: np.ndarray, scale: np.ndarray, float32_inputs: bool) -> np.ndarray:
+    """Largest raw float64 value per split that the scaled model sends left
+    
+    The scaled model compares scaled(x) = (x - mean) / scale, rounded to
+    float32 for sklearn trees, against t. scaled is monotone in x, so the
+    split is exactly x <= T for the largest T with scaled(T) <= t; T is
+    found by bisecting over float64 values from the affine estimate.
+    """
+    def scaled(x: np.ndarray) -> np.ndarray:
+        z = (x - mean) / scale
+        return z.astype(np.float32).astype(np.float64) if float32_inputs else z
+    
+    with np.errstate(over="ignore", invalid="ignore"):
+        estimate = threshold * scale + mean
+        width = (np.abs(threshold) + 1.0) * scale * 2.0 ** -16 + np.abs(estimate) * 2.0 ** -40
+        lo, hi = estimate - width, estimate + width
+        for _ in range(64):
+            low_bad, high_bad = scaled(lo) > threshold, scaled(hi) <= threshold
+            if not (low_bad.any() or high_bad.any()):
+                break
+            width *= 2.0
+            lo = np.where(low_bad, estimate - width, lo)
+            hi = np.where(high_bad, estimate + width, hi)
+        else:
+            raise ValueError("Could not bracket raw split thresholds")
+        
+        # Invariant: scaled(lo) <= t < scaled(hi); stop when lo and hi are adjacent
+        while True:
+            mid = lo + (hi - lo) / 2.0
+            active = (mid != lo) & (mid != hi)
+            if not active.any():
+                break
+            goes_left = scaled(mid) <= threshold
+            lo = np.where(active & goes_left, mid, lo)
+            hi = np.where(active & ~goes_left, mid, hi)
+        
+        if np.any(scaled(lo) > threshold) or np.any(scaled(np.nextafter(lo, np.inf)) <= threshold):
+            raise ValueError("Raw split thresholds are not exact")
+    return lo
+
+def fold_scaler(arrays: Dict[str, np.ndarray], meta: Dict[str, Any], scaler) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Rewrite exported split thresholds into raw feature units
+    
+    The folded model takes unscaled float64 features and makes the same
+    decision at every split as the exported model does on scaled features,
+    so its outputs are identical and the scaler leaves the serving path.
+    """
+    if meta.get("scaler_folded"):
+        raise ValueError("Model already has its scaler folded in")
+    mean, scale = _scaler_parameters(scaler, meta["n_features_in"])
+    
+    threshold = arrays["threshold"].copy()
+    internal = np.isfinite(threshold)
+    feature = arrays["feature"][internal]
+    threshold[internal] = _raw_thresholds(
+        threshold[internal], mean[feature], scale[feature], meta["input_dtype"] == "float32"
+    )
+    
+    folded = dict(arrays, threshold=threshold)
+    if "missing_nan" in arrays:
+        # LightGBM replaces missing values with zero in scaled units, i.e. the mean
+        folded["missing_fill"] = mean.copy()
+    return folded, dict(meta, input_dtype="float64", scaler_folded=True)
+
+def verify_folded(arrays: Dict[str, np.ndarray], meta: Dict[str, Any], folded_arrays: Dict[str, np.ndarray],
+                  folded_meta: Dict[str, Any], scaler, n_probes: int = 1024, seed: int = 0) -> bool:
+    """Check a folded model against the scaled one on probes straddling its splits"""
+    mean, scale = _scaler_parameters(scaler, meta["n_features_in"])
+    rng = np.random.default_rng(seed)
+    probes = mean + scale * rng.standard_normal((n_probes, len(mean)))
+    
+    # Put half of each feature's values exactly on, or one ulp above, one of its splits
+    threshold = folded_arrays["threshold"]
+    internal = np.isfinite(threshold)
+    for column in range(probes.shape[1]):
+        splits = threshold[internal & (folded_arrays["feature"] == column)]
+        if len(splits) == 0:
+            continue
+        rows = np.flatnonzero(rng.random(n_probes) < 0.5)
+        boundary = rng.choice(splits, size=len(rows))
+        probes[rows, column] = np.where(rng.random(len(rows)) < 0.5, boundary, np.nextafter(boundary, np.inf))
+    
+    method = "score_samples" if meta["kind"] == "isolation" else "predict"
+    expected = getattr(SharedModel(arrays, meta), method)(scaler.transform(probes))
+    actual = getattr(SharedModel(folded_arrays, folded_meta), method)(probes)
+    return bool(np.array_equal(expected, actual))
+
+class SharedModel:
+    """Read-only model backed by memory-mapped node arrays
+    
+    Exposes the predict/score_samples subset of the sklearn API the
+    endpoints use, with outputs identical to the exported estimator.
+    """
+    
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any], version: Optional[str] = None):
+        self.arrays = arrays
+        self.meta = meta
+        self.version = version
+        self.n_features_in_ = meta["n_features_in"]
+        self.scaler_folded = bool(meta.get("scaler_folded", False))
+        self._input_dtype = np.float32 if meta["input_dtype"] == "float32" else np.float64
+    
+    @classmethod
+    def open(cls, path: str) -> "SharedModel":
+        """Memory-map an exported model directory"""
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        
+        arrays = {
+            name[:-4]: np.load(os.path.join(path, name), mmap_mode="r")
+            for name in os.listdir(path) if name.endswith(".npy")
+        }
+        return cls(arrays, meta, version=meta.get("version"))
+    
+    def _leaf_values(self, X, max_trees: Optional[int] = None) -> np.ndarray:
+        """Per-tree leaf values of the first max_trees trees, shape (n_samples, n_trees)"""
+        X = np.asarray(X, dtype=self._input_dtype)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected input with {self.n_features_in_} features, got shape {X.shape}")
+        
+        arrays = self.arrays
+        left, right, feature, threshold = arrays["left"], arrays["right"], arrays["feature"], arrays["threshold"]
+        rows = np.arange(X.shape[0])[:, None]
+        roots = arrays["roots"][:max_trees]
+        node = np.broadcast_to(roots, (X.shape[0], len(roots))).copy()
+        
+        for _ in range(self.meta["max_depth"]):
+            x = X[rows, feature[node]]
+            if "missing_nan" in arrays:
+                # LightGBM: NaN is missing for "NaN" splits and zero otherwise
+                is_nan = np.isnan(x)
+                fill = arrays["missing_fill"][feature[node]] if "missing_fill" in arrays else 0.0
+                x = np.where(is_nan & ~arrays["missing_nan"][node], fill, x)
+                go_left = np.where(np.isnan(x), arrays["default_left"][node], x <= threshold[node])
+            else:
+                go_left = x <= threshold[node]
+            node = np.where(go_left, left[node], right[node])
+        
+        return arrays["value"][node]
+    
+    def _accumulate(self, leaf_values: np.ndarray) -> np.ndarray:
+        # Sum in tree order to reproduce the estimators' floating point results
+        total = np.zeros(leaf_values.shape[0], dtype=np.float64)
+        for tree in range(leaf_values.shape[1]):
+            total += leaf_values[:, tree]
+        return total
+    
+    def _n_trees(self, max_trees: Optional[int]) -> int:
+        return self.meta["n_trees"] if max_trees is None else min(max_trees, self.meta["n_trees"])
+    
+    def predict(self, X, max_trees: Optional[int] = None) -> np.ndarray:
+        """Predict with the full model, or approximately with its first max_trees trees"""
+        kind = self.meta["kind"]
+        if kind == "forest_mean":
+            return self._accumulate(self._leaf_values(X, max_trees)) / self._n_trees(max_trees)
+        if kind == "boosted_sum":
+            return self._accumulate(self._leaf_values(X, max_trees))
+        if kind == "isolation":
+            return np.where(self.decision_function(X, max_trees) < 0, -1, 1)
+        raise ValueError(f"Unknown model kind: {kind}")
+    
+    def score_samples(self, X, max_trees: Optional[int] = None) -> np.ndarray:
+        if self.meta["kind"] != "isolation":
+            raise AttributeError("score_samples is only available for isolation forests")
+        
+        depths = self._accumulate(self._leaf_values(X, max_trees))
+        denominator = self._n_trees(max_trees) * self.meta["average_path_length_max_samples"]
+        if denominator == 0:
+            return -np.ones_like(depths)
+        return -(2 ** (-depths / denominator))
+    
+    def decision_function(self, X, max_trees: Optional[int] = None) -> np.ndarray:
+        return self.score_samples(X, max_trees) - self.meta["offset"]
+
+# Shared directory management
+def save_arrays(path: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]):
+    """Write exported arrays and metadata into a directory"""
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(array))
+    with open(os.path.join(path, META_FILE), "w") as f:
+        json.dump(meta, f)
+
+def version_dir(root: str, model_name: str, version: str) -> str:
+    return os.path.join(root, model_name, version)
+
+def is_published(root: str, model_name: str, version: str) -> bool:
+    return os.path.exists(os.path.join(version_dir(root, model_name, version), META_FILE))
+
+@contextmanager
+def publish_lock(root: str, model_name: str):
+    """Host-wide lock so only one worker materializes a model version"""
+    model_dir = os.path.join(root, model_name)
+    os.makedirs(model_dir, exist_ok=True)
+    with open(os.path.join(model_dir, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def publish(root: str, model_name: str, version: str, fill_dir, keep_versions: int = 3) -> str:
+    """Materialize a model version into the shared directory
+    
+    `fill_dir(path)` writes the version's files into a staging directory,
+    which is then renamed into place, so readers only ever see complete
+    versions. Call under publish_lock.
+    """
+    target = version_dir(root, model_name, version)
+    if is_published(root, model_name, version):
+        return target
+    
+    staging = os.path.join(root, model_name, f".staging-{version}-{os.getpid()}")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    try:
+        fill_dir(staging)
+        os.rename(staging, target)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    
+    prune(root, model_name, keep_versions)
+    logger.info(f"Published shared {model_name} model {version}")
+    return target
+
+def prune(root: str, model_name: str, keep_versions: int):
+    """Remove old versions; processes still mapping them keep valid pages"""
+    model_dir = os.path.join(root, model_name)
+    versions = [
+        os.path.join(model_dir, entry) for entry in os.listdir(model_dir)
+        if not entry.startswith(".") and os.path.isdir(os.path.join(model_dir, entry))
+    ]
+    versions.sort(key=os.path.getmtime, reverse=True)
+    for path in versions[keep_versions:]:
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,43 @@
+"""
+Test configuration for AIMY AI Core Service
+Makes the service modules importable when pytest runs from services/ai-core
+and provides a PostgreSQL server for the prediction store tests: the one at
+AIMY_TEST_POSTGRES_URL, or else a throwaway local server started with
+pgserver (tests needing it are skipped when neither is available), and the
+service itself, imported once against the hermetic stand-ins
+"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope="session")
+def postgres_url(tmp_path_factory):
+    url = os.getenv("AIMY_TEST_POSTGRES_URL")
+    if url:
+        yield url
+        return
+    
+    try:
+        import pgserver
+    except ImportError:
+        pytest.skip("PostgreSQL not available: set AIMY_TEST_POSTGRES_URL or install pgserver")
+    
+    server = pgserver.get_server(str(tmp_path_factory.mktemp("postgres")), cleanup_mode="stop")
+    try:
+        yield server.get_uri()
+    finally:
+        server.cleanup()
+
+@pytest.fixture(scope="session")
+def service(request):
+    """The hermetic service (benchmarks.hermetic), with the prediction store
+    connected when a PostgreSQL server is available"""
+    from benchmarks.hermetic import load_service
+    try:
+        postgres = request.getfixturevalue("postgres_url")
+    except pytest.skip.Exception:
+        postgres = None
+    return load_service(n_assets=0, train=False, postgres_url=postgres)
@@ -0,0 +1,64 @@
+"""
+Feature store tests for AIMY AI Core Service
+Online buffering, flushing and bounded part counts through compaction
+"""
+
+import os
+import numpy as np
+import pytest
+from feature_store import FeatureStore
+
+COLUMNS = ["a", "b"]
+
+@pytest.fixture
+def store(tmp_path):
+    store = FeatureStore(str(tmp_path), refresh_interval=0, flush_rows=1000, compact_parts=4, compact_max_rows=100)
+    store.register("pricing", 1, COLUMNS)
+    return store
+
+def part_count(store: FeatureStore, name: str = "pricing") -> int:
+    set_dir = os.path.join(store.root_dir, name, f"v{store.version(name)}")
+    return sum(entry.startswith("part-") for entry in os.listdir(set_dir))
+
+def test_flush_makes_buffered_rows_visible(store):
+    store.append("pricing", "asset-1", "2025-01-01", [1.0, 2.0])
+    assert store.lookup("pricing", "asset-1") is None
+    
+    store.flush()
+    values, as_of = store.lookup("pricing", "asset-1")
+    np.testing.assert_array_equal(values, [1.0, 2.0])
+    assert as_of == np.datetime64("2025-01-01", "s")
+
+def test_small_parts_are_compacted(store):
+    for i in range(20):
+        store.append("pricing", f"asset-{i % 3}", f"2025-01-{i + 1:02d}", [float(i), 0.0])
+        store.flush()
+        assert part_count(store) < store.compact_parts
+    
+    # Latest row per asset survives compaction
+    for asset in range(3):
+        latest = max(i for i in range(20) if i % 3 == asset)
+        values, _ = store.lookup("pricing", f"asset-{asset}")
+        assert values[0] == latest
+    assert len(store.load_matrix("pricing")) == 3
+
+def test_compaction_keeps_large_parts_and_write_order(store):
+    big = np.arange(200, dtype=np.float64).reshape(100, 2)
+    store.write_matrix("pricing", np.array([f"asset-{i}" for i in range(100)]), "2025-01-01", big)
+    # Rewrites of an existing (asset, as_of) key must win after compaction
+    for i in range(store.compact_parts):
+        store.append("pricing", "asset-0", "2025-01-01", [1000.0 + i, 0.0])
+        store.flush()
+    
+    assert part_count(store) == 2
+    values, _ = store.lookup("pricing", "asset-0", "2025-01-01")
+    assert values[0] == 1000.0 + store.compact_parts - 1
+    values, _ = store.lookup("pricing", "asset-99")
+    np.testing.assert_array_equal(values, [198.0, 199.0])
+
+def test_full_compaction_merges_everything(store):
+    for i in range(3):
+        store.write_matrix("pricing", np.array(["asset-0"]), f"2025-01-0{i + 1}", np.array([[float(i), 0.0]]))
+    store.compact("pricing")
+    assert part_count(store) == 1
+    assert store.lookup("pricing", "asset-0", "2025-01-02")[0][0] == 1.0
@@ -0,0 +1,99 @@
+"""
+IoT ingestion tests for AIMY AI Core Service
+Flushing of buffered readings to object storage, including retries of a
+flush that failed part-way
+"""
+
+import io
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pyarrow as pa
+import pyarrow.parquet as pq
+from benchmarks.hermetic import InMemoryMinio
+from iot_ingest import IOT_SCHEMA, IoTIngestBuffer
+
+BUCKET = "aimy-data"
+START = datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+class FlakyMinio(InMemoryMinio):
+    """Object store whose uploads to keys containing fail_on raise until it is cleared"""
+    
+    def __init__(self):
+        super().__init__()
+        self.fail_on = None
+        self.uploads = []
+    
+    def put_object(self, bucket_name: str, object_name: str, data, length: int = -1, *args, **kwargs):
+        if self.fail_on and self.fail_on in object_name:
+            raise ConnectionError(f"upload of {object_name} failed")
+        self.uploads.append(object_name)
+        super().put_object(bucket_name, object_name, data, length)
+
+def readings(n_assets: int, days: int, offset: float = 0.0) -> pa.Table:
+    rows = [
+        (f"asset-{asset}", START + timedelta(days=day, hours=asset), "temperature", offset + asset * 10 + day, "C")
+        for asset in range(n_assets) for day in range(days)
+    ]
+    return pa.Table.from_pylist(
+        [dict(zip(IOT_SCHEMA.names, row)) for row in rows], schema=IOT_SCHEMA
+    )
+
+def stored_rows(client: InMemoryMinio) -> pa.Table:
+    tables = [pq.read_table(io.BytesIO(payload)) for payload, _ in client.buckets[BUCKET].values()]
+    return pa.concat_tables(tables).sort_by([("asset_id", "ascending"), ("timestamp", "ascending")])
+
+def test_flush_writes_one_object_per_day_and_bucket():
+    client = FlakyMinio()
+    client.make_bucket(BUCKET)
+    buffer = IoTIngestBuffer(client, BUCKET, asset_buckets=4)
+    assert buffer.offer(readings(6, 3))
+    
+    assert asyncio.run(buffer.flush()) == 18
+    assert buffer.buffered_rows == 0
+    assert stored_rows(client).num_rows == 18
+    assert buffer.stats["objects_written"] == len(client.buckets[BUCKET])
+
+def test_partial_failure_is_retried_without_duplicates():
+    client = FlakyMinio()
+    client.make_bucket(BUCKET)
+    buffer = IoTIngestBuffer(client, BUCKET, asset_buckets=4)
+    first = readings(6, 3)
+    buffer.offer(first)
+    
+    client.fail_on = "date=2025-03-02/"
+    assert asyncio.run(buffer.flush()) == 0
+    assert buffer.stats["flush_failures"] == 1
+    assert buffer.buffered_rows == 18
+    written = set(client.uploads)
+    assert written and not any("date=2025-03-02/" in key for key in written)
+    
+    # Readings offered after the failure are not folded into the retry
+    second = readings(2, 1, offset=1000.0)
+    buffer.offer(second)
+    client.fail_on = None
+    client.uploads.clear()
+    assert asyncio.run(buffer.flush()) == 20
+    assert buffer.buffered_rows == 0
+    assert written.isdisjoint(client.uploads)
+    
+    stored = stored_rows(client)
+    expected = pa.concat_tables([first, second])
+    assert stored.num_rows == 20
+    assert sorted(stored.column("value").to_pylist()) == sorted(expected.column("value").to_pylist())
+    assert buffer.stats["objects_written"] == len(client.buckets[BUCKET])
+
+def test_failed_retry_holds_back_newer_batches():
+    client = FlakyMinio()
+    client.make_bucket(BUCKET)
+    buffer = IoTIngestBuffer(client, BUCKET, asset_buckets=4)
+    buffer.offer(readings(3, 1))
+    
+    client.fail_on = "date="
+    assert asyncio.run(buffer.flush()) == 0
+    buffer.offer(readings(3, 1, offset=100.0))
+    assert asyncio.run(buffer.flush()) == 0
+    assert buffer.buffered_rows == 6
+    
+    client.fail_on = None
+    assert asyncio.run(buffer.flush()) == 6
+    assert stored_rows(client).num_rows == 6
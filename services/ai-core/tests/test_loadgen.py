@@ -0,0 +1,32 @@
+"""
+Load generator tests for AIMY AI Core Service
+Servers spawned for a sweep run with the caller's configuration
+"""
+
+import os
+import pytest
+from benchmarks import loadgen
+
+def test_spawned_server_keeps_callers_environment(monkeypatch):
+    monkeypatch.setenv("POSTGRES_URL", "postgresql://prod@db/aimy")
+    monkeypatch.setenv("FEATURE_STORE_DIR", "/data/feature-store")
+    
+    def build_payloads(endpoints, pool_size, seed=0):
+        # As load_service does when it installs the hermetic environment
+        os.environ["POSTGRES_URL"] = "postgresql://bench@/aimy_ai?host=/tmp/no-postgres"
+        os.environ["FEATURE_STORE_DIR"] = "/tmp/aimy-bench/feature-store"
+        return {endpoint: [b"{}"] for endpoint in endpoints}
+    
+    spawned = {}
+    
+    def spawn_server(workers, port, env):
+        spawned.update(env)
+        raise RuntimeError("not starting a server in tests")
+    
+    monkeypatch.setattr(loadgen, "build_payloads", build_payloads)
+    monkeypatch.setattr(loadgen, "spawn_server", spawn_server)
+    with pytest.raises(RuntimeError):
+        loadgen.main(["--spawn-workers", "1", "--rates", "10"])
+    
+    assert spawned["POSTGRES_URL"] == "postgresql://prod@db/aimy"
+    assert spawned["FEATURE_STORE_DIR"] == "/data/feature-store"
@@ -0,0 +1,67 @@
+"""
+Monte Carlo valuation tests for AIMY AI Core Service
+Calibration on the service's mock history must give a distribution centred
+on the deterministic value rather than compounding noise into it
+"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import monte_carlo
+
+def mock_history(seed: int, days: int = 365):
+    """Same patterns as main.generate_mock_cashflows / generate_mock_market_data"""
+    rng = np.random.RandomState(seed)
+    base_date = datetime(2025, 1, 1) + timedelta(days=seed * 11)
+    cashflows, market_data = [], []
+    interest_rate = 0.05
+    for i in range(days):
+        date = (base_date + timedelta(days=i)).strftime("%Y-%m-%d")
+        if i % 30 == 0:
+            cashflows.append(SimpleNamespace(date=date, amount=rng.normal(10000, 2000), type="revenue"))
+        elif i % 7 == 0:
+            cashflows.append(SimpleNamespace(date=date, amount=rng.normal(-2000, 500), type="expense"))
+        interest_rate = max(0, min(0.15, interest_rate + rng.normal(0, 0.001)))
+        market_data.append(SimpleNamespace(date=date, interest_rate=interest_rate))
+    return cashflows, market_data
+
+@pytest.mark.parametrize("seed", range(8))
+def test_mock_history_p50_matches_deterministic_value(seed):
+    cashflows, market_data = mock_history(seed)
+    params = monte_carlo.calibrate(cashflows, market_data)
+    values = monte_carlo.simulate(params, 240, 20000, seed=seed)
+    summary = monte_carlo.summarize(values)
+    expected = monte_carlo.deterministic_value(params, 240)
+    
+    assert abs(params.revenue_drift) <= monte_carlo.MAX_MONTHLY_DRIFT
+    assert abs(params.expense_drift) <= monte_carlo.MAX_MONTHLY_DRIFT
+    # Same order of magnitude and sign as the noise-free valuation
+    assert summary["percentiles"]["p50"] == pytest.approx(expected, rel=0.1, abs=5000)
+    assert summary["mean"] == pytest.approx(expected, rel=0.1, abs=5000)
+
+def test_level_ignores_partial_boundary_months():
+    start = datetime(2025, 1, 1)
+    cashflows = [
+        SimpleNamespace(date=(start + timedelta(days=31 * m)).strftime("%Y-%m-%d"), amount=1000.0, type="revenue")
+        for m in range(12)
+    ]
+    # A partial last month with a single small record
+    cashflows.append(SimpleNamespace(date="2026-01-20", amount=50.0, type="revenue"))
+    market_data = [SimpleNamespace(date="2025-06-01", interest_rate=0.04)]
+    
+    params = monte_carlo.calibrate(cashflows, market_data)
+    assert params.revenue == pytest.approx(1000.0)
+    assert params.revenue_drift == 0.0
+
+def test_trend_is_bounded():
+    growth = monte_carlo.trend(monte_carlo.MAX_MONTHLY_DRIFT, 600)
+    assert np.all(np.diff(growth) > 0)
+    assert growth[-1] < monte_carlo.MAX_MONTHLY_DRIFT * 40
+
+def test_seeded_simulation_is_reproducible():
+    cashflows, market_data = mock_history(0)
+    params = monte_carlo.calibrate(cashflows, market_data)
+    first = monte_carlo.simulate(params, 120, 2500, seed=7, chunk_size=1000)
+    second = monte_carlo.simulate(params, 120, 2500, seed=7, chunk_size=1000)
+    np.testing.assert_array_equal(first, second)
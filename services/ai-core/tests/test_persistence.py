@@ -0,0 +1,185 @@
+"""
+Prediction store tests for AIMY AI Core Service
+Buffered COPY writes, retry after a failed flush, the Celery COPY path and
+the history and downsampling queries against a real PostgreSQL server
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+import psycopg2
+import pytest
+from persistence import PredictionStore, SyncPredictionStore, PREDICTIONS_TABLE, SCHEMA_SQL, prediction_record
+
+START = datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+def execute(url: str, sql: str):
+    conn = psycopg2.connect(url)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql)
+            rows = cursor.fetchall() if cursor.description else None
+        conn.commit()
+        return rows
+    finally:
+        conn.close()
+
+def stored_values(url: str, asset_id: str = "asset-1"):
+    return [row[0] for row in execute(
+        url, f"SELECT value FROM {PREDICTIONS_TABLE} WHERE asset_id = '{asset_id}' ORDER BY predicted_at"
+    )]
+
+@pytest.fixture
+def predictions(postgres_url):
+    """Empty predictions table"""
+    execute(postgres_url, SCHEMA_SQL)
+    execute(postgres_url, f"TRUNCATE {PREDICTIONS_TABLE}")
+    return postgres_url
+
+def test_records_are_buffered_until_flush(predictions):
+    async def run():
+        store = PredictionStore(predictions, flush_rows=1000, flush_interval=60)
+        await store.start()
+        try:
+            for i in range(250):
+                store.record("asset-1", "pricing", "v1", float(i), predicted_at=START + timedelta(minutes=i))
+            # Recording never touches the database
+            assert stored_values(predictions) == []
+            
+            assert await store.flush() == 250
+            assert await store.flush() == 0
+            assert stored_values(predictions) == [float(i) for i in range(250)]
+            
+            store.record("asset-1", "pricing", "v2", None, payload={"band": [1, 2]}, predicted_at=START + timedelta(days=1))
+        finally:
+            # close() writes what is still buffered
+            await store.close()
+    
+    asyncio.run(run())
+    rows = execute(predictions, f"SELECT model_version, value, payload FROM {PREDICTIONS_TABLE} WHERE model_version = 'v2'")
+    assert rows == [("v2", None, {"band": [1, 2]})]
+
+def test_flush_loop_writes_once_flush_rows_are_queued(predictions):
+    async def run():
+        store = PredictionStore(predictions, flush_rows=10, flush_interval=60)
+        await store.start()
+        try:
+            for i in range(10):
+                store.record("asset-1", "risk", "v1", float(i), predicted_at=START + timedelta(minutes=i))
+            for _ in range(50):
+                await asyncio.sleep(0.05)
+                if len(stored_values(predictions)) == 10:
+                    break
+            assert len(stored_values(predictions)) == 10
+        finally:
+            await store.close()
+    
+    asyncio.run(run())
+
+def test_failed_flush_keeps_rows_for_the_next_cycle(predictions):
+    async def run():
+        store = PredictionStore(predictions, flush_rows=1000, flush_interval=60, max_buffered_rows=8)
+        await store.start()
+        try:
+            for i in range(5):
+                store.record("asset-1", "pricing", "v1", float(i), predicted_at=START + timedelta(minutes=i))
+            
+            execute(predictions, f"ALTER TABLE {PREDICTIONS_TABLE} RENAME TO {PREDICTIONS_TABLE}_offline")
+            try:
+                assert await store.flush() == 0
+            finally:
+                execute(predictions, f"ALTER TABLE {PREDICTIONS_TABLE}_offline RENAME TO {PREDICTIONS_TABLE}")
+            
+            # The failed batch goes back in front of rows recorded since; the
+            # buffer is bounded, so the oldest rows give way once it is full
+            for i in range(5, 9):
+                store.record("asset-1", "pricing", "v1", float(i), predicted_at=START + timedelta(minutes=i))
+            assert store.dropped_rows == 1
+            
+            assert await store.flush() == 8
+        finally:
+            await store.close()
+    
+    asyncio.run(run())
+    assert stored_values(predictions) == [float(i) for i in range(1, 9)]
+
+def test_sync_store_copies_batches(predictions):
+    store = SyncPredictionStore(predictions)
+    try:
+        records = [
+            prediction_record("asset-1", "yield", "v1", 0.05, {"horizon": 12}, START),
+            prediction_record("asset-1", "yield", "v1", None, None, START.replace(tzinfo=None) + timedelta(hours=1)),
+            prediction_record("asset-1", "yield", None, 0.07, {"note": "comma, \"quoted\""}, START + timedelta(hours=2))
+        ]
+        assert store.write(records) == 3
+        assert store.write([]) == 0
+    finally:
+        store.close()
+    
+    rows = execute(predictions, f"SELECT model_version, value, payload, predicted_at FROM {PREDICTIONS_TABLE} ORDER BY predicted_at")
+    assert [row[:3] for row in rows] == [
+        ("v1", 0.05, {"horizon": 12}),
+        ("v1", None, None),
+        (None, 0.07, {"note": "comma, \"quoted\""})
+    ]
+    assert rows[1][3] == START + timedelta(hours=1)
+
+def test_history_and_buckets(predictions):
+    store = SyncPredictionStore(predictions)
+    try:
+        store.write([
+            prediction_record("asset-1", "pricing", "v1", float(minute), None, START + timedelta(minutes=minute))
+            for minute in range(60)
+        ] + [prediction_record("asset-2", "pricing", "v1", 1000.0, None, START)])
+    finally:
+        store.close()
+    
+    async def run():
+        store = PredictionStore(predictions)
+        await store.start()
+        try:
+            history = await store.history("asset-1", "pricing", START + timedelta(minutes=10), START + timedelta(minutes=20))
+            limited = await store.history("asset-1", "pricing", START, START + timedelta(hours=1), limit=5)
+            buckets = await store.history_buckets("asset-1", "pricing", START, START + timedelta(hours=1), 6)
+            return history, limited, buckets
+        finally:
+            await store.close()
+    
+    history, limited, buckets = asyncio.run(run())
+    # [start, end), in time order
+    assert [row["value"] for row in history] == [float(minute) for minute in range(10, 20)]
+    assert [row["value"] for row in limited] == [0.0, 1.0, 2.0, 3.0, 4.0]
+    
+    assert len(buckets) == 6
+    for i, bucket in enumerate(buckets):
+        assert bucket["bucket_start"] == START + timedelta(minutes=10 * i)
+        assert bucket["count"] == 10
+        assert (bucket["min"], bucket["max"]) == (10.0 * i, 10.0 * i + 9)
+        assert bucket["mean"] == pytest.approx(10.0 * i + 4.5)
+
+def test_history_endpoint_downsamples(predictions, service):
+    from fastapi.testclient import TestClient
+    
+    store = SyncPredictionStore(predictions)
+    try:
+        store.write([
+            prediction_record("asset-1", "pricing", "v1", float(minute % 100), None, START + timedelta(minutes=minute))
+            for minute in range(1000)
+        ])
+    finally:
+        store.close()
+    
+    window = {"start": START.isoformat(), "end": (START + timedelta(minutes=1000)).isoformat()}
+    with TestClient(service.main.app) as client:
+        minmax = client.get("/assets/asset-1/history", params={**window, "points": 10}).json()
+        lttb = client.get("/assets/asset-1/history", params={**window, "points": 10, "method": "lttb"}).json()
+        unknown = client.get("/assets/asset-1/history", params={**window, "metric": "nope"})
+    
+    assert minmax["total_count"] == 1000
+    assert len(minmax["points"]) == 10
+    assert all(point["min"] == 0.0 and point["max"] == 99.0 and point["count"] == 100 for point in minmax["points"])
+    
+    assert lttb["total_count"] == 1000
+    assert len(lttb["points"]) == 10
+    assert lttb["points"][0]["timestamp"] == START.isoformat()
+    
+    assert unknown.status_code == 400
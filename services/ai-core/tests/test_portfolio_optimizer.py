@@ -0,0 +1,76 @@
+"""
+Portfolio optimizer tests for AIMY AI Core Service
+Risk parity with and without binding constraints, and input validation of
+the simple_server optimization endpoint
+"""
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from portfolio_optimizer import ConstraintSet, risk_contributions, risk_parity, structured_covariance
+
+def problem(n: int = 12, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    groups = np.arange(n) % 3
+    covariance = structured_covariance(rng.uniform(0.05, 0.4, n), [str(g) for g in groups])
+    return covariance, groups
+
+def test_unconstrained_risk_parity_equalizes_contributions():
+    covariance, _ = problem()
+    weights, _ = risk_parity(covariance)
+    assert weights.sum() == pytest.approx(1.0)
+    assert risk_contributions(weights, covariance) == pytest.approx(np.full(12, 1 / 12), abs=1e-6)
+
+def test_slack_constraints_keep_the_risk_parity_portfolio():
+    covariance, groups = problem()
+    unconstrained, _ = risk_parity(covariance)
+    constraints = ConstraintSet(12, 0.0, 0.5, groups, np.zeros(3), np.ones(3))
+    weights, _ = risk_parity(covariance, constraints=constraints)
+    assert weights == pytest.approx(unconstrained, abs=1e-9)
+
+def test_binding_constraints_solve_constrained_risk_budgeting():
+    covariance, groups = problem()
+    unconstrained, _ = risk_parity(covariance)
+    constraints = ConstraintSet(12, 0.02, 0.15, groups, np.zeros(3), np.array([0.2, 1.0, 1.0]))
+    weights, _ = risk_parity(covariance, constraints=constraints)
+    
+    assert weights.sum() == pytest.approx(1.0)
+    assert weights.min() >= 0.02 - 1e-12 and weights.max() <= 0.15 + 1e-12
+    assert weights[groups == 0].sum() <= 0.2 + 1e-12
+    
+    # Optimal for 0.5 w'Sw - c b'log(w) over the constraint set: a projected
+    # gradient step leaves it in place, and it beats projecting the
+    # unconstrained solution
+    scale = unconstrained @ covariance @ unconstrained
+    def objective(w):
+        return 0.5 * w @ covariance @ w - scale / 12 * np.log(w).sum()
+    gradient = covariance @ weights - scale / 12 / weights
+    assert np.max(np.abs(constraints.project(weights - 1e-3 * gradient) - weights)) < 1e-8
+    assert objective(weights) < objective(constraints.project(unconstrained))
+    
+    # Assets off their bounds in groups with slack share the budget multiplier
+    free = (groups != 0) & (weights > 0.02 + 1e-6) & (weights < 0.15 - 1e-6)
+    assert free.sum() > 1
+    assert np.ptp(gradient[free]) < 1e-8
+
+def test_optimize_endpoint_rejects_invalid_holdings():
+    from simple_server import app
+    client = TestClient(app)
+    request = {
+        "portfolio": [
+            {"asset_id": "a", "asset_type": "solar_farm", "value": 100, "expected_yield": None},
+            {"asset_id": "b", "asset_type": "wind_farm", "value": 100}
+        ],
+        "risk_tolerance": "moderate",
+        "investment_goals": ["yield"]
+    }
+    response = client.post("/api/v1/optimize/portfolio", json=request)
+    assert response.status_code == 400
+    assert "expected_yield" in response.json()["detail"]
+    
+    request["portfolio"][0]["expected_yield"] = "7.5"
+    request["portfolio"][0]["value"] = "100"
+    request["method"] = "risk_parity"
+    request["max_weight"] = 0.6
+    response = client.post("/api/v1/optimize/portfolio", json=request)
+    assert response.status_code == 200
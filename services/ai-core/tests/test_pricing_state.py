@@ -0,0 +1,78 @@
+"""
+Incremental pricing state tests for AIMY AI Core Service
+The Redis-side running state reproduces extract_pricing_features on the full
+history, applies each delta once and can be rebuilt with reset
+"""
+
+import fakeredis
+import numpy as np
+import pytest
+from pricing_state import PricingStateStore, features_from_state
+
+def split(records, bounds):
+    return [records[lo:hi] for lo, hi in zip([0] + bounds, bounds + [len(records)])]
+
+@pytest.fixture
+def history(service):
+    main = service.main
+    np.random.seed(7)
+    cashflows = main.generate_mock_cashflows("asset-1", 200)
+    market_data = main.generate_mock_market_data(200)
+    utilization = main.generate_mock_utilization("asset-1", 200)
+    return main, cashflows, market_data, utilization
+
+def test_deltas_across_months_match_full_recomputation(history):
+    main, cashflows, market_data, utilization = history
+    store = PricingStateStore(fakeredis.FakeRedis())
+    
+    # Uneven deltas, so most months receive amounts from more than one delta
+    # and their sums are taken out of and put back into the Welford state
+    cashflow_bounds = [7, 45, 46, 130, 301]
+    market_bounds = [20, 90, 150]
+    utilization_bounds = [1, 60, 61, 199]
+    deltas = list(zip(
+        split(cashflows, cashflow_bounds),
+        split(market_data, market_bounds + [len(market_data)] * 2),
+        split(utilization, utilization_bounds + [len(utilization)])
+    ))
+    assert sum(len(delta[0]) for delta in deltas) == len(cashflows)
+    
+    for i, (cf, md, util) in enumerate(deltas):
+        state, applied = store.apply("asset-1", cf, md, util, delta_id=f"delta-{i}")
+        assert applied
+    
+    expected = main.extract_pricing_features(cashflows, market_data, utilization)
+    np.testing.assert_allclose(features_from_state(state), expected, rtol=1e-12, atol=1e-9)
+    np.testing.assert_allclose(features_from_state(store.state("asset-1")), expected, rtol=1e-12, atol=1e-9)
+
+def test_repeated_delta_is_applied_once(history):
+    _, cashflows, market_data, utilization = history
+    store = PricingStateStore(fakeredis.FakeRedis())
+    
+    first, applied = store.apply("asset-1", cashflows[:50], market_data[:10], utilization[:10], delta_id="retry-me")
+    assert applied
+    again, applied = store.apply("asset-1", cashflows[:50], market_data[:10], utilization[:10], delta_id="retry-me")
+    assert not applied
+    assert again == first
+    
+    # Without an id, the same records are counted again
+    doubled, applied = store.apply("asset-1", cashflows[:50], market_data[:10], utilization[:10])
+    assert applied
+    assert doubled["cashflow_count"] == 2 * first["cashflow_count"]
+
+def test_reset_rebuilds_from_full_history(history):
+    main, cashflows, market_data, utilization = history
+    store = PricingStateStore(fakeredis.FakeRedis())
+    store.apply("asset-1", cashflows[:30], market_data, utilization, delta_id="stale")
+    
+    state, applied = store.apply("asset-1", cashflows, market_data, utilization, reset=True, delta_id="rebuild")
+    assert applied
+    np.testing.assert_allclose(
+        features_from_state(state), main.extract_pricing_features(cashflows, market_data, utilization),
+        rtol=1e-12, atol=1e-9
+    )
+    
+    # The reset also forgets which deltas were applied before it
+    _, applied = store.apply("asset-1", [], [], [], delta_id="stale")
+    assert applied
+    assert store.state("other-asset") is None
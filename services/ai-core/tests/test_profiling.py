@@ -0,0 +1,64 @@
+"""
+Request profiling tests for AIMY AI Core Service
+Profile tags and retention of stored profiles
+"""
+
+from datetime import datetime, timedelta, timezone
+from fastapi.testclient import TestClient
+from profiling import PROFILE_HEADER, pinned_versions, record_pinned_version
+
+def test_pinned_versions_are_recorded_only_for_profiled_requests():
+    record_pinned_version("pricing", "v1")
+    assert pinned_versions.get() is None
+    
+    versions = {}
+    token = pinned_versions.set(versions)
+    try:
+        record_pinned_version("pricing", "v1")
+        record_pinned_version("pricing", "v2")
+    finally:
+        pinned_versions.reset(token)
+    assert versions == {"pricing": "v1"}
+
+def test_profile_is_tagged_with_the_pinned_version(service, monkeypatch):
+    main = service.main
+    monkeypatch.setitem(main.model_manager.model_versions, "yield", "v-pinned")
+    original = main.predict_with_fallback
+    
+    async def refreshed_mid_request(*args, **kwargs):
+        try:
+            return await original(*args, **kwargs)
+        finally:
+            # A refresh swaps in a new version while the request runs
+            main.model_manager.model_versions["yield"] = "v-refreshed"
+    
+    tags = {}
+    finish = main.request_profiler.finish
+    
+    def capture(profiler, profile_tags):
+        tags.update(profile_tags)
+        return finish(profiler, profile_tags)
+    
+    monkeypatch.setattr(main, "predict_with_fallback", refreshed_mid_request)
+    monkeypatch.setattr(main.request_profiler, "finish", capture)
+    with TestClient(main.app) as client:
+        client.post("/predict_yield", headers={PROFILE_HEADER: "1"}, json={
+            "asset_id": "asset-1",
+            "historical_yields": [0.08] * 24,
+            "market_conditions": {"interest_rate": 0.04, "inflation_rate": 0.02, "market_volatility": 0.2},
+            "forecast_horizon": 12
+        })
+    
+    assert tags["model"] == "yield"
+    assert tags["model_version"] == "v-pinned"
+
+def test_old_profiles_are_removed_by_cleanup(service):
+    objects = service.object_store.buckets[service.main.MINIO_BUCKET]
+    old = datetime.now(timezone.utc) - timedelta(days=service.celery_tasks.RETENTION_PROFILE_DAYS + 1)
+    objects["profiles/20250101/20250101T000000-000000000000.speedscope.json"] = (b"{}", old)
+    objects["profiles/20250102/20250102T000000-000000000000.speedscope.json"] = (b"{}", datetime.now(timezone.utc))
+    
+    service.celery_tasks.cleanup_old_data_files(retention_days=30)
+    
+    assert "profiles/20250101/20250101T000000-000000000000.speedscope.json" not in objects
+    assert "profiles/20250102/20250102T000000-000000000000.speedscope.json" in objects
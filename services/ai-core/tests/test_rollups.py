@@ -0,0 +1,85 @@
+"""
+Rollup tests for AIMY AI Core Service
+Window covers and summaries, including windows reaching past the retention
+of the hourly and daily rollups
+"""
+
+from datetime import datetime, timedelta, timezone
+import fakeredis
+import numpy as np
+import pyarrow as pa
+import pytest
+from iot_ingest import IOT_SCHEMA
+from rollups import RollupStore, cover
+
+NOW = np.datetime64("2025-06-15T12:00")
+
+def hourly_readings(start: datetime, hours: int) -> pa.Table:
+    return pa.Table.from_pylist([
+        {"asset_id": "asset-1", "timestamp": start + timedelta(hours=h), "sensor_type": "temperature",
+         "value": float(h % 24), "unit": "C"}
+        for h in range(hours)
+    ], schema=IOT_SCHEMA)
+
+def summarize(store: RollupStore, start: str, end: str) -> dict:
+    covering = store.keys("asset-1", "temperature", np.datetime64(start), np.datetime64(end), now=NOW)
+    hashes = [store.redis.hgetall(key) for _, _, key in covering]
+    return store.summarize(covering, hashes, np.datetime64(start), now=NOW)
+
+def test_cover_is_exact_within_retention():
+    pieces = cover(np.datetime64("2025-01-30T22"), np.datetime64("2025-03-02T03"))
+    assert pieces[:2] == [("hour", np.datetime64("2025-01-30T22")), ("hour", np.datetime64("2025-01-30T23"))]
+    assert ("day", np.datetime64("2025-01-31")) in pieces
+    assert ("month", np.datetime64("2025-02")) in pieces
+    assert pieces[-1] == ("hour", np.datetime64("2025-03-02T02"))
+    assert len(pieces) == 2 + 1 + 1 + 1 + 3
+
+def test_cover_widens_expired_hours_and_days():
+    retained = {"hour": np.datetime64("2025-03-01T00", "h"), "day": np.datetime64("2025-02-10T00", "h")}
+    # Head hours of Jan 30 and the whole day Jan 31 are past both retentions;
+    # Mar 1 and the tail hours of Mar 2 are still held
+    pieces = cover(np.datetime64("2025-01-30T22"), np.datetime64("2025-03-02T03"), retained)
+    assert pieces == [
+        ("month", np.datetime64("2025-01")),
+        ("month", np.datetime64("2025-02")),
+        ("day", np.datetime64("2025-03-01")),
+        ("hour", np.datetime64("2025-03-02T00")),
+        ("hour", np.datetime64("2025-03-02T01")),
+        ("hour", np.datetime64("2025-03-02T02"))
+    ]
+    
+    # Expired hours only need their day when the day is retained
+    pieces = cover(np.datetime64("2025-02-20T05"), np.datetime64("2025-02-22T00"), retained)
+    assert pieces == [("day", np.datetime64("2025-02-20")), ("day", np.datetime64("2025-02-21"))]
+
+def test_summary_reads_expired_head_from_coarser_rollups():
+    store = RollupStore(fakeredis.FakeRedis(), ttl_days={"hour": 90, "day": 1095})
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    store.update(hourly_readings(start, 24 * 120))
+    
+    # Hourly rollups before 2025-03-17T12 are past retention; simulate
+    # their expiry and ask for a window starting mid-day in that range
+    horizon = store.retained_since(NOW)["hour"]
+    assert horizon == np.datetime64("2025-03-17T12", "h")
+    for key in store.redis.scan_iter("rollup:hour:*"):
+        if np.datetime64(key.decode().rsplit(":", 1)[1][:13]) < horizon:
+            store.redis.delete(key)
+    
+    summary = summarize(store, "2025-03-10T06", "2025-03-20T00")
+    assert summary["covered_start"] == "2025-03-10T00:00:00Z"
+    assert summary["covered_end"] == "2025-03-20T00:00:00Z"
+    assert summary["count"] == 10 * 24
+    assert summary["mean"] == pytest.approx(11.5)
+    assert summary["partial"] is False
+    assert summary["rollups_read"]["hour"] == 0
+    assert summary["rollups_read"]["expired"] == []
+
+def test_summary_flags_expired_rollups_it_cannot_replace():
+    store = RollupStore(fakeredis.FakeRedis(), ttl_days={"hour": 90, "day": 90, "month": 90})
+    store.update(hourly_readings(datetime(2025, 1, 1, tzinfo=timezone.utc), 24 * 31))
+    store.redis.delete(store.key("month", "asset-1", "temperature", np.datetime64("2025-01")))
+    
+    summary = summarize(store, "2025-01-05T00", "2025-01-06T00")
+    assert summary["count"] == 0
+    assert summary["partial"] is True
+    assert summary["rollups_read"]["expired"] == ["month:2025-01"]
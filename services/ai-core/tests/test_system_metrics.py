@@ -0,0 +1,28 @@
+"""
+System metrics tests for AIMY AI Core Service
+collect_system_metrics reports real values without blocking the worker
+"""
+
+import time
+import psutil
+
+class ProcessWithoutConnections:
+    """psutil.Process after connections() was removed"""
+    
+    def net_connections(self, kind: str = "inet"):
+        return [object(), object()]
+
+def test_collect_system_metrics_does_not_block(service):
+    started = time.perf_counter()
+    metrics = service.celery_tasks.collect_system_metrics()
+    assert time.perf_counter() - started < 0.5
+    assert 0.0 <= metrics["cpu_usage"] <= 100.0 * psutil.cpu_count()
+    assert metrics["process_rss_bytes"] > 0
+
+def test_connection_count_falls_back_to_this_process(service, monkeypatch):
+    def denied(kind: str = "inet"):
+        raise psutil.AccessDenied()
+    
+    monkeypatch.setattr(psutil, "net_connections", denied)
+    monkeypatch.setattr(psutil, "Process", ProcessWithoutConnections)
+    assert service.celery_tasks.collect_system_metrics()["active_connections"] == 2
@@ -0,0 +1,48 @@
+"""
+Valuation snapshots for AIMY AI Core Service
+Compact per-asset valuations, computed in bulk by the revalue_universe task
+and read from Redis by GET /price/{asset_id}
+"""
+
+import time
+from typing import List, Dict, Tuple, Any, Iterable, Optional
+import numpy as np
+import orjson
+
+# Redis key of an asset's latest valuation snapshot
+SNAPSHOT_KEY = "valuation:snapshot:{asset_id}"
+# Summary of the last bulk revaluation
+REVALUATION_RUN_KEY = "valuation:last_run"
+
+# Confidence band around the estimate, as multipliers (same as POST /price)
+INTERVAL_LOWER = 0.8
+INTERVAL_UPPER = 1.2
+
+def snapshot_key(asset_id: str) -> str:
+    return SNAPSHOT_KEY.format(asset_id=asset_id)
+
+def confidence_interval(value: float) -> Dict[str, float]:
+    return {"lower": value * INTERVAL_LOWER, "upper": value * INTERVAL_UPPER}
+
+def encode_snapshot(value: float, model_version: str, valued_at: Optional[float] = None,
+                    features_as_of: Optional[str] = None) -> bytes:
+    """Serialize one snapshot; valued_at is a Unix timestamp (default now)"""
+    return orjson.dumps({
+        "value": value,
+        "lower": value * INTERVAL_LOWER,
+        "upper": value * INTERVAL_UPPER,
+        "model_version": model_version,
+        "valued_at": time.time() if valued_at is None else valued_at,
+        "features_as_of": features_as_of
+    })
+
+def decode_snapshot(payload: bytes) -> Dict[str, Any]:
+    return orjson.loads(payload)
+
+def build_snapshots(asset_ids: Iterable[str], values: np.ndarray, model_version: str, valued_at: float,
+                    features_as_of: np.ndarray) -> List[Tuple[str, bytes]]:
+    """(Redis key, payload) for every asset of a bulk revaluation"""
+    return [
+        (snapshot_key(str(asset_id)), encode_snapshot(float(value), model_version, valued_at, str(as_of)))
+        for asset_id, value, as_of in zip(asset_ids, values.tolist(), features_as_of)
+    ]
@@ -0,0 +1,187 @@
+"""
+Wire formats for AIMY AI Core Service
+Content negotiation for request and response bodies: orjson for JSON,
+MessagePack as a binary alternative, and gzip/zstd compression in both
+directions. Plain JSON clients are unaffected.
+"""
+
+import io
+import zlib
+import logging
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+import numpy as np
+import orjson
+import msgpack
+import zstandard
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.background import BackgroundTask
+
+logger = logging.getLogger(__name__)
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+# MessagePack extension carrying a numeric array as raw little-endian
+# float64 bytes, e.g. a year of daily yields, instead of per-element floats
+MSGPACK_FLOAT64_ARRAY = 1
+
+# Response format negotiated for the current request
+response_format: ContextVar[str] = ContextVar("response_format", default="json")
+
+def _msgpack_ext_hook(code: int, data: bytes) -> Any:
+    if code == MSGPACK_FLOAT64_ARRAY:
+        # The request models are pydantic, which validates lists
+        return np.frombuffer(data, dtype="<f8").tolist()
+    return msgpack.ExtType(code, data)
+
+def packb_float64_array(values) -> msgpack.ExtType:
+    """Wrap a numeric array for a MessagePack request body"""
+    return msgpack.ExtType(MSGPACK_FLOAT64_ARRAY, np.ascontiguousarray(values, dtype="<f8").tobytes())
+
+def decompress(data: bytes, encoding: str, max_size: int) -> bytes:
+    """Decode a Content-Encoding, refusing bodies that inflate beyond max_size"""
+    encoding = encoding.strip().lower()
+    if encoding in ("", "identity"):
+        decoded = data
+    elif encoding in ("gzip", "x-gzip"):
+        decoded = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(data, max_size + 1)
+    elif encoding == "zstd":
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data))
+        chunks, size = [], 0
+        while size <= max_size:
+            chunk = reader.read(min(1 << 20, max_size + 1 - size))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        decoded = b"".join(chunks)
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+    
+    if len(decoded) > max_size:
+        raise HTTPException(status_code=413, detail=f"Request body exceeds {max_size} bytes")
+    return decoded
+
+def _accepts(header: Optional[str], token: str) -> bool:
+    """Whether an Accept/Accept-Encoding header lists token with a non-zero q"""
+    for part in (header or "").lower().split(","):
+        name, *params = [item.strip() for item in part.split(";")]
+        if name != token:
+            continue
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+class WireRequest(Request):
+    """Request whose body is decompressed and decoded with orjson or msgpack"""
+    
+    max_body_size = 64 * 1024 * 1024
+    
+    async def body(self) -> bytes:
+        if not hasattr(self, "_decoded_body"):
+            raw = await super().body()
+            self._decoded_body = decompress(raw, self.scope.get("wire_encoding", ""), self.max_body_size)
+        return self._decoded_body
+    
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            body = await self.body()
+            if self.scope.get("wire_format") == "msgpack":
+                try:
+                    self._json = msgpack.unpackb(body, ext_hook=_msgpack_ext_hook, strict_map_key=False)
+                except Exception as e:
+                    raise HTTPException(status_code=400, detail=f"Invalid MessagePack body: {e}")
+            else:
+                self._json = orjson.loads(body)
+        return self._json
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+class WireResponse(JSONResponse):
+    """Default response class: orjson, or msgpack when the client asked for it"""
+    
+    def __init__(self, content: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None,
+                 media_type: Optional[str] = None, background: Optional[BackgroundTask] = None):
+        self.wire_format = response_format.get()
+        self.media_type = MSGPACK_MEDIA_TYPES[0] if self.wire_format == "msgpack" else JSON_MEDIA_TYPE
+        super().__init__(content, status_code, headers, media_type, background)
+    
+    def render(self, content: Any) -> bytes:
+        if self.wire_format == "msgpack":
+            return msgpack.packb(content, default=_msgpack_default)
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+def compress(body: bytes, accept_encoding: Optional[str]) -> Optional[tuple]:
+    """Compress a response body with the best encoding the client accepts"""
+    if _accepts(accept_encoding, "zstd"):
+        return "zstd", zstandard.ZstdCompressor(level=3).compress(body)
+    if _accepts(accept_encoding, "gzip"):
+        return "gzip", _gzip(body)
+    return None
+
+def _gzip(body: bytes, level: int = 6) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(body) + compressor.flush()
+
+class WireRoute(APIRoute):
+    """Route class negotiating request and response encodings
+    
+    Requests: Content-Encoding gzip/zstd is inflated, and MessagePack bodies
+    are decoded and handed to FastAPI as if they were JSON. Responses:
+    Accept: application/msgpack selects MessagePack (see WireResponse), and
+    bodies of at least compress_min_size bytes are compressed per
+    Accept-Encoding.
+    """
+    
+    compress_min_size = 1024
+    
+    def get_route_handler(self) -> Callable:
+        original_route_handler = super().get_route_handler()
+        
+        async def wire_route_handler(request: Request) -> Response:
+            scope = dict(request.scope)
+            headers = []
+            for name, value in scope["headers"]:
+                if name == b"content-encoding":
+                    scope["wire_encoding"] = value.decode("latin-1")
+                    continue
+                if name == b"content-type" and value.split(b";")[0].strip().decode("latin-1").lower() in MSGPACK_MEDIA_TYPES:
+                    scope["wire_format"] = "msgpack"
+                    value = JSON_MEDIA_TYPE.encode()
+                headers.append((name, value))
+            scope["headers"] = headers
+            
+            accept = request.headers.get("accept")
+            token = response_format.set(
+                "msgpack" if any(_accepts(accept, media_type) for media_type in MSGPACK_MEDIA_TYPES) else "json"
+            )
+            try:
+                response = await original_route_handler(WireRequest(scope, request.receive))
+            finally:
+                response_format.reset(token)
+            
+            response.headers["Vary"] = "Accept, Accept-Encoding"
+            body = getattr(response, "body", None)
+            if body and len(body) >= self.compress_min_size and "content-encoding" not in response.headers:
+                compressed = compress(body, request.headers.get("accept-encoding"))
+                if compressed is not None:
+                    encoding, response.body = compressed
+                    response.headers["Content-Encoding"] = encoding
+                    response.headers["Content-Length"] = str(len(response.body))
+            return response
+        
+        return wire_route_handler